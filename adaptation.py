@@ -0,0 +1,283 @@
+"""Single-pass pitch and formant modification for voice adaptation"""
+import numpy as np
+from scipy import fft as sp_fft
+
+
+class AdaptationEngine:
+    """Pitch and formant modification in one STFT analysis/synthesis pass.
+
+    Each frame's magnitude spectrum is split into a smooth spectral envelope
+    (cepstral liftering) and the harmonic excitation under it. The excitation
+    is resampled along frequency by the pitch ratio with phase-vocoder phase
+    propagation, the envelope by the formant ratio, and the two are recombined
+    and overlap-added. This replaces a pitch shift (STFT, phase vocoder and
+    resample) followed by two more polyphase resamples with a single forward
+    and inverse FFT per frame. Windows, bin frequencies and the lifter are
+    computed once per engine and scipy's FFT plan cache is reused across calls.
+    """
+
+    def __init__(self, sample_rate, n_fft=1024, hop_length=256, max_f0=500.0):
+        if n_fft % hop_length:
+            raise ValueError("n_fft must be a multiple of hop_length")
+        self.sample_rate = sample_rate
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.overlap = n_fft // hop_length
+        self.n_bins = n_fft // 2 + 1
+
+        # Periodic Hann for both analysis and synthesis
+        self.window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+        self.window_gain = float(np.sum(self.window ** 2) / hop_length)
+
+        # Expected phase advance per hop for each bin
+        self.bin_advance = 2 * np.pi * hop_length * np.arange(self.n_bins) / n_fft
+        self.bins = np.arange(self.n_bins, dtype=np.float64)
+
+        # Keep quefrencies below the shortest pitch period for the envelope
+        n_lifter = max(2, int(sample_rate / max_f0))
+        lifter = np.zeros(n_fft)
+        lifter[:n_lifter] = 1.0
+        lifter[-n_lifter + 1:] = 1.0
+        self.lifter = lifter
+
+    # Framing helpers
+
+    def frames(self, padded):
+        """Windowed frames of an already padded signal, one per hop"""
+        n_frames = 1 + (len(padded) - self.n_fft) // self.hop_length
+        strides = (padded.strides[0] * self.hop_length, padded.strides[0])
+        framed = np.lib.stride_tricks.as_strided(padded, (n_frames, self.n_fft), strides, writeable=False)
+        return framed * self.window
+
+    def overlap_add(self, frames):
+        """Overlap-add windowed frames; returns (n_frames + overlap - 1) hops"""
+        hop = self.hop_length
+        n_frames = frames.shape[0]
+        out = np.zeros((n_frames + self.overlap - 1) * hop, dtype=np.float64)
+        for j in range(self.overlap):
+            out[j * hop:j * hop + n_frames * hop] += frames[:, j * hop:(j + 1) * hop].reshape(-1)
+        return out
+
+    # Spectral processing
+
+    def _interp_bins(self, values, positions):
+        """Linear interpolation of ``values`` (frames x bins) at fractional bins"""
+        positions = np.clip(positions, 0, self.n_bins - 1)
+        lo = np.floor(positions).astype(np.int64)
+        hi = np.minimum(lo + 1, self.n_bins - 1)
+        frac = positions - lo
+        return values[:, lo] * (1 - frac) + values[:, hi] * frac
+
+    def process_spectra(self, spectra, pitch_ratio, formant_ratio=1.0, state=None):
+        """Modify a block of STFT frames (frames x bins).
+
+        ``state`` carries the last analysis and synthesis phases so blocks of
+        one signal can be processed separately; pass the returned state into
+        the next call. Returns ``(modified_spectra, state)``.
+        """
+        magnitude = np.abs(spectra)
+        phase = np.angle(spectra)
+
+        # Smooth spectral envelope by cepstral liftering
+        log_mag = np.log(magnitude + 1e-9)
+        cepstrum = sp_fft.irfft(log_mag, n=self.n_fft, axis=1, workers=-1)
+        envelope = np.exp(sp_fft.rfft(cepstrum * self.lifter, axis=1, workers=-1).real)
+        excitation = magnitude / envelope
+
+        # Output bin k takes its excitation from bin k / pitch_ratio and its
+        # envelope from bin k / formant_ratio
+        source = self.bins / pitch_ratio
+        in_range = source <= self.n_bins - 1
+        source_bin = np.minimum(np.rint(source).astype(np.int64), self.n_bins - 1)
+        new_excitation = self._interp_bins(excitation, source) * in_range
+        new_envelope = self._interp_bins(envelope, self.bins / formant_ratio)
+
+        # Instantaneous frequency (phase advance per hop) of each analysis bin
+        if state is None:
+            prev_phase = phase[0] - self.bin_advance
+            synth_phase = phase[0, source_bin] - pitch_ratio * self.bin_advance[source_bin]
+        else:
+            prev_phase, synth_phase = state
+        phase_diff = np.diff(phase, axis=0, prepend=prev_phase[None, :]) - self.bin_advance
+        phase_diff = np.mod(phase_diff + np.pi, 2 * np.pi) - np.pi
+        advance = (self.bin_advance + phase_diff)[:, source_bin] * pitch_ratio
+
+        out_phase = synth_phase + np.cumsum(advance, axis=0)
+        modified = new_envelope * new_excitation * np.exp(1j * out_phase)
+        new_state = (phase[-1].copy(), np.mod(out_phase[-1], 2 * np.pi))
+        return modified, new_state
+
+    def process(self, audio, pitch_ratio, formant_ratio=1.0):
+        """Shift pitch by ``pitch_ratio`` and formants by ``formant_ratio``.
+
+        Returns a float32 array the same length as ``audio``.
+        """
+        audio = np.asarray(audio, dtype=np.float64)
+        n = len(audio)
+        if n == 0:
+            return audio.astype(np.float32)
+
+        # Pad so every output sample is covered by a full set of frames
+        pad = self.n_fft - self.hop_length
+        tail = (-(n + 2 * pad - self.n_fft)) % self.hop_length
+        padded = np.pad(audio, (pad, pad + tail))
+
+        spectra = sp_fft.rfft(self.frames(padded), axis=1, workers=-1)
+        modified, _ = self.process_spectra(spectra, pitch_ratio, formant_ratio)
+        frames = sp_fft.irfft(modified, n=self.n_fft, axis=1, workers=-1) * self.window
+        out = self.overlap_add(frames) / self.window_gain
+        return out[pad:pad + n].astype(np.float32)
+
+
+_engines = {}
+
+
+def get_engine(sample_rate):
+    """Shared engine per sample rate so windows and plans are built once"""
+    engine = _engines.get(sample_rate)
+    if engine is None:
+        engine = _engines[sample_rate] = AdaptationEngine(sample_rate)
+    return engine
+
+
+def shift_factors(source_f0, target_f0):
+    """Pitch and formant factors moving ``source_f0`` towards ``target_f0``.
+
+    Returns None if either pitch is unknown. The pitch factor is limited to
+    0.5x-2x to avoid artifacts.
+    """
+    if not (source_f0 > 0 and target_f0 > 0):
+        return None
+    shift_factor = max(0.5, min(2.0, target_f0 / source_f0))
+    return shift_factor, formant_ratio_for(shift_factor)
+
+
+def formant_ratio_for(pitch_ratio, limit=0.15):
+    """Formant shift to pair with a pitch shift.
+
+    Vocal tract resonances scale much less than F0 between speakers, so
+    formants follow the pitch ratio by its square root, limited to
+    ``1 +/- limit`` to avoid obvious artifacts.
+    """
+    return float(np.clip(np.sqrt(pitch_ratio), 1 - limit, 1 + limit))
+
+
+class RunningNormalizer:
+    """Running loudness normalization with a peak limiter.
+
+    Replaces a global peak normalization, which needs the whole signal, with
+    an exponentially smoothed RMS estimate over short sub-blocks. Silence
+    below ``gate_rms`` doesn't update the estimate, so pauses aren't boosted,
+    and gain changes are ramped across each sub-block to avoid clicks.
+    """
+
+    def __init__(self, sample_rate, target_rms=0.1, ceiling=0.95, max_gain=10.0,
+                 gate_rms=0.003, time_constant=0.4, subblock_ms=10):
+        self.target_rms = target_rms
+        self.ceiling = ceiling
+        self.max_gain = max_gain
+        self._gate_mean_square = gate_rms ** 2
+        self.subblock = max(1, int(sample_rate * subblock_ms / 1000))
+        self.smoothing = np.exp(-self.subblock / (time_constant * sample_rate))
+        self._mean_square = None
+        self._gain = 1.0
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        out = np.empty_like(block)
+        for start in range(0, len(block), self.subblock):
+            segment = block[start:start + self.subblock]
+            mean_square = float(np.mean(segment.astype(np.float64) ** 2))
+            if mean_square > self._gate_mean_square:
+                if self._mean_square is None:
+                    self._mean_square = mean_square
+                else:
+                    self._mean_square = (self.smoothing * self._mean_square
+                                         + (1 - self.smoothing) * mean_square)
+            target_gain = self._gain
+            if self._mean_square is not None:
+                target_gain = min(self.max_gain, self.target_rms / np.sqrt(self._mean_square))
+            peak = float(np.max(np.abs(segment))) if len(segment) else 0.0
+            if peak * target_gain > self.ceiling:
+                target_gain = self.ceiling / peak
+            ramp = np.linspace(self._gain, target_gain, len(segment), dtype=np.float32)
+            out[start:start + len(segment)] = segment * ramp
+            self._gain = target_gain
+        return out
+
+
+class StreamingAdapter:
+    """Block-by-block version of ``AdaptationEngine.process``.
+
+    Input can be pushed in blocks of any size; analysis frames, phase state
+    and the overlap-add tail are carried between blocks, so memory is bounded
+    by the block size rather than the signal length. Output lags input by
+    ``n_fft - hop_length`` samples until ``flush``, and the concatenated
+    output matches ``engine.process`` on the whole signal before
+    normalization.
+    """
+
+    def __init__(self, engine, pitch_ratio, formant_ratio=1.0, normalizer=None):
+        self.engine = engine
+        self.pitch_ratio = pitch_ratio
+        self.formant_ratio = formant_ratio
+        self.normalizer = normalizer
+        self._pad = engine.n_fft - engine.hop_length
+        self._input = np.zeros(self._pad, dtype=np.float64)
+        self._tail = np.zeros((engine.overlap - 1) * engine.hop_length, dtype=np.float64)
+        self._state = None
+        self._skip = self._pad  # Leading output produced by the initial padding
+        self._remaining = 0  # Input samples not yet emitted
+
+    def _run(self, final=False):
+        engine = self.engine
+        hop = engine.hop_length
+        if len(self._input) < engine.n_fft:
+            return np.zeros(0, dtype=np.float32)
+
+        n_frames = 1 + (len(self._input) - engine.n_fft) // hop
+        padded = self._input[:(n_frames - 1) * hop + engine.n_fft]
+        spectra = sp_fft.rfft(engine.frames(padded), axis=1, workers=-1)
+        modified, self._state = engine.process_spectra(
+            spectra, self.pitch_ratio, self.formant_ratio, self._state)
+        frames = sp_fft.irfft(modified, n=engine.n_fft, axis=1, workers=-1) * engine.window
+        out = engine.overlap_add(frames) / engine.window_gain
+        out[:len(self._tail)] += self._tail
+
+        self._input = self._input[n_frames * hop:]
+        ready, self._tail = out[:n_frames * hop], out[n_frames * hop:]
+        if self._skip:
+            skipped = min(self._skip, len(ready))
+            ready = ready[skipped:]
+            self._skip -= skipped
+        ready = ready[:self._remaining]
+        self._remaining -= len(ready)
+        ready = ready.astype(np.float32)
+        if self.normalizer is not None:
+            ready = self.normalizer.process(ready)
+        return ready
+
+    def push(self, block):
+        """Add input samples; returns whatever output is now final"""
+        block = np.asarray(block, dtype=np.float64).reshape(-1)
+        self._remaining += len(block)
+        self._input = np.concatenate([self._input, block])
+        return self._run()
+
+    def flush(self):
+        """Pad the end of the signal and return the remaining output"""
+        engine = self.engine
+        hop = engine.hop_length
+        tail = (-(len(self._input) + self._pad - engine.n_fft)) % hop
+        self._input = np.concatenate([self._input, np.zeros(self._pad + tail)])
+        return self._run()
+
+    def stream(self, blocks):
+        """Generator adapting an iterable of blocks, flushing at the end"""
+        for block in blocks:
+            out = self.push(block)
+            if len(out):
+                yield out
+        out = self.flush()
+        if len(out):
+            yield out
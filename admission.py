@@ -0,0 +1,216 @@
+"""Admission control for synthesis: cost estimates, per-user limits and load shedding"""
+import itertools
+import math
+import threading
+import time
+
+
+class Rejected(Exception):
+    """Raised when a request is not admitted; carries the HTTP status and Retry-After"""
+
+    def __init__(self, message, status, retry_after, reason):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+        self.reason = reason
+
+
+class CostModel:
+    """Estimated seconds of generation work for a synthesis request.
+
+    Work grows with the length of the text, plus ``adapt_factor`` more when
+    the output is adapted to a user's voice. The seconds per character start
+    at ``seconds_per_char`` and follow the measured times of completed
+    syntheses (an exponential moving average), so estimates track the
+    hardware and model settings in use.
+    """
+
+    def __init__(self, seconds_per_char=0.5, adapt_factor=0.15, alpha=0.2):
+        self.seconds_per_char = seconds_per_char
+        self.adapt_factor = adapt_factor
+        self.alpha = alpha
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def _units(self, text, adapt):
+        return max(1, len(text)) * (1 + self.adapt_factor if adapt else 1)
+
+    def estimate(self, text, adapt=False):
+        return self._units(text, adapt) * self.seconds_per_char
+
+    def observe(self, text, adapt, seconds):
+        """Learn from a synthesis that was actually generated (not a cache hit)"""
+        rate = seconds / self._units(text, adapt)
+        with self._lock:
+            self.seconds_per_char += self.alpha * (rate - self.seconds_per_char)
+            self.samples += 1
+
+
+class TokenBucket:
+    """Budget of work seconds refilled at ``rate`` per second up to ``burst``"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount):
+        """Seconds until ``amount`` could be taken; 0 if it can be now"""
+        self._refill()
+        missing = amount - self.tokens
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate if self.rate > 0 else float('inf')
+
+    def take(self, amount):
+        self._refill()
+        self.tokens -= amount
+
+    def give(self, amount):
+        """Return (or, if negative, further charge) tokens after the fact"""
+        self._refill()
+        self.tokens = min(self.burst, self.tokens + amount)
+
+    @property
+    def full(self):
+        self._refill()
+        return self.tokens >= self.burst
+
+
+class Ticket:
+    """An admitted request's claim on its user's concurrency and work budget"""
+
+    def __init__(self, ticket_id, key, cost, charged, inline=False):
+        self.id = ticket_id
+        self.key = key
+        self.cost = cost
+        self.charged = charged
+        self.inline = inline
+        self.admitted_at = time.monotonic()
+
+    def remaining(self):
+        return max(0.0, self.cost - (time.monotonic() - self.admitted_at))
+
+
+class AdmissionController:
+    """Decides whether a synthesis request may start, before any work is done.
+
+    Each key (a user, or a client address for anonymous requests) may have
+    ``max_concurrent`` requests in flight and spend estimated work seconds
+    from a token bucket; both are answered with 429. When a queued request
+    would wait longer than ``slo`` seconds to start the server is overloaded
+    and it is shed with 503. Requests run inline on the request thread never
+    wait for a worker; instead at most ``max_inline`` of them may run at once
+    across all keys, and the rest are shed with 503. Every rejection carries
+    a Retry-After estimate.
+    The charge is settled against the real generation time when the request
+    finishes, so cache hits cost nothing and underestimates are paid back.
+    """
+
+    def __init__(self, max_concurrent=2, rate=0.5, burst=600, slo=120, max_inline=0):
+        self.max_concurrent = max_concurrent
+        self.max_inline = max_inline
+        self.rate = rate
+        self.burst = burst
+        self.slo = slo
+        self._active = {}  # key -> {ticket id: Ticket}
+        self._buckets = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.rejected = {'concurrency': 0, 'rate': 0, 'overload': 0}
+
+    def _reject(self, message, status, retry_after, reason):
+        self.rejected[reason] += 1
+        return Rejected(message, status, retry_after, reason)
+
+    def _inline(self):
+        return [t for tickets in self._active.values() for t in tickets.values() if t.inline]
+
+    def _outstanding(self):
+        return sum(t.remaining() for tickets in self._active.values() for t in tickets.values())
+
+    def admit(self, key, cost, projected_wait=None):
+        """Admit a request costing ``cost`` estimated seconds, or raise Rejected.
+
+        ``projected_wait`` is how long a queued request would wait for a
+        worker (from the job queue); None for inline requests, which are
+        shed once ``max_inline`` of them are in flight.
+        """
+        with self._lock:
+            active = self._active.get(key, {})
+            if self.max_concurrent and len(active) >= self.max_concurrent:
+                raise self._reject(
+                    f"Too many synthesis requests in progress (limit {self.max_concurrent} at a time)",
+                    429, min(t.remaining() for t in active.values()), 'concurrency')
+
+            bucket = None
+            charge = cost
+            if self.rate > 0:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+                # A single request larger than the burst is still allowed with a full bucket
+                charge = min(cost, self.burst)
+                wait = bucket.wait_for(charge)
+                if wait > 0:
+                    raise self._reject("Synthesis rate limit exceeded for this user", 429, wait, 'rate')
+
+            if self.slo and projected_wait is not None and projected_wait > self.slo:
+                raise self._reject(
+                    f"Server is overloaded: estimated wait {projected_wait:.0f}s exceeds {self.slo:.0f}s",
+                    503, projected_wait - self.slo, 'overload')
+
+            inline = projected_wait is None
+            if inline and self.max_inline:
+                running = self._inline()
+                if len(running) >= self.max_inline:
+                    raise self._reject(
+                        f"Server is overloaded: {len(running)} syntheses already running (limit {self.max_inline})",
+                        503, min(t.remaining() for t in running), 'overload')
+
+            if bucket is not None:
+                bucket.take(charge)
+            ticket = Ticket(next(self._ids), key, cost, charge if bucket is not None else 0.0, inline)
+            self._active.setdefault(key, {})[ticket.id] = ticket
+            self.admitted += 1
+            return ticket
+
+    def release(self, ticket, seconds=None):
+        """Finish a request; ``seconds`` is the generation time it really took"""
+        with self._lock:
+            active = self._active.get(ticket.key, {})
+            active.pop(ticket.id, None)
+            if not active:
+                self._active.pop(ticket.key, None)
+            bucket = self._buckets.get(ticket.key)
+            if bucket is not None and seconds is not None:
+                bucket.give(ticket.charged - seconds)
+            self._prune()
+
+    def _prune(self):
+        # Full buckets of idle keys carry no state worth keeping
+        for key in [k for k, b in self._buckets.items() if k not in self._active and b.full]:
+            del self._buckets[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_concurrent_per_user': self.max_concurrent,
+                'work_rate_per_user': self.rate,
+                'work_burst_per_user': self.burst,
+                'slo_seconds': self.slo,
+                'max_inline': self.max_inline,
+                'inline_in_flight': len(self._inline()),
+                'active_users': len(self._active),
+                'in_flight': sum(len(tickets) for tickets in self._active.values()),
+                'outstanding_seconds': self._outstanding(),
+                'admitted': self.admitted,
+                'rejected': dict(self.rejected),
+            }
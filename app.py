@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, g
 import os
 from werkzeug.utils import secure_filename
 import uuid
@@ -8,16 +8,36 @@ import numpy as np
 import soundfile as sf
 import torch
 import warnings
-import librosa
-import parselmouth
-from parselmouth.praat import call
 from resemblyzer import VoiceEncoder
 from pydub import AudioSegment
 import io
-import resampy
 import scipy
 import shutil
 import sys
+import json
+import hashlib
+import itertools
+import threading
+from jobs import SynthesisJobQueue, QueueFullError
+from admission import AdmissionController, CostModel, Rejected
+from streaming import split_text_into_chunks, crossfade_chunks, wav_stream_header, float_to_pcm16
+from synth_cache import SynthesisCache
+from storage import FileStore, unique_name
+from speaker_profile import (build_speaker_profile, load_speaker_profile, mean_pitch,
+                             profile_from_audio, PROFILE_AUDIO_FILE)
+from profile_store import create_profile_store
+from batching import MicroBatcher, generate_semantic_batch
+from semantic_cache import SemanticCache
+from models import ModelRegistry
+from adaptation import get_engine, shift_factors, StreamingAdapter, RunningNormalizer
+from dsp_pool import DSPPool
+from enrollment import EnrollmentSession, EnrollmentSessions
+from transcode import parse_output, ensure_variant, variant_filename, mimetype_for, ACCEPT_TYPES, VARIANT_RE
+from metrics import registry as metrics_registry, span, collect_timings, SamplingProfiler
+from preset_index import PresetIndex, analyze_preset, load_custom_presets
+from bark_prompts import PromptCache, SemanticTokenizer, derive_user_prompt, is_user_prompt
+from cpu_perf import (configure_threads, default_threads, optimize_bark, optimize_voice_encoder,
+                      load_optimized_voice_encoder)
 
 # Set up environment variables for Hugging Face downloads
 os.environ['HF_HUB_ENABLE_HF_TRANSFER'] = "1"
@@ -29,8 +49,95 @@ os.environ['HF_HUB_DOWNLOAD_TIMEOUT'] = "300"  # 5 minutes timeout
 app = Flask(__name__, static_folder='.', static_url_path='')
 UPLOAD_FOLDER = 'uploads'
 SYNTH_FOLDER = 'synthesized'
+PROFILE_FOLDER = os.path.join(UPLOAD_FOLDER, 'profiles')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(SYNTH_FOLDER, exist_ok=True)
+os.makedirs(PROFILE_FOLDER, exist_ok=True)
+
+# Synthesis job queue settings
+SYNTH_WORKERS = int(os.environ.get('SYNTH_WORKERS', '1'))  # Concurrent generations; size to cores
+SYNTH_QUEUE_SIZE = int(os.environ.get('SYNTH_QUEUE_SIZE', '16'))  # Max jobs waiting for a worker
+SYNTH_JOB_TTL = int(os.environ.get('SYNTH_JOB_TTL', '3600'))  # Seconds finished jobs stay queryable
+SYNTH_ASYNC_DEFAULT = os.environ.get('SYNTH_ASYNC_DEFAULT', '0') == '1'  # Queue requests without 'async'
+SYNTH_RETRY_AFTER = int(os.environ.get('SYNTH_RETRY_AFTER', '10'))  # Retry-After when the queue is full
+SSE_KEEPALIVE = 15  # Seconds between keep-alive comments on job event streams
+SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', '32'))  # Open job event streams per process; 0 = unlimited
+SSE_MAX_SECONDS = int(os.environ.get('SSE_MAX_SECONDS', '120'))  # Longest a job event stream stays open; 0 = until done
+SSE_RETRY_MS = 1000  # Reconnect delay suggested to clients when a stream is ended early
+
+# Admission control: per-user limits and load shedding, in estimated seconds of generation work
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '1') == '1'
+USER_MAX_CONCURRENT = int(os.environ.get('USER_MAX_CONCURRENT', '2'))  # Syntheses in flight per user; 0 = unlimited
+USER_WORK_RATE = float(os.environ.get('USER_WORK_RATE', '0.5'))  # Work seconds each user earns per second; 0 = unlimited
+USER_WORK_BURST = float(os.environ.get('USER_WORK_BURST', '600'))  # Work seconds a user can spend at once
+SYNTH_SLO_SECONDS = float(os.environ.get('SYNTH_SLO_SECONDS', '120'))  # Shed requests projected to wait longer; 0 = never
+SYNTH_INLINE_MAX = int(os.environ.get('SYNTH_INLINE_MAX', '4'))  # Sync and streaming syntheses at once; 0 = unlimited
+SYNTH_SECONDS_PER_CHAR = float(os.environ.get('SYNTH_SECONDS_PER_CHAR', '0.5'))  # Initial cost estimate, then learned
+ADAPT_COST_FACTOR = 0.15  # Extra share of work when adapting to a user's voice
+
+# Streaming synthesis settings
+STREAM_CHUNK_CHARS = int(os.environ.get('STREAM_CHUNK_CHARS', '180'))  # ~13 s of speech, Bark's comfortable limit
+STREAM_CROSSFADE_MS = int(os.environ.get('STREAM_CROSSFADE_MS', '40'))  # Crossfade length at chunk joins
+FALLBACK_SAMPLE_RATE = 22050  # Sample rate of the fallback tone generator
+ADAPT_BLOCK_SIZE = 24000  # Samples per block when adapting a whole file (1 s at Bark's rate)
+
+# Voice profile store settings
+PROFILE_STORE_BACKEND = os.environ.get('PROFILE_STORE', 'sqlite')  # 'sqlite' (multi-process) or 'memory'
+PROFILE_TTL = int(os.environ.get('PROFILE_TTL', str(30 * 24 * 3600)))  # Seconds after upload before a profile expires; 0 keeps forever
+PROFILE_CACHE_SIZE = int(os.environ.get('PROFILE_CACHE_SIZE', '1024'))  # Per-process LRU of recently used profiles
+
+# Storage retention for uploads/ and synthesized/, applied by a background reaper
+UPLOAD_MAX_AGE = int(os.environ.get('UPLOAD_MAX_AGE', str(PROFILE_TTL)))  # Seconds unused before a voice sample is deleted; 0 keeps forever
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', '0'))  # Delete least recently used samples past this; 0 = no limit
+SYNTH_MAX_AGE = int(os.environ.get('SYNTH_MAX_AGE', str(7 * 24 * 3600)))  # Seconds unused before synthesized audio is deleted; 0 keeps forever
+SYNTH_MAX_BYTES = int(os.environ.get('SYNTH_MAX_BYTES', '0'))  # Delete least recently used outputs past this; 0 = no limit
+STORAGE_REAP_INTERVAL = int(os.environ.get('STORAGE_REAP_INTERVAL', '300'))  # Seconds between retention passes
+
+# Bark micro-batching settings (needs SYNTH_WORKERS > 1 or concurrent inline requests to form batches)
+BARK_BATCH_WINDOW_MS = float(os.environ.get('BARK_BATCH_WINDOW_MS', '0'))  # 0 disables batching
+BARK_BATCH_MAX = int(os.environ.get('BARK_BATCH_MAX', '8'))  # Max requests per batch
+
+# Bark generation settings
+BARK_TEXT_TEMP = 0.7  # Bark's default text-to-semantic temperature
+BARK_WAVEFORM_TEMP = 0.7  # Bark's default coarse/fine temperature
+SEMANTIC_CACHE_SIZE = int(os.environ.get('SEMANTIC_CACHE_SIZE', '256'))  # In-memory entries; 0 disables the cache
+SEMANTIC_CACHE_DIR = os.environ.get('SEMANTIC_CACHE_DIR', os.path.join('cache', 'semantic'))  # Spill dir; empty disables
+SEMANTIC_CACHE_SHARE_VOICES = os.environ.get('SEMANTIC_CACHE_SHARE_VOICES', '1') == '1'  # Unconditioned tokens reused across voices; 0 keys by voice
+
+# Synthesis output cache settings
+SYNTH_CACHE_ENABLED = os.environ.get('SYNTH_CACHE_ENABLED', '1') == '1'
+SYNTH_CACHE_MAX_BYTES = int(os.environ.get('SYNTH_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))  # Evict LRU files past this
+SYNTH_CACHE_MAX_AGE = 365 * 24 * 3600  # Cache-Control max-age for content-addressed files, which never change
+
+# Model lifecycle settings
+MODEL_LOAD_MODE = os.environ.get('MODEL_LOAD_MODE', 'eager')  # 'eager', 'lazy' or 'background'
+MODEL_WARMUP = os.environ.get('MODEL_WARMUP', '1') == '1'  # Run one tiny inference per model after loading
+SERVICE_AUTOSTART = os.environ.get('SERVICE_AUTOSTART', '1') == '1'  # Load models and index files at import; see start_service
+
+# Streaming enrollment
+ENROLL_SESSION_TTL = int(os.environ.get('ENROLL_SESSION_TTL', '120'))  # Seconds an idle enrollment session is kept
+ENROLL_MAX_SECONDS = int(os.environ.get('ENROLL_MAX_SECONDS', '60'))  # Longest recording accepted per session
+ENROLL_MAX_SESSIONS = int(os.environ.get('ENROLL_MAX_SESSIONS', '64'))  # Concurrent sessions per process
+
+# DSP process pool
+DSP_WORKERS = int(os.environ.get('DSP_WORKERS', '2'))  # Per server process, each loading a voice encoder; 0 runs DSP in request threads
+
+# Voice presets
+PRESET_FOLDER = os.environ.get('PRESET_DIR', 'presets')  # Custom Bark .npz history prompts, one voice per file
+PRESET_INDEX_PATH = os.path.join('cache', 'preset_index.npz')  # Saved preset embeddings and pitch
+PRESET_PITCH_WEIGHT = float(os.environ.get('PRESET_PITCH_WEIGHT', '0.25'))  # Score penalty per octave of pitch shift
+PROMPT_CACHE_USERS = int(os.environ.get('PROMPT_CACHE_USERS', '256'))  # User-derived Bark prompts kept in memory
+USER_BARK_PROMPTS = os.environ.get('USER_BARK_PROMPTS', '0') == '1'  # Derive a Bark prompt from each recording (needs bark_hubert_quantizer)
+
+# CPU performance mode: int8 Bark transformers and voice encoder, pinned torch threads
+CPU_PERF_MODE = os.environ.get('CPU_PERF_MODE', '0') == '1'
+TORCH_THREADS = int(os.environ.get('TORCH_THREADS', '0'))  # Intra-op threads; 0 = cores / SYNTH_WORKERS in perf mode
+TORCH_INTEROP_THREADS = int(os.environ.get('TORCH_INTEROP_THREADS', '1'))  # Inter-op threads in perf mode
+TORCH_COMPILE = os.environ.get('TORCH_COMPILE', '0') == '1'  # torch.compile Bark's transformers (slow first run)
+
+# Observability
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '0') == '1'  # Expose /debug/profile
+PROFILER_MAX_SECONDS = 60  # Longest profile one request may take
 
 # Suppress NumPy warnings (optional)
 warnings.filterwarnings('ignore', category=UserWarning)
@@ -46,39 +153,70 @@ if not FFMPEG_AVAILABLE:
     print("WARNING: FFmpeg not found in PATH. Voice processing will be limited.")
     print("Install FFmpeg with: brew install ffmpeg (macOS) or apt-get install ffmpeg (Linux)")
 
-# Initialize voice encoder for voice adaptation
+# Import Bark after environment setup; its weights are loaded by the model registry
 try:
-    print("Loading voice encoder...")
-    voice_encoder = VoiceEncoder()
-    print("Voice encoder loaded!")
-    VOICE_ENCODER_LOADED = True
+    from bark import preload_models, text_to_semantic, semantic_to_waveform
+    from bark.generation import SAMPLE_RATE
+    BARK_IMPORT_ERROR = None
 except Exception as e:
-    print(f"Error loading voice encoder: {e}")
-    VOICE_ENCODER_LOADED = False
+    print(f"Error importing Bark: {e}")
+    print("Falling back to simple audio generation...")
+    BARK_IMPORT_ERROR = e
 
-# Import Bark after environment setup
-try:
-    print("Loading Bark models... this may take a minute.")
-    from bark import generate_audio, preload_models
-    from bark.generation import SAMPLE_RATE
+# Torch threads are sized before any model runs; see CPU_PERF_MODE
+torch_threads = None
+if CPU_PERF_MODE or TORCH_THREADS > 0:
+    torch_threads = configure_threads(TORCH_THREADS or default_threads(SYNTH_WORKERS),
+                                      TORCH_INTEROP_THREADS if CPU_PERF_MODE else 1)
+    print(f"Torch threads: {torch_threads['intra_op']} intra-op, {torch_threads['inter_op']} inter-op")
+
+# What CPU_PERF_MODE changed in Bark once it is loaded
+bark_optimizations = None
+
+def load_voice_encoder():
+    """Initialize voice encoder for voice adaptation"""
+    encoder = VoiceEncoder()
+    if CPU_PERF_MODE and not torch.cuda.is_available():
+        optimize_voice_encoder(encoder)
+    return encoder
+
+def warm_up_voice_encoder(encoder):
+    """Embed two seconds of quiet noise to allocate the encoder's buffers"""
+    noise = np.random.default_rng(0).standard_normal(2 * 16000).astype(np.float32) * 0.01
+    encoder.embed_utterance(noise)
+
+def load_bark():
+    """Load Bark's text, coarse, fine and codec models"""
+    if BARK_IMPORT_ERROR is not None:
+        raise BARK_IMPORT_ERROR
     
     # Print CPU/GPU status
     if torch.cuda.is_available():
-        device = "GPU"
-        device_name = torch.cuda.get_device_name(0)
-        print(f"Using GPU: {device_name}")
+        print(f"Using GPU: {torch.cuda.get_device_name(0)}")
     else:
-        device = "CPU"
         print("No GPU available. Using CPU. Voice generation will be slow.")
     
     # Preload models with increased timeouts
     preload_models()
-    print("Bark models loaded successfully!")
-    BARK_LOADED = True
-except Exception as e:
-    print(f"Error loading Bark: {e}")
-    print("Falling back to simple audio generation...")
-    BARK_LOADED = False
+    # Preset prompts are read once here instead of on every generation
+    failed = voice_prompts.preload(VOICE_PRESETS)
+    print(f"Loaded {len(VOICE_PRESETS) - len(failed)} voice preset prompts")
+    if CPU_PERF_MODE or TORCH_COMPILE:
+        global bark_optimizations
+        bark_optimizations = optimize_bark(quantize_models=CPU_PERF_MODE and not torch.cuda.is_available(),
+                                           compile_models=TORCH_COMPILE)
+        print(f"Bark optimizations: {bark_optimizations}")
+    return True
+
+def warm_up_bark(_):
+    """Run one tiny inference through each Bark stage"""
+    from bark.generation import generate_text_semantic, generate_coarse, generate_fine, codec_decode
+    semantic = generate_text_semantic("Hello.", max_gen_duration_s=0.5, silent=True, use_kv_caching=True)
+    if len(semantic) == 0:
+        return
+    coarse = generate_coarse(semantic, silent=True, use_kv_caching=True)
+    fine = generate_fine(coarse, silent=True)
+    codec_decode(fine)
 
 # Available voice presets
 VOICE_PRESETS = {
@@ -93,11 +231,143 @@ VOICE_PRESETS = {
     "male_american": "v2/en_speaker_8",
     "female_american": "v2/en_speaker_9",
 }
+DEFAULT_PRESET = "v2/en_speaker_0"
+
+# Custom Bark history prompts (.npz) dropped into PRESET_DIR become voices too
+VOICE_PRESETS.update(load_custom_presets(PRESET_FOLDER))
+
+# Prompt arrays of the presets, and of users' own voices, shared by all requests
+voice_prompts = PromptCache(max_user_prompts=PROMPT_CACHE_USERS)
 
-# Keep track of the uploaded voice for the session
-user_voice_samples = {}
-user_voice_embeddings = {}
-user_voice_errors = {}  # Track processing errors by user
+def build_preset_index():
+    """Embed and pitch-analyse every voice preset; only new ones are decoded after the first run"""
+    encoder = model_registry.get('voice_encoder')
+    if encoder is None or not model_registry.ensure('bark'):
+        raise RuntimeError("The preset index needs Bark and the voice encoder")
+    index = PresetIndex(PRESET_INDEX_PATH, pitch_weight=PRESET_PITCH_WEIGHT)
+    analysed = index.build(VOICE_PRESETS, lambda prompt: analyze_preset(voice_prompts.get(prompt), encoder))
+    print(f"Preset index: {len(index.names)} presets, {analysed} analysed")
+    return index
+
+# Models load eagerly at import (share weights with gunicorn --preload), lazily
+# on first use, or in a background thread, depending on MODEL_LOAD_MODE
+model_registry = ModelRegistry(mode=MODEL_LOAD_MODE, warmup=MODEL_WARMUP)
+model_registry.register('voice_encoder', load_voice_encoder, warm_up_voice_encoder, required=False)
+model_registry.register('bark', load_bark, warm_up_bark)
+model_registry.register('preset_index', build_preset_index, required=False)
+if USER_BARK_PROMPTS:
+    model_registry.register('semantic_tokenizer',
+                            lambda: SemanticTokenizer('cuda' if torch.cuda.is_available() else 'cpu'),
+                            required=False)
+
+def bark_ready():
+    """True if Bark can be used, loading it first when loading is lazy"""
+    return model_registry.ensure('bark')
+
+def voice_encoder_ready():
+    """True if the voice encoder can be used, loading it first when needed"""
+    return model_registry.ensure('voice_encoder')
+
+# Voice samples, profiles, embeddings and errors per user, shared by all workers
+voice_profiles = create_profile_store(PROFILE_STORE_BACKEND, PROFILE_FOLDER,
+                                      ttl=PROFILE_TTL, cache_size=PROFILE_CACHE_SIZE,
+                                      profile_dir=lambda user_id: speaker_profile_dir(user_id))
+
+# Pitch analysis, adaptation and upload processing run in worker processes
+# so they don't hold the GIL of request threads; processes start on first use
+dsp_pool = None
+if DSP_WORKERS > 0:
+    dsp_pool = DSPPool(DSP_WORKERS, load_encoder=load_optimized_voice_encoder if CPU_PERF_MODE else True)
+
+# Recordings being enrolled chunk by chunk while the user speaks
+enrollment_sessions = EnrollmentSessions(ttl=ENROLL_SESSION_TTL, max_sessions=ENROLL_MAX_SESSIONS)
+
+# Uploads and outputs live in hash-sharded folders; the profiles folder is left alone
+upload_store = FileStore(UPLOAD_FOLDER, max_age=UPLOAD_MAX_AGE, max_bytes=UPLOAD_MAX_BYTES)
+synth_store = FileStore(SYNTH_FOLDER, max_age=SYNTH_MAX_AGE, max_bytes=SYNTH_MAX_BYTES,
+                        on_reap=lambda removed: synthesis_cache.forget(removed))
+
+# Reuse output files for repeated requests
+synthesis_cache = SynthesisCache(synth_store, SYNTH_CACHE_MAX_BYTES)
+
+# Group concurrent Bark text-to-semantic passes into batches when a window is configured
+bark_batcher = None
+if BARK_IMPORT_ERROR is None and BARK_BATCH_WINDOW_MS > 0:
+    bark_batcher = MicroBatcher(lambda items: generate_semantic_batch(items, temp=BARK_TEXT_TEMP),
+                                window_ms=BARK_BATCH_WINDOW_MS,
+                                max_batch=BARK_BATCH_MAX,
+                                name='bark-batcher')
+    print(f"Bark micro-batching enabled: {BARK_BATCH_WINDOW_MS} ms window, up to {BARK_BATCH_MAX} requests")
+
+# Semantic tokens by text and voice, so repeating a text skips the text model
+semantic_cache = None
+if SEMANTIC_CACHE_SIZE > 0:
+    semantic_cache = SemanticCache(max_items=SEMANTIC_CACHE_SIZE,
+                                   spill_dir=SEMANTIC_CACHE_DIR or None)
+
+# Metrics exported at /metrics; counts are per process
+HTTP_REQUESTS = metrics_registry.counter('echoself_http_requests_total', 'HTTP requests by endpoint and status',
+                                         ['method', 'endpoint', 'status'])
+HTTP_SECONDS = metrics_registry.histogram('echoself_http_request_seconds',
+                                          'Time to produce each response (before streaming bodies)', ['endpoint'])
+SYNTHESES = metrics_registry.counter('echoself_syntheses_total', 'Completed syntheses',
+                                     ['engine', 'cached', 'user_voice'])
+AUDIO_SECONDS = metrics_registry.counter('echoself_audio_seconds_total', 'Seconds of audio generated', ['engine'])
+REALTIME_FACTOR = metrics_registry.histogram('echoself_realtime_factor',
+                                             'Generation time divided by the duration of the audio', ['engine'],
+                                             buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64))
+metrics_registry.gauge('echoself_synthesis_queue_depth', 'Synthesis jobs waiting for a worker',
+                       fn=lambda: synthesis_jobs.stats()['depth'])
+metrics_registry.gauge('echoself_synthesis_jobs_running', 'Synthesis jobs being generated',
+                       fn=lambda: synthesis_jobs.stats()['running'])
+metrics_registry.gauge('echoself_model_ready', 'Whether each model is loaded', ['model'],
+                       fn=lambda: {(name, ): int(m['state'] == 'ready')
+                                   for name, m in model_registry.status()['models'].items()})
+metrics_registry.gauge('echoself_model_load_seconds', 'Time each model took to load', ['model'],
+                       fn=lambda: {(name, ): m['load_seconds']
+                                   for name, m in model_registry.status()['models'].items()})
+metrics_registry.gauge('echoself_model_warmup_seconds', 'Time each model took to warm up', ['model'],
+                       fn=lambda: {(name, ): m['warmup_seconds']
+                                   for name, m in model_registry.status()['models'].items()})
+metrics_registry.counter('echoself_synthesis_cache_requests_total', 'Synthesis cache lookups by result', ['result'],
+                         fn=lambda: {(k, ): v for k, v in synthesis_cache.stats().items()
+                                     if k in ('hits', 'misses', 'coalesced')})
+metrics_registry.gauge('echoself_synthesis_cache_bytes', 'Bytes of cached synthesized audio',
+                       fn=lambda: synthesis_cache.stats()['bytes'])
+metrics_registry.counter('echoself_semantic_cache_requests_total', 'Semantic token cache lookups by result',
+                         ['result'], fn=lambda: {(k, ): v for k, v in semantic_cache.stats().items()
+                                                 if k in ('hits', 'disk_hits', 'misses')} if semantic_cache else {})
+metrics_registry.gauge('echoself_dsp_pool_in_flight', 'DSP tasks running or queued in the process pool',
+                       fn=lambda: dsp_pool.stats()['in_flight'] if dsp_pool else None)
+metrics_registry.counter('echoself_synthesis_rejections_total', 'Synthesis requests refused by admission control',
+                         ['reason'], fn=lambda: {(k, ): v for k, v in admission.stats()['rejected'].items()}
+                         if admission else {})
+metrics_registry.gauge('echoself_admission_outstanding_seconds', 'Estimated generation work admitted and not finished',
+                       fn=lambda: admission.stats()['outstanding_seconds'] if admission else None)
+metrics_registry.gauge('echoself_enrollment_sessions', 'Active streaming enrollment sessions',
+                       fn=lambda: enrollment_sessions.stats()['active'])
+
+# Only one sampling profile runs at a time
+profiler_lock = threading.Lock()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.before_request
+def start_reapers():
+    # Started by the process serving requests, not at import, so each forked
+    # worker has its own (threads don't survive gunicorn --preload's fork)
+    upload_store.start_reaper(STORAGE_REAP_INTERVAL)
+    synth_store.start_reaper(STORAGE_REAP_INTERVAL)
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=response.status_code)
+    if 'request_start' in g:
+        HTTP_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    return response
 
 @app.route('/')
 def index():
@@ -115,66 +385,76 @@ def upload_audio():
     # Generate a unique ID for this user session
     user_id = request.form.get('userId', str(uuid.uuid4()))
     
-    filename = secure_filename(audio_file.filename)
-    filepath = os.path.join(UPLOAD_FOLDER, f"{user_id}_{filename}")
-    audio_file.save(filepath)
-    
-    # Store the reference to this voice sample
-    user_voice_samples[user_id] = filepath
+    # The client's filename only contributes its extension; the stored name is unique
+    extension = os.path.splitext(secure_filename(audio_file.filename))[1].lower() or '.wav'
+    filepath = upload_store.write(unique_name(extension), audio_file.save)
     
-    # Clear any previous errors for this user
-    if user_id in user_voice_errors:
-        del user_voice_errors[user_id]
+    # Store the reference to this voice sample; this also clears previous errors.
+    # The version changes on every upload so cached outputs of an old sample aren't reused
+    version = uuid.uuid4().hex
+    voice_profiles.save_sample(user_id, filepath, version)
         
     # Check FFmpeg first
     if not FFMPEG_AVAILABLE:
         error_msg = "FFmpeg not found. Voice adaptation requires FFmpeg to be installed."
-        user_voice_errors[user_id] = {
+        error = {
             "error_type": "missing_dependency",
             "message": error_msg,
             "solution": "Install FFmpeg with: brew install ffmpeg (macOS) or apt-get install ffmpeg (Linux)"
         }
+        voice_profiles.set_error(user_id, error)
         return jsonify({
             'message': 'Voice sample received but cannot be processed: ' + error_msg,
             'userId': user_id,
             'voice_processed': False,
-            'error': user_voice_errors[user_id]
+            'error': error
         })
     
     # Process the voice sample to extract characteristics if voice encoder is loaded
     voice_processed = False
-    if VOICE_ENCODER_LOADED:
+    error = None
+    if voice_encoder_ready():
         try:
-            # Get the voice embedding
-            wav, sr = librosa.load(filepath, sr=16000)  # Resample to 16kHz for the encoder
-            # Trim silence
-            wav, _ = librosa.effects.trim(wav, top_db=20)
-            # Get embedding
-            embedding = voice_encoder.embed_utterance(wav)
-            user_voice_embeddings[user_id] = embedding
+            # Decode, trim, embed and analyse pitch once; adaptation reuses the result
+            with span('profile_build'):
+                if dsp_pool is not None:
+                    profile = dsp_pool.build_profile(filepath, speaker_profile_dir(user_id), version)
+                else:
+                    profile = build_speaker_profile(filepath, speaker_profile_dir(user_id),
+                                                    encoder=model_registry.get('voice_encoder'),
+                                                    version=version)
+            profile.pop('audio', None)  # Kept on disk as a memory-mappable array
+            embedding = profile.pop('embedding')
+            bark_prompt = derive_bark_prompt(user_id, speaker_profile_dir(user_id), version)
+            if bark_prompt:
+                profile['bark_prompt'] = bark_prompt
+            voice_profiles.save_profile(user_id, profile, embedding)
             voice_processed = True
-            print(f"Voice embedding created for user {user_id}")
+            print(f"Voice embedding created for user {user_id} "
+                  f"(mean F0 {profile['f0_mean']:.1f} Hz, {profile['duration']:.1f}s)")
         except Exception as e:
             error_message = str(e) if str(e) else "Unknown error during voice processing"
             print(f"Error processing voice sample: {error_message}")
             # Store the error information
-            user_voice_errors[user_id] = {
+            error = {
                 "error_type": "processing_failed",
                 "message": error_message,
                 "solution": "Try recording again with clearer audio or check system audio settings."
             }
+            voice_profiles.set_error(user_id, error)
             return jsonify({
                 'message': 'Voice sample received but could not be processed: ' + error_message,
                 'userId': user_id,
                 'voice_processed': False,
-                'error': user_voice_errors[user_id]
+                'error': error
             })
     else:
-        user_voice_errors[user_id] = {
+        error = {
             "error_type": "encoder_not_loaded",
             "message": "Voice encoder not available",
             "solution": "Check server logs for errors with the voice encoder."
         }
+        voice_profiles.set_error(user_id, error)
     
     message = 'Voice sample received and processed!' if voice_processed else 'Voice sample received but could not be processed for adaptation. Using preset voices.'
     
@@ -185,31 +465,184 @@ def upload_audio():
     }
     
     # Include error information if available
-    if not voice_processed and user_id in user_voice_errors:
-        response_data['error'] = user_voice_errors[user_id]
+    if not voice_processed and error:
+        response_data['error'] = error
     
     return jsonify(response_data)
 
-@app.route('/synthesize', methods=['POST'])
-def synthesize_audio():
-    global BARK_LOADED
+@app.route('/enroll/start', methods=['POST'])
+def enroll_start():
+    """Open a streaming enrollment session for PCM chunks from the recorder"""
+    data = request.get_json(silent=True) or {}
+    user_id = data.get('userId') or str(uuid.uuid4())
+    try:
+        sample_rate = int(data.get('sampleRate', 0))
+    except (TypeError, ValueError):
+        sample_rate = 0
+    if not 8000 <= sample_rate <= 192000:
+        return jsonify({'message': 'sampleRate must be between 8000 and 192000'}), 400
     
-    data = request.get_json()
-    text = data.get('text', '')
-    user_id = data.get('userId', '')
-    voice_id = data.get('voice', 'female_1')  # Default to female_1 if not specified
-    use_user_voice = data.get('use_user_voice', False) 
+    # Without the encoder there is nothing to do incrementally; the client falls back to /upload
+    if not voice_encoder_ready():
+        return jsonify({'message': 'Voice encoder not available'}), 503
+    
+    session = EnrollmentSession(user_id, sample_rate, encoder=model_registry.get('voice_encoder'),
+                                max_seconds=ENROLL_MAX_SECONDS)
+    try:
+        enrollment_sessions.add(session)
+    except RuntimeError as e:
+        response = jsonify({'message': str(e)})
+        response.headers['Retry-After'] = str(SYNTH_RETRY_AFTER)
+        return response, 503
+    return jsonify({'sessionId': session.id, 'userId': user_id})
+
+@app.route('/enroll/<session_id>/chunk', methods=['POST'])
+def enroll_chunk(session_id):
+    """Add little-endian 16-bit mono PCM at the session's sample rate"""
+    session = enrollment_sessions.get(session_id)
+    if session is None:
+        return jsonify({'message': 'Unknown or expired enrollment session'}), 404
+    try:
+        with span('enroll_chunk'):
+            session.push_pcm16(request.get_data())
+    except ValueError as e:
+        enrollment_sessions.pop(session_id)
+        return jsonify({'message': str(e)}), 400
+    return jsonify(session.progress())
+
+@app.route('/enroll/<session_id>/finish', methods=['POST'])
+def enroll_finish(session_id):
+    """Finish the recording and store the profile; responds like /upload"""
+    session = enrollment_sessions.pop(session_id)
+    if session is None:
+        return jsonify({'message': 'Unknown or expired enrollment session'}), 404
+    user_id = session.user_id
+    profile_dir = speaker_profile_dir(user_id)
     
+    # The trimmed audio saved with the profile doubles as the voice sample
+    version = uuid.uuid4().hex
+    voice_profiles.save_sample(user_id, os.path.join(profile_dir, PROFILE_AUDIO_FILE), version)
+    try:
+        with span('enroll_finish'):
+            wav, embedding = session.finish()
+        with span('profile_build'):
+            if dsp_pool is not None:
+                profile = dsp_pool.analyze_profile(wav, profile_dir, embedding, version)
+            else:
+                profile = profile_from_audio(wav, profile_dir, embedding, version)
+        profile.pop('audio', None)
+        embedding = profile.pop('embedding')
+        bark_prompt = derive_bark_prompt(user_id, profile_dir, version)
+        if bark_prompt:
+            profile['bark_prompt'] = bark_prompt
+        voice_profiles.save_profile(user_id, profile, embedding)
+        print(f"Voice embedding created for user {user_id} from streamed recording "
+              f"(mean F0 {profile['f0_mean']:.1f} Hz, {profile['duration']:.1f}s)")
+    except Exception as e:
+        error_message = str(e) if str(e) else "Unknown error during voice processing"
+        print(f"Error processing streamed voice sample: {error_message}")
+        error = {
+            "error_type": "processing_failed",
+            "message": error_message,
+            "solution": "Try recording again with clearer audio or check system audio settings."
+        }
+        voice_profiles.set_error(user_id, error)
+        return jsonify({
+            'message': 'Voice sample received but could not be processed: ' + error_message,
+            'userId': user_id,
+            'voice_processed': False,
+            'error': error
+        })
+    
+    return jsonify({
+        'message': 'Voice sample received and processed!',
+        'userId': user_id,
+        'voice_processed': True
+    })
+
+def prompt_identity(history_prompt):
+    """Stable name of a history prompt for cache keys: its preset name or path, or a content hash"""
+    if history_prompt is None or isinstance(history_prompt, str):
+        return history_prompt or ''
+    return hashlib.sha1(np.ascontiguousarray(history_prompt['semantic_prompt']).tobytes()).hexdigest()
+
+def bark_generate(text, history_prompt):
+    """Generate audio with Bark's text-to-semantic and semantic-to-waveform stages.
+
+    Semantic tokens are cached, so repeating a text only pays for the coarse,
+    fine and codec stages. With ``SEMANTIC_CACHE_SHARE_VOICES`` (the default)
+    the semantic pass is left unconditioned and cached by text alone, so
+    other voices reuse it too; the preset then only drives the coarse and
+    fine stages, which carry the timbre but not the voice's prosody. Without
+    it the pass is conditioned on the preset and cached by text and voice.
+    Prompts are passed to Bark as arrays from memory, never as file names.
+    """
+    voice = prompt_identity(history_prompt)
+    history_prompt = voice_prompts.get(history_prompt)
+    semantic_prompt = history_prompt
+    semantic_tokens = None
+    if semantic_cache is not None:
+        if SEMANTIC_CACHE_SHARE_VOICES:
+            semantic_prompt = None
+            cache_key = SemanticCache.make_key(text, temp=BARK_TEXT_TEMP)
+        else:
+            cache_key = SemanticCache.make_key(text, temp=BARK_TEXT_TEMP, voice=voice)
+        semantic_tokens = semantic_cache.get(cache_key)
+    
+    if semantic_tokens is None:
+        with span('bark_semantic'):
+            if bark_batcher is not None:
+                semantic_tokens = bark_batcher.submit((text, semantic_prompt))
+            else:
+                semantic_tokens = text_to_semantic(text, history_prompt=semantic_prompt,
+                                                   temp=BARK_TEXT_TEMP, silent=True)
+        if semantic_cache is not None:
+            semantic_cache.put(cache_key, semantic_tokens)
+    else:
+        print("Reusing cached semantic tokens")
+    
+    with span('bark_waveform'):
+        return semantic_to_waveform(semantic_tokens, history_prompt=history_prompt,
+                                    temp=BARK_WAVEFORM_TEMP, silent=True)
+
+def generate_to_file(output_path, text, selected_voice, user_id, use_user_voice):
+    """Run Bark (or the fallback tone) and write the audio to output_path"""
+    if bark_ready():
+        # Generate audio with Bark
+        audio_array = bark_generate(text, selected_voice)
+        
+        # Apply voice adaptation if requested and available; a prompt made
+        # from the user's own recording already sounds like them
+        if use_user_voice and not is_user_prompt(selected_voice) and voice_profiles.has_voice(user_id):
+            print(f"Applying voice adaptation for user {user_id}")
+            audio_array = adapt_voice(audio_array, user_id)
+        
+        # Save the audio file
+        with span('write'):
+            sf.write(output_path, audio_array, SAMPLE_RATE)
+    else:
+        # Fallback to simple sine wave tone if Bark fails to load
+        print("Bark not available. Using simple tone generation")
+        with span('fallback_tone'):
+            fallback_generate_audio(output_path, text)
+
+def run_synthesis(text, user_id, voice_id, use_user_voice, use_cache=True, output=None):
+    """Generate audio for a request and save it to the synthesized store.
+
+    Returns the response fields that do not depend on the HTTP request, so it
+    can run both inline and from a background job worker.
+    """
     # Check if user voice adaptation is possible
-    can_adapt_voice = user_id in user_voice_embeddings
+    voice_record = voice_profiles.get(user_id) if user_id else None
+    can_adapt_voice = voice_record is not None and voice_record['embedding'] is not None
     
     # If adaptation was requested but isn't possible, prepare an explanation
     adaptation_requested_but_failed = use_user_voice and not can_adapt_voice
     adaptation_failure_reason = None
     
     if adaptation_requested_but_failed:
-        if user_id in user_voice_errors:
-            adaptation_failure_reason = user_voice_errors[user_id]
+        if voice_record and voice_record['error']:
+            adaptation_failure_reason = voice_record['error']
         else:
             adaptation_failure_reason = {
                 "error_type": "no_voice_sample",
@@ -220,135 +653,547 @@ def synthesize_audio():
     # Final determination if we can use voice adaptation
     use_user_voice = use_user_voice and can_adapt_voice
     
+    selected_voice = select_preset(voice_id, user_id)
+    
+    print(f"Synthesizing audio for text: '{text}'")
+    print(f"Using voice: {voice_id}")
+    print(f"Using user voice adaptation: {use_user_voice}")
+    
+    engine = 'bark' if bark_ready() else 'fallback'
+    
+    def produce(path):
+        start = time.perf_counter()
+        generate_to_file(path, text, selected_voice, user_id, use_user_voice)
+        elapsed = time.perf_counter() - start
+        duration = sf.info(path).duration
+        AUDIO_SECONDS.inc(duration, engine=engine)
+        if duration > 0:
+            REALTIME_FACTOR.observe(elapsed / duration, engine=engine)
+    
+    cached = False
+    if use_cache and SYNTH_CACHE_ENABLED:
+        # Identical text/preset/voice requests share one output file
+        cache_key = SynthesisCache.make_key(
+            text, selected_voice, use_user_voice,
+            voice_record['version'] if voice_record else None,
+            engine)
+        output_filename, cached = synthesis_cache.get_or_create(cache_key, produce)
+        if cached:
+            print(f"Serving cached audio {output_filename}")
+    else:
+        # Generate a unique filename for the synthesized audio
+        output_filename = unique_name('.wav')
+        synth_store.write(output_filename, produce)
+    
+    output_path = synth_store.path(output_filename)
+    print(f"Output path: {output_path}")
+    
+    # Check if the file was created
+    if not os.path.exists(output_path):
+        print("Output file was not created!")
+        raise Exception("Failed to generate audio file - file not created")
+    
+    file_size = os.path.getsize(output_path)
+    if file_size == 0:
+        print("Output file is empty!")
+        raise Exception("Failed to generate audio file - file is empty")
+        
+    print(f"Successfully created audio file: {output_path}, size: {file_size} bytes")
+    
+    # Transcode to the requested format; the variant is cached next to the master
+    master_filename = output_filename
+    if output is not None:
+        output_filename = transcoded_variant(master_filename, *output)
+        file_size = synth_store.size(output_filename)
+    
+    SYNTHESES.inc(engine=engine, cached=str(cached).lower(), user_voice=str(use_user_voice).lower())
+    
+    result = {
+        'output_filename': output_filename,
+        'master_filename': master_filename,
+        'content_type': mimetype_for(output_filename),
+        'file_size': file_size,
+        'user_voice_applied': use_user_voice,
+        'cached': cached
+    }
+    
+    # Include adaptation failure information if relevant
+    if adaptation_requested_but_failed and adaptation_failure_reason:
+        result['adaptation_failure'] = adaptation_failure_reason
+    
+    return result
+
+def build_synthesis_response(result, host_url):
+    """Turn a run_synthesis result into the JSON body returned to clients"""
+    # Absolute URL for the audio file
+    file_url = host_url.rstrip('/') + f"/synthesized/{result['output_filename']}"
+    
+    # Return both streaming and download options
+    response_data = {
+        'message': 'Audio synthesized successfully',
+        'file_url': file_url,
+        'file_size': result['file_size'],
+        'content_type': result['content_type'],
+        'download_url': file_url + '?download=true',
+        'user_voice_applied': result['user_voice_applied'],
+        'cached': result['cached']
+    }
+    
+    if 'adaptation_failure' in result:
+        response_data['adaptation_failure'] = result['adaptation_failure']
+    
+    return response_data
+
+# Learned cost of a synthesis, and per-user limits on it
+cost_model = CostModel(seconds_per_char=SYNTH_SECONDS_PER_CHAR, adapt_factor=ADAPT_COST_FACTOR)
+admission = None
+if ADMISSION_ENABLED:
+    admission = AdmissionController(max_concurrent=USER_MAX_CONCURRENT, rate=USER_WORK_RATE,
+                                    burst=USER_WORK_BURST, slo=SYNTH_SLO_SECONDS,
+                                    max_inline=SYNTH_INLINE_MAX)
+
+def client_key(user_id):
+    """Who a request is charged to: the user, or the client address for anonymous requests"""
+    return f"user:{user_id}" if user_id else f"addr:{request.remote_addr}"
+
+def rejection_response(e):
+    response = jsonify({'message': str(e), 'reason': e.reason, 'retry_after': e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, e.status
+
+def settle_synthesis(ticket, text, adapt, seconds, cached=False):
+    """Charge a finished synthesis its real work and learn from its generation time"""
+    if not cached and seconds is not None:
+        cost_model.observe(text, adapt, seconds)
+    if ticket is not None:
+        admission.release(ticket, 0.0 if cached else seconds)
+
+def run_synthesis_job(params):
+    """Job queue handler: synthesize and build the response for the submitter"""
+    start = time.perf_counter()
+    result = None
+    try:
+        with collect_timings() as timings:
+            result = run_synthesis(params['text'], params['user_id'],
+                                   params['voice_id'], params['use_user_voice'],
+                                   use_cache=params['use_cache'], output=params['output'])
+    finally:
+        settle_synthesis(params['ticket'], params['text'], params['adapt'],
+                         time.perf_counter() - start if result else None,
+                         cached=bool(result and result['cached']))
+    response_data = build_synthesis_response(result, params['host_url'])
+    if params['timings']:
+        response_data['timings'] = timings
+    return response_data
+
+# Background job queue so long generations don't hold request threads open
+synthesis_jobs = SynthesisJobQueue(run_synthesis_job,
+                                   num_workers=SYNTH_WORKERS,
+                                   max_queue_size=SYNTH_QUEUE_SIZE,
+                                   job_ttl=SYNTH_JOB_TTL)
+
+@app.route('/synthesize', methods=['POST'])
+def synthesize_audio():
+    data = request.get_json()
+    text = data.get('text', '')
+    user_id = data.get('userId', '')
+    use_user_voice = data.get('use_user_voice', False)
+    # Without an explicit voice, adaptation starts from the preset nearest the user's voice
+    voice_id = data.get('voice') or ('auto' if use_user_voice else 'female_1')
+    run_async = data.get('async', SYNTH_ASYNC_DEFAULT)
+    use_cache = not data.get('no_cache', False)
+    include_timings = data.get('timings', False)  # Per-stage breakdown in the response
+    
     if not text:
         return jsonify({'message': 'No text provided.'}), 400
     
     try:
-        # Generate a unique filename for the synthesized audio
-        output_filename = f"{user_id}_{int(time.time())}.wav"
-        output_path = os.path.join(SYNTH_FOLDER, output_filename)
-        
-        print(f"Synthesizing audio for text: '{text}'")
-        print(f"Output path: {output_path}")
-        print(f"Using voice: {voice_id}")
-        print(f"Using user voice adaptation: {use_user_voice}")
-        
-        if BARK_LOADED:
-            # Use Bark to generate audio
-            selected_voice = VOICE_PRESETS.get(voice_id, "v2/en_speaker_0")
-            
-            # Generate audio with Bark
-            audio_array = generate_audio(text, history_prompt=selected_voice)
-            
-            # Apply voice adaptation if requested and available
-            if use_user_voice and user_id in user_voice_embeddings and user_id in user_voice_samples:
-                print(f"Applying voice adaptation for user {user_id}")
-                audio_array = adapt_voice(audio_array, user_id)
-            
-            # Save the audio file
-            sf.write(output_path, audio_array, SAMPLE_RATE)
-        else:
-            # Fallback to simple sine wave tone if Bark fails to load
-            print("Bark not available. Using simple tone generation")
-            fallback_generate_audio(output_path, text)
-        
-        # Check if the file was created
-        if not os.path.exists(output_path):
-            print("Output file was not created!")
-            raise Exception("Failed to generate audio file - file not created")
-        
-        file_size = os.path.getsize(output_path)
-        if file_size == 0:
-            print("Output file is empty!")
-            raise Exception("Failed to generate audio file - file is empty")
-            
-        print(f"Successfully created audio file: {output_path}, size: {file_size} bytes")
-        
-        # Absolute URL for the audio file
-        file_url = request.host_url.rstrip('/') + f'/synthesized/{output_filename}'
-        
-        # Return both streaming and download options
-        response_data = {
-            'message': 'Audio synthesized successfully',
-            'file_url': file_url,
-            'file_size': file_size,
-            'download_url': file_url + '?download=true',
-            'user_voice_applied': use_user_voice
-        }
+        output = parse_output(data.get('format'), data.get('sample_rate'))
+        check_voice(voice_id, user_id)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except PermissionError as e:
+        return jsonify({'message': str(e)}), 403
+    
+    # Estimate the work before doing any, so overload is refused up front
+    key = client_key(user_id)
+    adapt = bool(use_user_voice) and voice_profiles.has_voice(user_id)
+    cost = cost_model.estimate(text, adapt)
+    projected_wait = synthesis_jobs.projected_wait(key, cost) if run_async else None
+    ticket = None
+    if admission:
+        try:
+            ticket = admission.admit(key, cost, projected_wait)
+        except Rejected as e:
+            print(f"Rejected synthesis for {key}: {e}")
+            return rejection_response(e)
+    
+    if run_async:
+        try:
+            job = synthesis_jobs.submit({
+                'text': text,
+                'user_id': user_id,
+                'voice_id': voice_id,
+                'use_user_voice': use_user_voice,
+                'use_cache': use_cache,
+                'output': output,
+                'timings': include_timings,
+                'host_url': request.host_url,
+                'adapt': adapt,
+                'ticket': ticket
+            }, key=key, cost=cost)
+        except QueueFullError as e:
+            if ticket is not None:
+                admission.release(ticket, 0.0)
+            response = jsonify({'message': str(e), 'queue': synthesis_jobs.stats()})
+            response.headers['Retry-After'] = str(SYNTH_RETRY_AFTER)
+            return response, 503
         
-        # Include adaptation failure information if relevant
-        if adaptation_requested_but_failed and adaptation_failure_reason:
-            response_data['adaptation_failure'] = adaptation_failure_reason
-            
+        job_data, _ = synthesis_jobs.snapshot(job)
+        job_data['estimated_wait_seconds'] = round(projected_wait, 1)
+        job_data['message'] = 'Synthesis job queued'
+        job_data['status_url'] = f'/jobs/{job.id}'
+        job_data['events_url'] = f'/jobs/{job.id}/events'
+        return jsonify(job_data), 202
+    
+    start = time.perf_counter()
+    result = None
+    try:
+        try:
+            with collect_timings() as timings:
+                result = run_synthesis(text, user_id, voice_id, use_user_voice,
+                                       use_cache=use_cache, output=output)
+        finally:
+            settle_synthesis(ticket, text, adapt, time.perf_counter() - start if result else None,
+                             cached=bool(result and result['cached']))
+        response_data = build_synthesis_response(result, request.host_url)
+        if include_timings:
+            response_data['timings'] = timings
         return jsonify(response_data)
     
     except Exception as e:
         print(f"Error during synthesis: {e}")
         return jsonify({'message': f'Error synthesizing audio: {str(e)}'}), 500
 
+@app.route('/jobs', methods=['GET'])
+def job_queue_status():
+    """Report synthesis queue depth, worker utilisation and admission control"""
+    stats = synthesis_jobs.stats()
+    stats['admission'] = admission.stats() if admission else None
+    stats['event_streams'] = {'open': sse_open, 'max': SSE_MAX_STREAMS}
+    return jsonify(stats)
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Poll the state of a synthesis job"""
+    job = synthesis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'message': 'Job not found'}), 404
+    
+    job_data, _ = synthesis_jobs.snapshot(job)
+    return jsonify(job_data)
+
+# Each open event stream holds a request thread, so their number and length are bounded
+sse_lock = threading.Lock()
+sse_open = 0
+
+def close_event_stream():
+    global sse_open
+    with sse_lock:
+        sse_open -= 1
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent events stream of a job's status until it finishes.
+
+    Streams still open after SSE_MAX_SECONDS end with a retry hint; clients
+    then reconnect or poll /jobs/<job_id>.
+    """
+    global sse_open
+    job = synthesis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'message': 'Job not found'}), 404
+    
+    with sse_lock:
+        if SSE_MAX_STREAMS and sse_open >= SSE_MAX_STREAMS:
+            response = jsonify({'message': 'Too many open event streams; poll the job status instead',
+                                'status_url': f'/jobs/{job.id}'})
+            response.headers['Retry-After'] = str(SYNTH_RETRY_AFTER)
+            return response, 503
+        sse_open += 1
+    
+    def generate():
+        deadline = time.monotonic() + SSE_MAX_SECONDS if SSE_MAX_SECONDS else None
+        version = None
+        while True:
+            job_data, current = synthesis_jobs.snapshot(job)
+            if current != version:
+                version = current
+                yield f"event: {job.status}\ndata: {json.dumps(job_data)}\n\n"
+                if job.finished:
+                    return
+            else:
+                # Keep the connection alive through proxies while waiting
+                yield ": keep-alive\n\n"
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    yield f"retry: {SSE_RETRY_MS}\n: stream time limit reached; poll /jobs/{job.id}\n\n"
+                    return
+            synthesis_jobs.wait_for_update(job, version,
+                                           timeout=SSE_KEEPALIVE if deadline is None else min(SSE_KEEPALIVE, remaining))
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(close_event_stream)
+    return response
+
+@app.route('/synthesize/stream', methods=['GET', 'POST'])
+def synthesize_stream():
+    """Synthesize long text sentence by sentence, streaming a growing WAV.
+
+    Each chunk is sent as soon as it is generated, so playback can start after
+    the first sentence and memory use doesn't grow with the length of the text.
+    Accepts the same parameters as /synthesize, as JSON or query arguments so
+    an <audio> element can point straight at it.
+    """
+    data = request.get_json(silent=True) or request.args
+    text = data.get('text', '')
+    user_id = data.get('userId', '')
+    use_user_voice = str(data.get('use_user_voice', False)).lower() in ('1', 'true')
+    voice_id = data.get('voice') or ('auto' if use_user_voice else 'female_1')
+    
+    if not text:
+        return jsonify({'message': 'No text provided.'}), 400
+    
+    try:
+        check_voice(voice_id, user_id)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except PermissionError as e:
+        return jsonify({'message': str(e)}), 403
+    
+    chunks = split_text_into_chunks(text, max_chars=STREAM_CHUNK_CHARS)
+    use_user_voice = use_user_voice and voice_profiles.has_voice(user_id)
+    # Everything that can fail happens before admission; the ticket is only
+    # released once the response below is closed
+    selected_voice = select_preset(voice_id, user_id)
+    
+    ticket = None
+    if admission:
+        try:
+            ticket = admission.admit(client_key(user_id), cost_model.estimate(text, use_user_voice))
+        except Rejected as e:
+            print(f"Rejected streaming synthesis: {e}")
+            return rejection_response(e)
+    use_bark = bark_ready()
+    sample_rate = SAMPLE_RATE if use_bark else FALLBACK_SAMPLE_RATE
+    
+    print(f"Streaming synthesis of {len(chunks)} chunks with voice {voice_id}")
+    
+    def generate_chunks():
+        for i, chunk_text in enumerate(chunks):
+            print(f"Synthesizing chunk {i + 1}/{len(chunks)}: '{chunk_text}'")
+            if use_bark:
+                audio_array = bark_generate(chunk_text, selected_voice)
+            else:
+                audio_array = fallback_tone(chunk_text, sample_rate)
+            yield audio_array
+    
+    def generate():
+        yield wav_stream_header(sample_rate)
+        try:
+            blocks = crossfade_chunks(generate_chunks(), sample_rate, fade_ms=STREAM_CROSSFADE_MS)
+            if use_user_voice and use_bark and not is_user_prompt(selected_voice):
+                # Adapt the joined stream so phase and loudness carry across chunks
+                blocks = adapt_voice_stream(blocks, user_id)
+            for block in blocks:
+                AUDIO_SECONDS.inc(len(block) / sample_rate, engine='bark' if use_bark else 'fallback')
+                yield float_to_pcm16(block)
+        except Exception as e:
+            # Headers are already sent; all we can do is end the stream early
+            print(f"Error during streaming synthesis: {e}")
+    
+    response = Response(stream_with_context(generate()), mimetype='audio/wav')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers['X-Chunk-Count'] = str(len(chunks))
+    if ticket is not None:
+        # Runs however the stream ends, client disconnects included; charges the time it was open
+        response.call_on_close(lambda: admission.release(ticket, time.monotonic() - ticket.admitted_at))
+    return response
+
+def target_pitch_for(user_id):
+    """The user's mean F0 from their speaker profile, or None"""
+    # The user's pitch statistics were computed once at upload time
+    profile = get_speaker_profile(user_id)
+    if profile is None:
+        print(f"No speaker profile for user {user_id}")
+        return None
+    return profile.get('f0_mean', 0.0)
+
+def create_voice_adapter(audio_array, user_id):
+    """Streaming adapter that moves generated speech towards the user's voice.
+
+    The pitch ratio is measured on ``audio_array`` (the whole output, or the
+    first chunk of a stream) and then held for the rest of the signal.
+    Returns None when there is nothing to adapt to.
+    """
+    target_mean_pitch = target_pitch_for(user_id)
+    if target_mean_pitch is None:
+        return None
+    
+    # Extract pitch of the generated audio with Parselmouth; if it fails,
+    # there is nothing to adapt
+    with span('pitch_analysis'):
+        source_mean_pitch = mean_pitch(audio_array, SAMPLE_RATE)
+    factors = shift_factors(source_mean_pitch, target_mean_pitch)
+    if factors is None:
+        return None
+    shift_factor, formant_factor = factors
+    print(f"Pitch shift factor: {shift_factor}, formant shift factor: {formant_factor}")
+    
+    # Running loudness normalization replaces a global peak normalization
+    return StreamingAdapter(get_engine(SAMPLE_RATE), shift_factor, formant_factor,
+                            normalizer=RunningNormalizer(SAMPLE_RATE))
+
 def adapt_voice(audio_array, user_id):
     """Apply voice adaptation based on user's voice sample"""
     try:
-        # Load the original user voice sample
-        user_sample_path = user_voice_samples[user_id]
-        user_sample, user_sr = librosa.load(user_sample_path, sr=None)
-        
-        # Ensure the audio is in the right format
-        if user_sr != SAMPLE_RATE:
-            user_sample = resampy.resample(user_sample, user_sr, SAMPLE_RATE)
-        
-        # Extract pitch with Parselmouth
-        source_sound = parselmouth.Sound(audio_array, SAMPLE_RATE)
-        source_pitch = source_sound.to_pitch()
+        if dsp_pool is not None:
+            # Pitch analysis and adaptation both run in a worker process
+            target_mean_pitch = target_pitch_for(user_id)
+            if target_mean_pitch is None:
+                return audio_array
+            adapted = dsp_pool.adapt(audio_array, target_mean_pitch, SAMPLE_RATE, ADAPT_BLOCK_SIZE)
+            return audio_array if adapted is None else adapted
         
-        target_sound = parselmouth.Sound(user_sample, SAMPLE_RATE) 
-        target_pitch = target_sound.to_pitch()
+        adapter = create_voice_adapter(audio_array, user_id)
+        if adapter is None:
+            return audio_array
         
-        # Get pitch statistics 
-        source_mean_pitch = call(source_pitch, "Get mean", 0, 0, "Hertz")
-        target_mean_pitch = call(target_pitch, "Get mean", 0, 0, "Hertz")
-        
-        if source_mean_pitch > 0 and target_mean_pitch > 0:
-            # Calculate pitch shift ratio to match target voice
-            pitch_ratio = target_mean_pitch / source_mean_pitch
-            
-            # Apply pitch shifting (within reasonable limits to avoid artifacts)
-            shift_factor = max(0.5, min(2.0, pitch_ratio))  # Limit within 0.5x to 2x range
-            print(f"Pitch shift factor: {shift_factor}")
-            
-            # Apply pitch shifting
-            pitched_audio = librosa.effects.pitch_shift(
-                audio_array, 
-                sr=SAMPLE_RATE,
-                n_steps=12 * np.log2(shift_factor)  # Convert ratio to semitones
-            )
-            
-            # Apply a slight formant adjustment to better match the target voice
-            # This is a simple approximation
-            alpha = 0.85 + (0.3 * (1 - shift_factor))  # Range roughly 0.85-1.15
-            alpha = max(0.8, min(1.2, alpha))  # Keep in reasonable range
-            
-            # Apply rudimentary "formant shift" by resampling and then resampling back
-            temp_sr = int(SAMPLE_RATE * alpha)
-            formant_audio = resampy.resample(pitched_audio, SAMPLE_RATE, temp_sr)
-            formant_audio = resampy.resample(formant_audio, temp_sr, SAMPLE_RATE)
-            
-            # Normalize amplitude
-            formant_audio = formant_audio / np.max(np.abs(formant_audio)) * 0.9
-            
-            return formant_audio
-        
-        # If pitch extraction fails, return original
-        return audio_array
+        # Work through the signal in blocks so DSP memory doesn't grow with its length
+        blocks = (audio_array[i:i + ADAPT_BLOCK_SIZE]
+                  for i in range(0, len(audio_array), ADAPT_BLOCK_SIZE))
+        with span('adaptation'):
+            return np.concatenate(list(adapter.stream(blocks)))
         
     except Exception as e:
         print(f"Error in voice adaptation: {e}")
         # Return the original audio if adaptation fails
         return audio_array
 
+def adapt_voice_stream(blocks, user_id):
+    """Adapt a stream of audio blocks as they arrive, in constant memory"""
+    blocks = iter(blocks)
+    first = next(blocks, None)
+    if first is None:
+        return
+    
+    try:
+        adapter = create_voice_adapter(first, user_id)
+    except Exception as e:
+        print(f"Error in voice adaptation: {e}")
+        adapter = None
+    
+    if adapter is None:
+        yield first
+        yield from blocks
+        return
+    
+    yield from adapter.stream(itertools.chain([first], blocks))
+
+def speaker_profile_dir(user_id):
+    """Directory holding a user's persisted speaker profile.
+
+    Named after a hash of the user id rather than a sanitized copy of it,
+    which maps different ids (e.g. 'a/b' and 'a_b') to one directory.
+    """
+    return os.path.join(PROFILE_FOLDER, hashlib.sha256(user_id.encode('utf-8')).hexdigest()[:32])
+
+def derive_bark_prompt(user_id, profile_dir, version):
+    """Path of a Bark prompt made from the user's saved recording, or None when disabled or failed"""
+    if not USER_BARK_PROMPTS or not bark_ready() or not model_registry.ensure('semantic_tokenizer'):
+        return None
+    try:
+        with span('bark_prompt'):
+            wav = np.load(os.path.join(profile_dir, PROFILE_AUDIO_FILE), mmap_mode='r')
+            path = derive_user_prompt(wav, profile_dir, version, model_registry.get('semantic_tokenizer'))
+        print(f"Bark prompt derived for user {user_id}")
+        return path
+    except Exception as e:
+        print(f"Error deriving Bark prompt for user {user_id}: {e}")
+        return None
+
+def user_bark_prompt(user_id):
+    """Path of the Bark prompt derived from the user's recording, or None"""
+    record = voice_profiles.get(user_id) if user_id else None
+    path = (record['profile'] or {}).get('bark_prompt') if record else None
+    return path if path and os.path.exists(path) else None
+
+def nearest_preset(user_id):
+    """Name of the preset closest to the user's voice, or None"""
+    record = voice_profiles.get(user_id) if user_id else None
+    if record is None or record['embedding'] is None:
+        return None
+    index = model_registry.get('preset_index')
+    if index is None:
+        return None
+    profile = get_speaker_profile(user_id)
+    matches = index.nearest(record['embedding'], profile.get('f0_mean') if profile else None)
+    return matches[0][0] if matches else None
+
+def check_voice(voice_id, user_id):
+    """Raise ValueError for a malformed voice, PermissionError for another user's voice"""
+    if not isinstance(voice_id, str):
+        raise ValueError("voice must be a string")
+    if voice_id.startswith('user_') and (not user_id or voice_id != f"user_{user_id}"):
+        raise PermissionError("Only your own recorded voice can be used")
+
+def select_preset(voice_id, user_id):
+    """Bark history prompt for a requested voice.
+
+    'auto' and the requester's own voice ('user_<userId>') use the prompt
+    derived from their recording when there is one, and otherwise the preset
+    closest to their voice, so adaptation has the least pitch and timbre to
+    move. Other users' voices are refused (see ``check_voice``).
+    """
+    check_voice(voice_id, user_id)
+    if voice_id in VOICE_PRESETS:
+        return VOICE_PRESETS[voice_id]
+    if voice_id == 'auto' or voice_id.startswith('user_'):
+        voice_user = user_id
+        prompt = user_bark_prompt(voice_user)
+        if prompt is not None:
+            return prompt
+        name = nearest_preset(voice_user)
+        if name is not None:
+            print(f"Nearest preset to user {voice_user}: {name}")
+            return VOICE_PRESETS[name]
+    return DEFAULT_PRESET
+
+def get_speaker_profile(user_id):
+    """Return the user's speaker profile statistics, or None"""
+    record = voice_profiles.get(user_id)
+    if record is not None and record['profile'] is not None:
+        return record['profile']
+    
+    # Profiles saved before the store existed only live on disk
+    profile = load_speaker_profile(speaker_profile_dir(user_id))
+    if profile is not None:
+        profile.pop('audio', None)
+    return profile
+
 def fallback_generate_audio(output_path, text):
     """Fallback audio generation method using simple sine waves"""
-    sample_rate = 22050  # Sample rate
+    samples = fallback_tone(text)
+    
+    # Save as WAV file
+    sf.write(output_path, samples, FALLBACK_SAMPLE_RATE)
+
+def fallback_tone(text, sample_rate=FALLBACK_SAMPLE_RATE):
+    """Simple sine wave tone standing in for speech when Bark is unavailable"""
     pitch = 220.0  # Base frequency (A3)
     duration = min(len(text) * 0.1, 10.0)  # Duration based on text length
     
@@ -363,40 +1208,161 @@ def fallback_generate_audio(output_path, text):
     samples += 0.3 * np.sin(4 * np.pi * pitch * t * mod_freq)
     samples *= np.exp(-0.5 * t / duration)  # Apply envelope
     
-    # Save as WAV file
-    sf.write(output_path, samples, sample_rate)
+    return samples
 
 # Add a route to directly download synthesized files
 @app.route('/synthesized/<path:filename>')
 def download_file(filename):
+    """Serve a synthesized file, optionally transcoded.
+
+    The format comes from the ``format`` argument or, failing that, the Accept
+    header; ``rate`` picks the sample rate. Responses support Range requests
+    and ETag/If-None-Match revalidation.
+    """
     download = request.args.get('download', False)
-    filepath = os.path.join(SYNTH_FOLDER, filename)
+    # Found through the in-memory index, not the filesystem
+    filepath = synth_store.lookup(filename)
     
     # Check if file exists
-    if not os.path.exists(filepath):
+    if filepath is None:
         return jsonify({'error': 'File not found'}), 404
     
-    # For direct download
-    if download:
-        return send_file(filepath, 
-                     mimetype='audio/wav',
-                     as_attachment=True,
-                     download_name=filename)
+    fmt = request.args.get('format')
+    rate = request.args.get('rate')
+    variant = VARIANT_RE.match(os.path.basename(filename))
+    # A variant is already transcoded, so the Accept header doesn't apply to it
+    negotiated = fmt is None and variant is None
+    if negotiated:
+        fmt = ACCEPT_TYPES.get(request.accept_mimetypes.best_match(list(ACCEPT_TYPES), default='audio/wav'))
+    elif fmt is None:
+        fmt, rate = variant.group('format'), rate or variant.group('rate')
+    try:
+        output = parse_output(fmt, rate)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if variant is not None:
+        # Served as is, as long as it is what was asked for
+        if output is None or variant_filename(variant.group('stem') + '.wav', *output) != os.path.basename(filename):
+            return jsonify({'error': 'Only original files can be transcoded'}), 400
+    elif output is not None:
+        try:
+            filename = transcoded_variant(filename, *output)
+        except Exception as e:
+            print(f"Error transcoding {filename}: {e}")
+            return jsonify({'error': f'Could not transcode audio: {e}'}), 500
+        filepath = synth_store.path(filename)
     
-    # For streaming in browser
-    return send_file(filepath, mimetype='audio/wav')
+    # Content-addressed cache files never change, so clients and CDNs may keep them
+    max_age = SYNTH_CACHE_MAX_AGE if synthesis_cache.is_cache_file(os.path.basename(filename)) else None
+    # send_file resolves relative paths against the app's root, not the working directory
+    response = send_file(os.path.abspath(filepath),
+                         mimetype=mimetype_for(filename),
+                         as_attachment=bool(download),
+                         download_name=os.path.basename(filename),
+                         conditional=True,
+                         etag=True,
+                         max_age=max_age)
+    response.headers['Accept-Ranges'] = 'bytes'
+    if negotiated:
+        response.vary.add('Accept')
+    return response
+
+def transcoded_variant(master_filename, fmt, rate):
+    """Create or reuse a transcoded variant of a file in the synthesized store"""
+    # Variants are written next to their master, in the same shard
+    folder = os.path.dirname(synth_store.path(master_filename))
+    with span('transcode'):
+        filename, created = ensure_variant(folder, master_filename, fmt, rate)
+    if created or synth_store.size(filename) is None:
+        synth_store.add(filename, os.path.join(folder, filename))
+    if created:
+        print(f"Transcoded {master_filename} to {filename}")
+        synthesis_cache.add_variant(filename)
+    return filename
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    status = "ok" if BARK_LOADED else "limited" 
+    bark_loaded = model_registry.is_ready('bark')
+    status = "ok" if bark_loaded else "limited" 
     return jsonify({
         'status': status,
-        'bark_loaded': BARK_LOADED,
-        'voice_adaptation_loaded': VOICE_ENCODER_LOADED,
+        'bark_loaded': bark_loaded,
+        'voice_adaptation_loaded': model_registry.is_ready('voice_encoder'),
+        'live': True,
+        'ready': model_registry.ready(),
+        'models': model_registry.status(),
         'ffmpeg_available': FFMPEG_AVAILABLE,
-        'device': 'GPU' if torch.cuda.is_available() else 'CPU'
+        'device': 'GPU' if torch.cuda.is_available() else 'CPU',
+        'cpu_perf': {
+            'enabled': CPU_PERF_MODE,
+            'torch_threads': torch_threads,
+            'torch_compile': TORCH_COMPILE,
+            'bark': bark_optimizations,
+        },
+        'synthesis_queue': synthesis_jobs.stats(),
+        'admission': admission.stats() if admission else None,
+        'synthesis_cache': synthesis_cache.stats(),
+        'storage': {'uploads': upload_store.stats(), 'synthesized': synth_store.stats()},
+        'voice_profiles': voice_profiles.stats(),
+        'bark_batching': bark_batcher.stats() if bark_batcher else None,
+        'semantic_cache': semantic_cache.stats() if semantic_cache else None,
+        'dsp_pool': dsp_pool.stats() if dsp_pool else None,
+        'preset_index': model_registry.get('preset_index').stats() if model_registry.is_ready('preset_index') else None,
+        'voice_prompts': voice_prompts.stats(),
+        'enrollment_sessions': enrollment_sessions.stats()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of this process's metrics"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/profile', methods=['GET'])
+def sampling_profile():
+    """Sample all threads' stacks for a while; returns folded stacks for flame graphs"""
+    if not PROFILER_ENABLED:
+        return jsonify({'message': 'Profiler disabled; set PROFILER_ENABLED=1'}), 404
+    try:
+        seconds = min(float(request.args.get('seconds', 10)), PROFILER_MAX_SECONDS)
+        interval = float(request.args.get('interval_ms', 5)) / 1000.0
+    except ValueError:
+        return jsonify({'message': 'seconds and interval_ms must be numbers'}), 400
+    if not profiler_lock.acquire(blocking=False):
+        return jsonify({'message': 'A profile is already running'}), 409
+    try:
+        profiler = SamplingProfiler(interval=max(interval, 0.001))
+        profiler.start()
+        time.sleep(seconds)
+        profiler.stop()
+    finally:
+        profiler_lock.release()
+    response = Response(profiler.collapsed(), mimetype='text/plain')
+    response.headers['X-Profile-Samples'] = str(profiler.samples)
+    return response
+
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """The process is up and serving requests, even while models load"""
+    return jsonify({'live': True})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """503 until required models are loaded and warmed up (in lazy mode, only once one fails)"""
+    ready = model_registry.ready()
+    return jsonify({'ready': ready, **model_registry.status()}), 200 if ready else 503
+
+@app.route('/warmup', methods=['POST'])
+def warm_up_models():
+    """Load any models that aren't loaded yet and run their warm-up inference"""
+    model_registry.warm_up()
+    return jsonify({'ready': model_registry.ready(), **model_registry.status()})
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit, miss and eviction counters for the synthesis output cache"""
+    return jsonify(synthesis_cache.stats())
+
 @app.route('/dependencies', methods=['GET'])
 def check_dependencies():
     """Check system dependencies and provide installation instructions"""
@@ -410,10 +1376,10 @@ def check_dependencies():
             }
         },
         'voice_encoder': {
-            'available': VOICE_ENCODER_LOADED
+            'available': model_registry.is_ready('voice_encoder')
         },
         'bark': {
-            'available': BARK_LOADED
+            'available': model_registry.is_ready('bark')
         }
     }
     
@@ -422,11 +1388,11 @@ def check_dependencies():
 @app.route('/voices', methods=['GET'])
 def get_voices():
     try:
-        # Get user IDs that have voice samples
-        user_voices = [
-            {'id': 'user_' + user_id, 'name': f"Your Uploaded Voice", 'is_user_voice': True}
-            for user_id in user_voice_embeddings.keys()
-        ]
+        # Only the requester's own recorded voice; other users' ids are not disclosed
+        user_id = request.args.get('userId', '')
+        user_voices = []
+        if user_id and voice_profiles.has_voice(user_id):
+            user_voices.append({'id': 'user_' + user_id, 'name': "Your Uploaded Voice", 'is_user_voice': True})
         
         # Add AI voices
         ai_voices = [
@@ -450,7 +1416,8 @@ def user_voice_status():
     if not user_id:
         return jsonify({'has_voice': False, 'message': 'No user ID provided'}), 400
     
-    has_voice = user_id in user_voice_embeddings
+    record = voice_profiles.get(user_id)
+    has_voice = record is not None and record['embedding'] is not None
     message = 'Voice sample found and processed' if has_voice else 'No voice sample found for this user'
     
     response_data = {
@@ -459,9 +1426,16 @@ def user_voice_status():
         'ffmpeg_available': FFMPEG_AVAILABLE
     }
     
+    # Whether synthesis can condition on a prompt made from the user's voice
+    response_data['bark_prompt'] = has_voice and user_bark_prompt(user_id) is not None
+    
+    # The preset synthesis starts from for this user, once the index is built
+    if has_voice and model_registry.is_ready('preset_index'):
+        response_data['nearest_preset'] = nearest_preset(user_id)
+    
     # Include error information if available
-    if user_id in user_voice_errors:
-        response_data['error'] = user_voice_errors[user_id]
+    if record and record['error']:
+        response_data['error'] = record['error']
     
     return jsonify(response_data)
 
@@ -471,7 +1445,7 @@ def test_audio():
     try:
         # Generate a simple sine wave as a WAV file
         print("Generating test audio file...")
-        test_file = os.path.join(SYNTH_FOLDER, "test_tone.wav")
+        test_filename = "test_tone.wav"
         
         # Generate a simple sine wave
         sample_rate = 44100  # 44.1 kHz
@@ -483,7 +1457,7 @@ def test_audio():
         samples = (32767 * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
         
         # Write to WAV file
-        sf.write(test_file, samples, sample_rate)
+        test_file = synth_store.write(test_filename, lambda path: sf.write(path, samples, sample_rate))
         
         print(f"Test audio file generated at {test_file}")
         
@@ -537,5 +1511,22 @@ def test_audio():
         print(f"Error generating test audio: {e}")
         return jsonify({'message': f'Error generating test audio: {str(e)}'}), 500
 
+def start_service():
+    """Startup work for serving: index the stored files and begin loading models.
+
+    Runs at import unless SERVICE_AUTOSTART=0, so ``gunicorn app:app`` needs
+    nothing else. Tools that only use the synthesis pipeline, such as the
+    workers of bulk_synthesize.py, import with it off and load just the
+    models they use.
+    """
+    upload_store.load()
+    synth_store.load()
+    synthesis_cache.load()
+    model_registry.start()
+
+# DSP worker processes re-import this script; they don't need the models
+if SERVICE_AUTOSTART and __name__ != '__mp_main__':
+    start_service()
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
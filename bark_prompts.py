@@ -0,0 +1,177 @@
+"""Bark history prompts held in memory, and prompts derived from users' own recordings"""
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+
+import librosa
+import numpy as np
+
+from speaker_profile import ENCODER_SAMPLE_RATE, PROFILE_SAMPLE_RATE
+
+PROMPT_KEYS = ('semantic_prompt', 'coarse_prompt', 'fine_prompt')
+USER_PROMPT_RE = re.compile(r'^bark_prompt-[0-9a-f]+\.npz$')
+USER_PROMPT_SECONDS = 10  # Longer than Bark's history window, which keeps the last few seconds
+COARSE_CODEBOOKS = 2
+
+
+def is_user_prompt(prompt):
+    """Whether a prompt is a file derived from a user's recording"""
+    return isinstance(prompt, str) and bool(USER_PROMPT_RE.match(os.path.basename(prompt)))
+
+
+def read_prompt(prompt):
+    """Arrays of a preset name or ``.npz`` path, as Bark would load them"""
+    from bark.generation import _load_history_prompt
+    data = _load_history_prompt(prompt)
+    arrays = {key: np.array(data[key]) for key in PROMPT_KEYS}
+    for array in arrays.values():
+        # Shared by every request; Bark only reads them
+        array.setflags(write=False)
+    return arrays
+
+
+class PromptCache:
+    """Bark history prompts loaded once and passed to Bark as arrays.
+
+    Bark reads a preset's ``.npz`` from disk on every stage of every call
+    when given its name. Presets are loaded up front with ``preload`` and
+    kept for the life of the process; user prompts are loaded on first use
+    and kept in an LRU of ``max_user_prompts``. Prompts are keyed by name or
+    path, so user prompt files must never be rewritten in place.
+    ``loader(prompt)`` returns the arrays of one prompt.
+    """
+
+    def __init__(self, max_user_prompts=256, loader=read_prompt):
+        self.max_user_prompts = max_user_prompts
+        self.loader = loader
+        self._presets = {}
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def preload(self, prompts):
+        """Load ``{name: prompt}``; returns the names that failed"""
+        failed = []
+        for name, prompt in prompts.items():
+            try:
+                arrays = self.loader(prompt)
+            except Exception as e:
+                print(f"Error loading voice preset {name}: {e}")
+                failed.append(name)
+                continue
+            with self._lock:
+                self._presets[prompt] = arrays
+                self.loads += 1
+        return failed
+
+    def get(self, prompt):
+        """Arrays for a prompt name or path; dicts and None pass through"""
+        if not isinstance(prompt, str):
+            return prompt
+        with self._lock:
+            arrays = self._presets.get(prompt)
+            if arrays is None:
+                arrays = self._users.get(prompt)
+                if arrays is not None:
+                    self._users.move_to_end(prompt)
+        if arrays is not None:
+            return arrays
+
+        arrays = self.loader(prompt)
+        with self._lock:
+            self.loads += 1
+            if is_user_prompt(prompt):
+                self._users[prompt] = arrays
+                while len(self._users) > self.max_user_prompts:
+                    self._users.popitem(last=False)
+            else:
+                # A preset added after startup
+                self._presets[prompt] = arrays
+        return arrays
+
+    def stats(self):
+        with self._lock:
+            return {
+                'presets': len(self._presets),
+                'user_prompts': len(self._users),
+                'max_user_prompts': self.max_user_prompts,
+                'loads': self.loads,
+            }
+
+
+class SemanticTokenizer:
+    """HuBERT features quantized to Bark's semantic vocabulary.
+
+    Bark has no encoder from audio to its semantic tokens, so this uses the
+    ``bark_hubert_quantizer`` package's HuBERT model and k-means tokenizer,
+    which are downloaded on first load.
+    """
+
+    def __init__(self, device='cpu'):
+        from bark_hubert_quantizer.hubert_manager import HuBERTManager
+        from bark_hubert_quantizer.pre_kmeans_hubert import CustomHubert
+        from bark_hubert_quantizer.customtokenizer import CustomTokenizer
+        manager = HuBERTManager()
+        self.hubert = CustomHubert(checkpoint_path=manager.make_sure_hubert_installed(), device=device)
+        self.tokenizer = CustomTokenizer.load_from_checkpoint(manager.make_sure_tokenizer_installed(),
+                                                              map_location=device)
+        self.device = device
+
+    def tokens(self, wav_16k):
+        import torch
+        with torch.inference_mode():
+            wav = torch.from_numpy(np.ascontiguousarray(wav_16k, dtype=np.float32)).to(self.device)
+            vectors = self.hubert.forward(wav, input_sample_hz=ENCODER_SAMPLE_RATE)
+            return self.tokenizer.get_token(vectors).cpu().numpy().reshape(-1)
+
+
+def codec_tokens(wav):
+    """EnCodec codes of 24 kHz audio with Bark's loaded codec, shaped (codebooks, frames)"""
+    import torch
+    from bark.generation import models, load_codec_model
+    codec = models.get('codec') or load_codec_model()
+    device = next(codec.parameters()).device
+    with torch.inference_mode():
+        x = torch.from_numpy(np.ascontiguousarray(wav, dtype=np.float32)).to(device)[None, None]
+        frames = codec.encode(x)
+        codes = torch.cat([frame[0] for frame in frames], dim=-1)
+    return codes.squeeze(0).cpu().numpy()
+
+
+def derive_user_prompt(wav, profile_dir, version, tokenizer):
+    """Build a Bark history prompt from a user's trimmed recording and save it.
+
+    ``wav`` is at ``PROFILE_SAMPLE_RATE`` (Bark's codec rate). Fine and coarse
+    prompts are the recording's EnCodec codes and the semantic prompt its
+    HuBERT tokens, so generation is conditioned on the user's own voice.
+    Each version gets a new file, so cached copies never go stale; older
+    versions are removed. Returns the path.
+    """
+    wav = np.asarray(wav, dtype=np.float32)[:USER_PROMPT_SECONDS * PROFILE_SAMPLE_RATE]
+    fine = codec_tokens(wav).astype(np.int64)
+    semantic = tokenizer.tokens(librosa.resample(wav, orig_sr=PROFILE_SAMPLE_RATE,
+                                                 target_sr=ENCODER_SAMPLE_RATE)).astype(np.int64)
+    if semantic.size == 0 or fine.size == 0:
+        raise ValueError("Recording too short for a voice prompt")
+
+    os.makedirs(profile_dir, exist_ok=True)
+    name = f"bark_prompt-{version or uuid.uuid4().hex}.npz"
+    path = os.path.join(profile_dir, name)
+    tmp_path = os.path.join(profile_dir, f".tmp-{uuid.uuid4().hex}.npz")
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, semantic_prompt=semantic, coarse_prompt=fine[:COARSE_CODEBOOKS], fine_prompt=fine)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    for old in os.listdir(profile_dir):
+        if old != name and USER_PROMPT_RE.match(old):
+            try:
+                os.remove(os.path.join(profile_dir, old))
+            except OSError:
+                pass
+    return path
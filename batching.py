@@ -0,0 +1,183 @@
+"""Cross-request micro-batching of Bark generation"""
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Collects items submitted from many threads and runs them in batches.
+
+    The first item of a batch opens a window of ``window_ms``; everything that
+    arrives before the window closes (up to ``max_batch`` items) goes into the
+    same call of ``batch_fn(items)``, which must return one result per item.
+    Callers block in ``submit`` until their own result is ready.
+    """
+
+    def __init__(self, batch_fn, window_ms=30, max_batch=8, name='batcher'):
+        self.batch_fn = batch_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.name = name
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes = {}
+
+    def submit(self, item):
+        """Queue an item and wait for its result (exceptions are re-raised)"""
+        future = Future()
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+            self._pending.append((item, future))
+            self._cond.notify_all()
+        return future.result()
+
+    def _next_batch(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending)
+            deadline = time.monotonic() + self.window
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            items = [item for item, _ in batch]
+            try:
+                results = self.batch_fn(items)
+            except Exception as e:
+                print(f"Error in {self.name} batch of {len(items)}: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(items)
+            self.batch_sizes[len(items)] = self.batch_sizes.get(len(items), 0) + 1
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            'window_ms': self.window * 1000,
+            'max_batch': self.max_batch,
+            'pending': pending,
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+            'batch_sizes': dict(sorted(self.batch_sizes.items())),
+        }
+
+
+def generate_text_semantic_batch(texts, history_prompts, temp=0.7, min_eos_p=0.2):
+    """Batched version of Bark's ``generate_text_semantic``.
+
+    Bark's text model always sees a fixed 256 text + 256 history + 1 token
+    context, so requests stack into one batch without attention masks. All
+    rows decode together with a shared KV cache; a row that has emitted its
+    end-of-sequence token keeps being fed padding until the whole batch is
+    done, and only its real tokens are returned.
+    """
+    import torch
+    import torch.nn.functional as F
+    from bark.generation import (
+        models, preload_models, _tokenize, _normalize_whitespace,
+        _load_history_prompt, _inference_mode,
+        TEXT_ENCODING_OFFSET, TEXT_PAD_TOKEN, SEMANTIC_PAD_TOKEN,
+        SEMANTIC_INFER_TOKEN, SEMANTIC_VOCAB_SIZE,
+    )
+
+    if "text" not in models:
+        preload_models()
+    model = models["text"]["model"]
+    tokenizer = models["text"]["tokenizer"]
+    device = next(model.parameters()).device
+
+    rows = []
+    for text, history_prompt in zip(texts, history_prompts):
+        encoded_text = np.array(_tokenize(tokenizer, _normalize_whitespace(text))) + TEXT_ENCODING_OFFSET
+        encoded_text = encoded_text[:256]
+        encoded_text = np.pad(encoded_text, (0, 256 - len(encoded_text)),
+                              constant_values=TEXT_PAD_TOKEN, mode="constant")
+        if history_prompt is not None:
+            semantic_history = _load_history_prompt(history_prompt)["semantic_prompt"].astype(np.int64)[-256:]
+            semantic_history = np.pad(semantic_history, (0, 256 - len(semantic_history)),
+                                      constant_values=SEMANTIC_PAD_TOKEN, mode="constant")
+        else:
+            semantic_history = np.full(256, SEMANTIC_PAD_TOKEN)
+        rows.append(np.hstack([encoded_text, semantic_history, [SEMANTIC_INFER_TOKEN]]))
+
+    prefix = 256 + 256 + 1
+    n_tot_steps = 768
+    with _inference_mode():
+        x = torch.from_numpy(np.stack(rows).astype(np.int64)).to(device)
+        batch_size = x.shape[0]
+        done = torch.zeros(batch_size, dtype=torch.bool, device=device)
+        lengths = torch.zeros(batch_size, dtype=torch.long, device=device)
+        kv_cache = None
+        for _ in range(n_tot_steps):
+            x_input = x[:, [-1]] if kv_cache is not None else x
+            logits, kv_cache = model(x_input, merge_context=True, use_cache=True, past_kv=kv_cache)
+            relevant_logits = torch.cat(
+                (logits[:, 0, :SEMANTIC_VOCAB_SIZE], logits[:, 0, [SEMANTIC_PAD_TOKEN]]), dim=1)
+            probs = F.softmax(relevant_logits / temp, dim=-1)
+            item_next = torch.multinomial(probs, num_samples=1)
+            eos = (item_next[:, 0] == SEMANTIC_VOCAB_SIZE)
+            if min_eos_p is not None:
+                eos |= probs[:, -1] >= min_eos_p
+            done |= eos
+            if bool(done.all()):
+                break
+            lengths += (~done).long()
+            item_next = torch.where(done[:, None], torch.full_like(item_next, SEMANTIC_PAD_TOKEN), item_next)
+            x = torch.cat((x, item_next), dim=1)
+        out = x.detach().cpu().numpy()
+        lengths = lengths.cpu().numpy()
+
+    return [out[i, prefix:prefix + lengths[i]] for i in range(len(rows))]
+
+
+def generate_semantic_batch(items, temp=0.7):
+    """Batch handler for ``(text, history_prompt)`` items returning semantic tokens"""
+    texts = [text for text, _ in items]
+    prompts = [prompt for _, prompt in items]
+    return generate_text_semantic_batch(texts, prompts, temp=temp)
+
+
+def generate_audio_batch(items, text_temp=0.7, waveform_temp=0.7):
+    """Batch handler for ``(text, history_prompt)`` items.
+
+    The text-to-semantic pass, Bark's largest autoregressive stage, runs as
+    one batch. Coarse and fine generation use sliding windows whose length
+    depends on each item's semantic output, so they run per item afterwards.
+    """
+    from bark import semantic_to_waveform
+
+    prompts = [prompt for _, prompt in items]
+    semantic_batch = generate_semantic_batch(items, temp=text_temp)
+
+    results = []
+    for semantic_tokens, prompt in zip(semantic_batch, prompts):
+        try:
+            results.append(semantic_to_waveform(semantic_tokens, history_prompt=prompt,
+                                                temp=waveform_temp, silent=True))
+        except Exception as e:
+            results.append(e)
+    return results
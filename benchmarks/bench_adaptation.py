@@ -0,0 +1,168 @@
+"""Speed and output comparison of the adaptation engine against the legacy chain.
+
+The legacy chain is what adapt_voice used to run: librosa's pitch_shift
+followed by a resampy round trip for the "formant shift". It needs librosa
+and resampy installed; without them only the engine is measured.
+
+    python benchmarks/bench_adaptation.py --durations 2,5,10 --json adaptation.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from scipy import signal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adaptation import AdaptationEngine, formant_ratio_for  # noqa: E402
+
+SAMPLE_RATE = 24000  # Bark's output rate
+FORMANTS = ((700, 110), (1220, 120), (2600, 160))  # /a/-like vowel: (Hz, bandwidth)
+
+
+def synthetic_vowel(f0, duration, sample_rate=SAMPLE_RATE, seed=0):
+    """Glottal pulse train with slight vibrato through three formant resonators"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    inst_f0 = f0 * (1 + 0.02 * np.sin(2 * np.pi * 5 * t))
+    phase = np.cumsum(inst_f0) / sample_rate
+    pulses = np.diff(np.floor(phase), prepend=0.0)
+    audio = pulses + 0.002 * rng.standard_normal(len(t))
+    for freq, bandwidth in FORMANTS:
+        r = np.exp(-np.pi * bandwidth / sample_rate)
+        theta = 2 * np.pi * freq / sample_rate
+        audio = signal.lfilter([1 - r], [1, -2 * r * np.cos(theta), r * r], audio)
+    return (audio / np.max(np.abs(audio)) * 0.9).astype(np.float32)
+
+
+def legacy_adapt(audio, shift_factor, sample_rate=SAMPLE_RATE):
+    """The previous adapt_voice DSP: pitch_shift plus a resampy round trip"""
+    import librosa
+    import resampy
+    pitched = librosa.effects.pitch_shift(audio, sr=sample_rate, n_steps=12 * np.log2(shift_factor))
+    alpha = max(0.8, min(1.2, 0.85 + (0.3 * (1 - shift_factor))))
+    temp_sr = int(sample_rate * alpha)
+    out = resampy.resample(pitched, sample_rate, temp_sr)
+    out = resampy.resample(out, temp_sr, sample_rate)
+    return out / np.max(np.abs(out)) * 0.9
+
+
+def engine_adapt(engine, audio, shift_factor):
+    out = engine.process(audio, shift_factor, formant_ratio_for(shift_factor))
+    return out / np.max(np.abs(out)) * 0.9
+
+
+def estimate_f0(audio, sample_rate=SAMPLE_RATE, fmin=60, fmax=500):
+    """Median autocorrelation F0 over 40 ms frames"""
+    frame = int(0.04 * sample_rate)
+    estimates = []
+    for start in range(0, len(audio) - frame, frame):
+        x = audio[start:start + frame] - np.mean(audio[start:start + frame])
+        ac = np.correlate(x, x, 'full')[frame - 1:]
+        lo, hi = int(sample_rate / fmax), int(sample_rate / fmin)
+        if ac[0] <= 0:
+            continue
+        lag = lo + int(np.argmax(ac[lo:hi]))
+        estimates.append(sample_rate / lag)
+    return float(np.median(estimates)) if estimates else 0.0
+
+
+def spectral_centroid(audio, sample_rate=SAMPLE_RATE):
+    spectrum = np.abs(np.fft.rfft(audio))
+    freqs = np.fft.rfftfreq(len(audio), 1 / sample_rate)
+    return float(np.sum(freqs * spectrum) / np.sum(spectrum))
+
+
+def log_spectral_distance(a, b, n_fft=1024):
+    """Mean log-spectral distance in dB between two equal-rate signals"""
+    n = min(len(a), len(b))
+    _, _, sa = signal.stft(a[:n], nperseg=n_fft)
+    _, _, sb = signal.stft(b[:n], nperseg=n_fft)
+    la = 20 * np.log10(np.abs(sa) + 1e-6)
+    lb = 20 * np.log10(np.abs(sb) + 1e-6)
+    return float(np.mean(np.sqrt(np.mean((la - lb) ** 2, axis=0))))
+
+
+def time_call(fn, repeats):
+    timings = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return result, float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--durations', default='2,5,10', help='Signal lengths in seconds')
+    parser.add_argument('--f0s', default='120,220', help='Source F0 values in Hz')
+    parser.add_argument('--shifts', default='0.75,1.3', help='Pitch shift factors')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--json', help='Write results to this file as JSON')
+    args = parser.parse_args()
+
+    try:
+        import librosa  # noqa: F401
+        import resampy  # noqa: F401
+        have_legacy = True
+    except ImportError:
+        have_legacy = False
+        print("librosa/resampy not installed; measuring the engine only")
+
+    engine = AdaptationEngine(SAMPLE_RATE)
+    # Keep one-off JIT compilation and plan creation out of the timings
+    warmup = synthetic_vowel(150, 1.0)
+    engine_adapt(engine, warmup, 1.1)
+    if have_legacy:
+        legacy_adapt(warmup, 1.1)
+
+    results = []
+    for duration in [float(d) for d in args.durations.split(',')]:
+        for f0 in [float(f) for f in args.f0s.split(',')]:
+            audio = synthetic_vowel(f0, duration)
+            for shift in [float(s) for s in args.shifts.split(',')]:
+                target_f0 = f0 * shift
+                out, seconds = time_call(lambda: engine_adapt(engine, audio, shift), args.repeats)
+                row = {
+                    'duration_s': duration,
+                    'source_f0': f0,
+                    'shift': shift,
+                    'target_f0': target_f0,
+                    'engine': {
+                        'seconds': seconds,
+                        'realtime_factor': seconds / duration,
+                        'output_f0': estimate_f0(out),
+                        'centroid_hz': spectral_centroid(out),
+                    },
+                }
+                if have_legacy:
+                    legacy_out, legacy_seconds = time_call(lambda: legacy_adapt(audio, shift), args.repeats)
+                    row['legacy'] = {
+                        'seconds': legacy_seconds,
+                        'realtime_factor': legacy_seconds / duration,
+                        'output_f0': estimate_f0(legacy_out),
+                        'centroid_hz': spectral_centroid(legacy_out),
+                    }
+                    row['speedup'] = legacy_seconds / seconds
+                    row['log_spectral_distance_db'] = log_spectral_distance(out, legacy_out)
+                results.append(row)
+
+                line = (f"{duration:5.1f}s f0 {f0:5.0f} x{shift:.2f} | engine {seconds * 1000:8.1f} ms "
+                        f"f0 {row['engine']['output_f0']:6.1f} (target {target_f0:6.1f})")
+                if have_legacy:
+                    line += (f" | legacy {row['legacy']['seconds'] * 1000:8.1f} ms "
+                             f"f0 {row['legacy']['output_f0']:6.1f} | speedup {row['speedup']:.1f}x")
+                print(line)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'benchmark': 'adaptation', 'sample_rate': SAMPLE_RATE,
+                       'legacy_available': have_legacy, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
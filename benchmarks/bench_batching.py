@@ -0,0 +1,129 @@
+"""Throughput vs latency of Bark micro-batching at different batch windows.
+
+By default the batch function is a synthetic cost model (a fixed per-call
+overhead plus a smaller per-item cost, the shape batching exploits) so the
+scheduler can be tuned without model weights. Pass --bark to time real Bark
+generation instead.
+
+    python benchmarks/bench_batching.py --windows 0,20,50 --rate 8 --requests 64
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batching import MicroBatcher  # noqa: E402
+
+BARK_TEXTS = [
+    "Hello, thanks for calling.",
+    "Please hold while we connect you.",
+    "Your appointment is confirmed for tomorrow.",
+    "Press one to repeat this message.",
+]
+
+
+def synthetic_batch_fn(call_cost, item_cost):
+    """Batch function whose run time is call_cost + item_cost * batch size"""
+    def run(items):
+        time.sleep(call_cost + item_cost * len(items))
+        return [np.zeros(1) for _ in items]
+    return run
+
+
+def bark_batch_fn():
+    from bark import preload_models
+    from batching import generate_audio_batch
+    preload_models()
+    return generate_audio_batch
+
+
+def run_load(batch_fn, window_ms, max_batch, rate, requests, seed, make_item):
+    """Open-loop Poisson arrivals at ``rate`` req/s; returns a result dict"""
+    batcher = MicroBatcher(batch_fn, window_ms=window_ms, max_batch=max_batch)
+    rng = random.Random(seed)
+    latencies = []
+    lock = threading.Lock()
+
+    def client(i):
+        start = time.perf_counter()
+        batcher.submit(make_item(i))
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    threads = []
+    began = time.perf_counter()
+    for i in range(requests):
+        thread = threading.Thread(target=client, args=(i,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(rng.expovariate(rate))
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - began
+
+    lat = np.array(latencies) * 1000
+    stats = batcher.stats()
+    return {
+        'window_ms': window_ms,
+        'max_batch': max_batch,
+        'requests': requests,
+        'throughput_rps': requests / wall,
+        'latency_ms': {
+            'mean': float(lat.mean()),
+            'p50': float(np.percentile(lat, 50)),
+            'p95': float(np.percentile(lat, 95)),
+            'p99': float(np.percentile(lat, 99)),
+        },
+        'mean_batch_size': stats['mean_batch_size'],
+        'batch_sizes': stats['batch_sizes'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--windows', default='0,10,20,50,100',
+                        help='Comma-separated batch windows in ms')
+    parser.add_argument('--max-batch', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=20.0, help='Arrival rate in requests/s')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--call-cost', type=float, default=0.040,
+                        help='Synthetic fixed cost per batch call in seconds')
+    parser.add_argument('--item-cost', type=float, default=0.008,
+                        help='Synthetic extra cost per item in seconds')
+    parser.add_argument('--bark', action='store_true', help='Benchmark real Bark generation')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='Write results to this file as JSON')
+    args = parser.parse_args()
+
+    if args.bark:
+        batch_fn = bark_batch_fn()
+        make_item = lambda i: (BARK_TEXTS[i % len(BARK_TEXTS)], "v2/en_speaker_3")
+    else:
+        batch_fn = synthetic_batch_fn(args.call_cost, args.item_cost)
+        make_item = lambda i: i
+
+    results = []
+    for window in [float(w) for w in args.windows.split(',')]:
+        result = run_load(batch_fn, window, args.max_batch, args.rate,
+                          args.requests, args.seed, make_item)
+        results.append(result)
+        lat = result['latency_ms']
+        print(f"window {window:6.1f} ms | {result['throughput_rps']:6.2f} req/s | "
+              f"p50 {lat['p50']:8.1f} ms | p95 {lat['p95']:8.1f} ms | "
+              f"mean batch {result['mean_batch_size']:.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'benchmark': 'batching', 'bark': args.bark, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
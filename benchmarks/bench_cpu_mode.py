@@ -0,0 +1,235 @@
+"""Speed and quality of Bark and the voice encoder in CPU performance mode vs the default.
+
+Each mode runs in a fresh process, since thread pools can only be sized once
+and quantization changes the models in place. Every mode renders the same
+texts with the same seeds. Quality is judged with the float voice encoder:
+the speaker similarity of each output to the default mode's rendering of the
+same text, next to the similarity between different texts in the default
+mode as a reference. The quantized encoder is compared against the float
+encoder on the same audio. Needs Bark's weights.
+
+    python benchmarks/bench_cpu_mode.py --threads 8 --json cpu_mode.json
+    python benchmarks/bench_cpu_mode.py --modes default,perf,perf_compile --texts 2
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+MODES = {
+    'default': {'quantize': False, 'compile': False, 'pin_threads': False},
+    'perf': {'quantize': True, 'compile': False, 'pin_threads': True},
+    'perf_compile': {'quantize': True, 'compile': True, 'pin_threads': True},
+}
+
+TEXTS = [
+    "Hello, thanks for calling. How can I help you today?",
+    "Your appointment is confirmed for tomorrow at nine in the morning.",
+    "The quick brown fox jumps over the lazy dog near the riverbank.",
+    "Please hold while we connect you to the next available agent.",
+]
+
+
+def run_mode(name, options, texts, voice, seed, threads, out_dir):
+    """Load Bark in this process as ``name`` configures it and time each text"""
+    import torch
+    from cpu_perf import configure_threads, optimize_bark
+    if options['pin_threads']:
+        configure_threads(threads, 1)
+    from bark import preload_models, text_to_semantic, semantic_to_waveform
+    from bark.generation import SAMPLE_RATE
+
+    start = time.perf_counter()
+    preload_models()
+    applied = None
+    if options['quantize'] or options['compile']:
+        applied = optimize_bark(quantize_models=options['quantize'], compile_models=options['compile'])
+    load_seconds = time.perf_counter() - start
+
+    # One short pass so compilation and first-call allocations stay out of the timings
+    start = time.perf_counter()
+    semantic_to_waveform(text_to_semantic("Hello.", history_prompt=voice, silent=True),
+                         history_prompt=voice, silent=True)
+    warmup_seconds = time.perf_counter() - start
+
+    rows = []
+    for i, text in enumerate(texts):
+        torch.manual_seed(seed + i)
+        np.random.seed(seed + i)
+        start = time.perf_counter()
+        semantic = text_to_semantic(text, history_prompt=voice, temp=0.7, silent=True)
+        semantic_done = time.perf_counter()
+        audio = semantic_to_waveform(semantic, history_prompt=voice, temp=0.7, silent=True)
+        end = time.perf_counter()
+        np.save(os.path.join(out_dir, f"{name}-{i}.npy"), audio.astype(np.float32))
+        duration = len(audio) / SAMPLE_RATE
+        rows.append({
+            'text': i,
+            'semantic_seconds': semantic_done - start,
+            'waveform_seconds': end - semantic_done,
+            'audio_seconds': duration,
+            'realtime_factor': (end - start) / duration if duration else None,
+            'semantic_tokens': semantic.tolist(),
+        })
+    return {
+        'mode': name,
+        'options': options,
+        'torch_threads': torch.get_num_threads(),
+        'optimizations': applied,
+        'load_seconds': load_seconds,
+        'warmup_seconds': warmup_seconds,
+        'sample_rate': SAMPLE_RATE,
+        'texts': rows,
+    }
+
+
+def cosine(a, b):
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def token_agreement(a, b):
+    """Fraction of positions with the same semantic token, over the longer sequence"""
+    n = max(len(a), len(b))
+    if n == 0:
+        return 1.0
+    m = min(len(a), len(b))
+    return float(np.sum(np.asarray(a[:m]) == np.asarray(b[:m])) / n)
+
+
+def compare_quality(results, out_dir, baseline='default'):
+    """Speaker similarity to the baseline mode, and quantized vs float encoder agreement"""
+    import librosa
+    from resemblyzer import VoiceEncoder
+    from cpu_perf import optimize_voice_encoder
+
+    float_encoder = VoiceEncoder(device='cpu', verbose=False)
+    quantized_encoder = optimize_voice_encoder(VoiceEncoder(device='cpu', verbose=False))
+
+    wavs = {}
+    for result in results:
+        for row in result['texts']:
+            audio = np.load(os.path.join(out_dir, f"{result['mode']}-{row['text']}.npy"))
+            wavs[result['mode'], row['text']] = librosa.resample(audio, orig_sr=result['sample_rate'],
+                                                                 target_sr=16000)
+
+    def embed_all(encoder):
+        start = time.perf_counter()
+        embeddings = {key: encoder.embed_utterance(wav) for key, wav in wavs.items()}
+        return embeddings, time.perf_counter() - start
+
+    float_embeds, float_seconds = embed_all(float_encoder)
+    quantized_embeds, quantized_seconds = embed_all(quantized_encoder)
+    encoder = {
+        'float_seconds': float_seconds,
+        'quantized_seconds': quantized_seconds,
+        'speedup': float_seconds / quantized_seconds,
+        'embedding_cosine_min': min(cosine(float_embeds[k], quantized_embeds[k]) for k in wavs),
+        'embedding_cosine_mean': float(np.mean([cosine(float_embeds[k], quantized_embeds[k]) for k in wavs])),
+    }
+
+    by_mode = {result['mode']: result for result in results}
+    quality = {}
+    if baseline in by_mode:
+        base_rows = by_mode[baseline]['texts']
+        # How similar different sentences in the same voice are, for reference
+        pairs = [(i, j) for i in range(len(base_rows)) for j in range(i + 1, len(base_rows))]
+        if pairs:
+            quality['baseline_cross_text_similarity'] = float(np.mean(
+                [cosine(float_embeds[baseline, i], float_embeds[baseline, j]) for i, j in pairs]))
+        for mode, result in by_mode.items():
+            if mode == baseline:
+                continue
+            rows = []
+            for row, base in zip(result['texts'], base_rows):
+                rows.append({
+                    'text': row['text'],
+                    'speaker_similarity': cosine(float_embeds[mode, row['text']],
+                                                 float_embeds[baseline, base['text']]),
+                    'duration_ratio': row['audio_seconds'] / base['audio_seconds'],
+                    'semantic_token_agreement': token_agreement(row['semantic_tokens'], base['semantic_tokens']),
+                })
+            quality[mode] = {
+                'speaker_similarity_mean': float(np.mean([r['speaker_similarity'] for r in rows])),
+                'texts': rows,
+            }
+    return quality, encoder
+
+
+def summarize(result):
+    rows = result['texts']
+    total = sum(r['semantic_seconds'] + r['waveform_seconds'] for r in rows)
+    audio = sum(r['audio_seconds'] for r in rows)
+    return {
+        'semantic_seconds': sum(r['semantic_seconds'] for r in rows),
+        'waveform_seconds': sum(r['waveform_seconds'] for r in rows),
+        'total_seconds': total,
+        'audio_seconds': audio,
+        'realtime_factor': total / audio if audio else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='default,perf', help=f"Comma-separated, from {', '.join(MODES)}")
+    parser.add_argument('--texts', type=int, default=len(TEXTS), help='How many of the built-in texts to render')
+    parser.add_argument('--voice', default='v2/en_speaker_3')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1, help='Intra-op threads in perf modes')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='Write results to this file as JSON')
+    args = parser.parse_args()
+
+    modes = args.modes.split(',')
+    texts = TEXTS[:args.texts]
+    out_dir = tempfile.mkdtemp(prefix='echoself-cpu-mode-')
+    context = multiprocessing.get_context('spawn')
+    try:
+        results = []
+        for mode in modes:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_mode, mode, MODES[mode], texts, args.voice, args.seed,
+                                         args.threads, out_dir).result()
+            result['summary'] = summarize(result)
+            results.append(result)
+            s = result['summary']
+            print(f"{mode:13s} | load {result['load_seconds']:6.1f}s | warm-up {result['warmup_seconds']:6.1f}s | "
+                  f"semantic {s['semantic_seconds']:6.1f}s | waveform {s['waveform_seconds']:6.1f}s | "
+                  f"{s['realtime_factor']:.2f}x realtime")
+        quality, encoder = compare_quality(results, out_dir, baseline=modes[0])
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    base = results[0]['summary']['total_seconds']
+    for result in results[1:]:
+        mode = result['mode']
+        speedup = base / result['summary']['total_seconds']
+        line = f"{mode:13s} | {speedup:.2f}x faster than {modes[0]}"
+        if mode in quality:
+            line += f" | speaker similarity {quality[mode]['speaker_similarity_mean']:.3f}"
+        print(line)
+    if 'baseline_cross_text_similarity' in quality:
+        print(f"(different texts in {modes[0]} mode: {quality['baseline_cross_text_similarity']:.3f})")
+    print(f"encoder        | quantized {encoder['speedup']:.2f}x faster | "
+          f"embedding cosine to float: mean {encoder['embedding_cosine_mean']:.4f}, "
+          f"min {encoder['embedding_cosine_min']:.4f}")
+
+    if args.json:
+        for result in results:
+            for row in result['texts']:
+                row.pop('semantic_tokens')
+        with open(args.json, 'w') as f:
+            json.dump({'benchmark': 'cpu_mode', 'voice': args.voice, 'threads': args.threads,
+                       'results': results, 'quality': quality, 'encoder': encoder}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
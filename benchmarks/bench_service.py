@@ -0,0 +1,373 @@
+"""Service benchmarks with stand-in models: adaptation, uploads and synthesis under load.
+
+Bark and the voice encoder are replaced by the deterministic stand-ins in
+stand_ins.py, with configurable latency and output length, so the rest of
+the service can be measured without model weights or a GPU:
+
+- adapt: adapt_voice latency on fixed signals, and its throughput when
+  several requests adapt at once.
+- upload: /upload cost against recording length, with decode and embedding
+  also timed on their own.
+- synthesize: /synthesize plus download of the file, end to end over HTTP,
+  at several levels of concurrency.
+
+The app runs in a temporary directory and reads the rest of its settings
+(SYNTH_WORKERS, SYNTH_CACHE_ENABLED, ...) from the environment as usual.
+Results are written as JSON; --compare prints what moved against an earlier
+run, e.g. one from the previous commit.
+
+    python benchmarks/bench_service.py --json service.json
+    python benchmarks/bench_service.py --suites synthesize --concurrency 1,8 --compare service.json
+"""
+import argparse
+import functools
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+import soundfile as sf
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from bench_adaptation import synthetic_vowel  # noqa: E402
+from stand_ins import StandInBark, StandInVoiceEncoder, install  # noqa: E402
+
+USER_ID = 'bench-user'
+USER_F0 = 210.0  # Pitch of the benchmark user's voice sample
+SAMPLE_TEXT = "The quick brown fox jumps over the lazy dog near the riverbank"
+
+
+def percentiles(seconds):
+    ms = np.array(seconds) * 1000
+    return {
+        'mean': float(ms.mean()),
+        'p50': float(np.percentile(ms, 50)),
+        'p95': float(np.percentile(ms, 95)),
+        'p99': float(np.percentile(ms, 99)),
+    }
+
+
+def median_time(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def wav_bytes(audio, sample_rate):
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sample_rate, format='WAV', subtype='PCM_16')
+    return buffer.getvalue()
+
+
+def upload(client, user_id, data):
+    response = client.post('/upload', data={'userId': user_id, 'audio': (io.BytesIO(data), 'sample.wav')},
+                           content_type='multipart/form-data')
+    body = response.get_json()
+    if response.status_code != 200 or not body.get('voice_processed'):
+        raise RuntimeError(f"Upload failed: {body}")
+    return body
+
+
+def bench_adapt(app, args):
+    """adapt_voice alone, then with several threads adapting at once"""
+    results = []
+    for duration in args.durations:
+        audio = synthetic_vowel(140, duration, app.SAMPLE_RATE, seed=1)
+        app.adapt_voice(audio, USER_ID)  # Pool start-up and profile loading stay out of the timings
+        seconds = median_time(lambda: app.adapt_voice(audio, USER_ID), args.repeats)
+        row = {'duration_s': duration, 'seconds': seconds, 'realtime_factor': seconds / duration,
+               'concurrent': []}
+        for concurrency in args.concurrency:
+            def worker():
+                for _ in range(args.repeats):
+                    app.adapt_voice(audio, USER_ID)
+            threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall = time.perf_counter() - start
+            row['concurrent'].append({
+                'concurrency': concurrency,
+                'wall_seconds': wall,
+                'audio_seconds_per_second': concurrency * args.repeats * duration / wall,
+            })
+        results.append(row)
+        best = max(row['concurrent'], key=lambda c: c['audio_seconds_per_second'])
+        print(f"adapt {duration:5.1f}s | {seconds * 1000:8.1f} ms ({row['realtime_factor']:.3f}x realtime) | "
+              f"best {best['audio_seconds_per_second']:6.1f} audio s/s at {best['concurrency']} threads")
+    return results
+
+
+def bench_upload(app, args):
+    """/upload end to end, with decode and embedding timed separately"""
+    import librosa
+    from speaker_profile import PROFILE_SAMPLE_RATE
+    client = app.app.test_client()
+    encoder = app.model_registry.get('voice_encoder')
+    results = []
+    for duration in args.recording_lengths:
+        # Browsers record at 48 kHz; the sample gets decoded and resampled
+        audio = synthetic_vowel(USER_F0, duration, 48000, seed=2)
+        data = wav_bytes(audio, 48000)
+        path = os.path.join(app.UPLOAD_FOLDER, f'bench-{duration}.wav')
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        def decode():
+            wav, _ = librosa.load(path, sr=PROFILE_SAMPLE_RATE)
+            return librosa.effects.trim(wav, top_db=20)[0]
+        wav = decode()
+
+        def embed():
+            encoder.embed_utterance(librosa.resample(wav, orig_sr=PROFILE_SAMPLE_RATE, target_sr=16000))
+
+        row = {
+            'duration_s': duration,
+            'bytes': len(data),
+            'decode_seconds': median_time(decode, args.repeats),
+            'embed_seconds': median_time(embed, args.repeats),
+            'request_seconds': median_time(lambda: upload(client, f'bench-upload-{duration}', data),
+                                           args.repeats),
+        }
+        results.append(row)
+        print(f"upload {duration:5.1f}s | request {row['request_seconds'] * 1000:8.1f} ms | "
+              f"decode {row['decode_seconds'] * 1000:7.1f} ms | embed {row['embed_seconds'] * 1000:7.1f} ms")
+    return results
+
+
+def serve(app):
+    """Run the app on a free local port in a background thread"""
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-server', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def http(method, url, body=None):
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method,
+                                 headers={'Content-Type': 'application/json'} if data else {})
+    try:
+        with urllib.request.urlopen(req, timeout=600) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def bench_synthesize(app, args):
+    """Closed-loop clients each synthesizing and downloading in turn"""
+    server, base_url = serve(app)
+    results = []
+    run = 0
+    try:
+        for concurrency in args.concurrency:
+            run += 1
+            synth_times, download_times, total_times = [], [], []
+            errors = {}
+            lock = threading.Lock()
+
+            def client(index):
+                for i in range(args.requests):
+                    # Unique text misses every cache unless cache hits are being measured
+                    text = SAMPLE_TEXT if args.cache_hits else f"{SAMPLE_TEXT}, take {run}-{index}-{i}."
+                    start = time.perf_counter()
+                    status, body = http('POST', f"{base_url}/synthesize", {
+                        'text': text, 'voice': 'female_1', 'userId': USER_ID,
+                        'use_user_voice': args.user_voice, 'format': args.format})
+                    synthesized = time.perf_counter()
+                    if status == 200:
+                        status, _ = http('GET', json.loads(body)['file_url'])
+                    end = time.perf_counter()
+                    with lock:
+                        if status != 200:
+                            errors[status] = errors.get(status, 0) + 1
+                            continue
+                        synth_times.append(synthesized - start)
+                        download_times.append(end - synthesized)
+                        total_times.append(end - start)
+
+            threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall = time.perf_counter() - start
+
+            row = {
+                'concurrency': concurrency,
+                'requests': concurrency * args.requests,
+                'completed': len(total_times),
+                'errors': {str(status): count for status, count in errors.items()},
+                'throughput_rps': len(total_times) / wall,
+            }
+            if total_times:
+                row['synthesize_ms'] = percentiles(synth_times)
+                row['download_ms'] = percentiles(download_times)
+                row['total_ms'] = percentiles(total_times)
+            results.append(row)
+            line = f"synthesize x{concurrency:<3d} | {row['throughput_rps']:6.2f} req/s"
+            if total_times:
+                line += (f" | p50 {row['total_ms']['p50']:8.1f} ms | p95 {row['total_ms']['p95']:8.1f} ms"
+                         f" | download p50 {row['download_ms']['p50']:6.1f} ms")
+            if errors:
+                line += f" | errors {row['errors']}"
+            print(line)
+    finally:
+        server.shutdown()
+    return results
+
+
+def flatten(value, prefix=''):
+    """Numeric leaves of a result tree keyed by their path"""
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = ((_row_label(item, i), item) for i, item in enumerate(value))
+    else:
+        return {prefix: value} if isinstance(value, (int, float)) and not isinstance(value, bool) else {}
+    out = {}
+    for key, item in items:
+        out.update(flatten(item, f"{prefix}/{key}" if prefix else str(key)))
+    return out
+
+
+def _row_label(row, index):
+    for key in ('duration_s', 'concurrency'):
+        if isinstance(row, dict) and key in row:
+            return f"{key}={row[key]}"
+    return str(index)
+
+
+def compare(baseline_path, results, threshold):
+    """Print metrics that changed by more than ``threshold`` (a fraction)"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = flatten(baseline['results'])
+    after = flatten(results)
+    print(f"\nChanges against {baseline_path} ({baseline.get('commit') or 'unknown commit'}):")
+    changed = 0
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        if old and abs(new - old) / abs(old) > threshold:
+            changed += 1
+            print(f"  {key}: {old:.4g} -> {new:.4g} ({(new - old) / abs(old):+.0%})")
+    if not changed:
+        print(f"  nothing moved by more than {threshold:.0%}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--suites', default='adapt,upload,synthesize')
+    parser.add_argument('--durations', default='2,5,10,20', help='Signal lengths for adapt, in seconds')
+    parser.add_argument('--recording-lengths', default='3,10,30,60', help='Upload lengths in seconds')
+    parser.add_argument('--concurrency', default='1,4,8', help='Concurrent clients or threads')
+    parser.add_argument('--requests', type=int, default=4, help='Synthesis requests per client')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--user-voice', type=int, default=1, help='Adapt synthesized audio to the user (1/0)')
+    parser.add_argument('--cache-hits', action='store_true', help='Repeat one text so requests hit the cache')
+    parser.add_argument('--format', default='wav', help='Output format requested from /synthesize')
+    parser.add_argument('--dsp-workers', type=int, default=0, help='DSP pool processes (0: request threads)')
+    parser.add_argument('--bark-latency', type=float, default=0.1, help='Stand-in Bark seconds per call')
+    parser.add_argument('--bark-rtf', type=float, default=0.2,
+                        help='Stand-in Bark seconds per second of audio generated')
+    parser.add_argument('--seconds-per-char', type=float, default=0.06, help='Stand-in audio length per character')
+    parser.add_argument('--encoder-latency', type=float, default=0.02, help='Stand-in encoder seconds per call')
+    parser.add_argument('--encoder-rtf', type=float, default=0.01,
+                        help='Stand-in encoder seconds per second of audio')
+    parser.add_argument('--json', help='Write results to this file as JSON')
+    parser.add_argument('--compare', help='Earlier --json output to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative change --compare reports')
+    args = parser.parse_args()
+    args.user_voice = bool(args.user_voice)
+    parse = lambda value: [float(v) for v in value.split(',')]
+    args.durations = parse(args.durations)
+    args.recording_lengths = parse(args.recording_lengths)
+    args.concurrency = [int(c) for c in parse(args.concurrency)]
+    suites = args.suites.split(',')
+    json_path = os.path.abspath(args.json) if args.json else None
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    # Models load on first use, after the stand-ins are in place
+    os.environ['MODEL_LOAD_MODE'] = 'lazy'
+    os.environ['MODEL_WARMUP'] = '0'
+    os.environ['BARK_BATCH_WINDOW_MS'] = '0'
+    os.environ['DSP_WORKERS'] = '0'
+    os.environ.setdefault('PROFILE_STORE', 'memory')
+    # Every client is the same user; per-user limits would turn load into 429s
+    os.environ.setdefault('ADMISSION_ENABLED', '0')
+    workdir = tempfile.mkdtemp(prefix='echoself-bench-')
+    os.chdir(workdir)
+    try:
+        import app
+        from dsp_pool import DSPPool
+        bark = StandInBark(latency=args.bark_latency, realtime_factor=args.bark_rtf,
+                           seconds_per_char=args.seconds_per_char)
+        encoder_factory = functools.partial(StandInVoiceEncoder, latency=args.encoder_latency,
+                                            seconds_per_second=args.encoder_rtf)
+        install(app, bark, encoder_factory)
+        if args.dsp_workers > 0:
+            app.dsp_pool = DSPPool(args.dsp_workers, load_encoder=encoder_factory)
+
+        # The user whose voice adaptation and synthesis adapt towards
+        upload(app.app.test_client(), USER_ID, wav_bytes(synthetic_vowel(USER_F0, 5.0, 48000, seed=3), 48000))
+
+        suite_fns = {'adapt': bench_adapt, 'upload': bench_upload, 'synthesize': bench_synthesize}
+        results = {name: suite_fns[name](app, args) for name in suites}
+        if app.dsp_pool is not None:
+            app.dsp_pool.shutdown()
+    finally:
+        os.chdir(PROJECT_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'benchmark': 'service',
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {
+            'stand_ins': {'bark_latency': args.bark_latency, 'bark_rtf': args.bark_rtf,
+                          'seconds_per_char': args.seconds_per_char,
+                          'encoder_latency': args.encoder_latency, 'encoder_rtf': args.encoder_rtf},
+            'dsp_workers': args.dsp_workers,
+            'synth_workers': app.SYNTH_WORKERS,
+            'synth_cache': app.SYNTH_CACHE_ENABLED,
+            'semantic_cache': app.semantic_cache is not None,
+            'user_voice': args.user_voice,
+            'cache_hits': args.cache_hits,
+            'format': args.format,
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+    if compare_path:
+        compare(compare_path, results, args.threshold)
+
+
+if __name__ == '__main__':
+    main()
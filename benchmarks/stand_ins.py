@@ -0,0 +1,128 @@
+"""Deterministic, lightweight stand-ins for Bark and the Resemblyzer encoder.
+
+They let the service be benchmarked without model weights. Output is a
+synthetic vowel whose length follows the text and whose pitch follows the
+voice preset, so adaptation and caching see realistic signals. Model time
+is simulated with ``time.sleep``, which like PyTorch inference releases
+the GIL.
+"""
+import hashlib
+import time
+
+import numpy as np
+
+from bench_adaptation import synthetic_vowel
+
+SEMANTIC_RATE = 49.9  # Bark semantic tokens per second of audio
+SEMANTIC_VOCAB = 10000
+EMBEDDING_SIZE = 256  # Resemblyzer's embedding size
+
+
+def _seed(*parts):
+    key = '\x1f'.join(str(part) for part in parts)
+    return int.from_bytes(hashlib.sha256(key.encode('utf-8')).digest()[:4], 'little')
+
+
+class StandInBark:
+    """Replacement for Bark's ``generate_audio`` and its two stages.
+
+    Audio lasts ``seconds_per_char`` per character of text (at least
+    ``min_seconds``). Each call takes ``latency`` plus ``realtime_factor``
+    times the audio duration, split between the semantic and waveform
+    stages by ``semantic_share``.
+    """
+
+    def __init__(self, latency=0.1, realtime_factor=0.2, seconds_per_char=0.06, min_seconds=1.0,
+                 semantic_share=0.3, sample_rate=24000):
+        self.latency = latency
+        self.realtime_factor = realtime_factor
+        self.seconds_per_char = seconds_per_char
+        self.min_seconds = min_seconds
+        self.semantic_share = semantic_share
+        self.sample_rate = sample_rate
+
+    def duration_for(self, text):
+        return max(self.min_seconds, len(text) * self.seconds_per_char)
+
+    def load_prompt(self, name):
+        """Stand-in history prompt arrays; the semantic prompt carries the voice's seed"""
+        seed = _seed(name)
+        return {'semantic_prompt': np.array([seed], dtype=np.int64),
+                'coarse_prompt': np.zeros((2, 0), dtype=np.int64),
+                'fine_prompt': np.zeros((8, 0), dtype=np.int64)}
+
+    @staticmethod
+    def _voice_seed(history_prompt):
+        if isinstance(history_prompt, dict):
+            return int(history_prompt['semantic_prompt'][0])
+        return _seed(history_prompt)
+
+    def _cost(self, duration):
+        return self.latency + self.realtime_factor * duration
+
+    def text_to_semantic(self, text, history_prompt=None, temp=0.7, silent=False):
+        duration = self.duration_for(text)
+        time.sleep(self._cost(duration) * self.semantic_share)
+        rng = np.random.default_rng(_seed(text, self._voice_seed(history_prompt), temp))
+        return rng.integers(0, SEMANTIC_VOCAB, int(duration * SEMANTIC_RATE), dtype=np.int64)
+
+    def semantic_to_waveform(self, semantic_tokens, history_prompt=None, temp=0.7, silent=False):
+        duration = len(semantic_tokens) / SEMANTIC_RATE
+        time.sleep(self._cost(duration) * (1 - self.semantic_share))
+        # Each preset speaks at its own pitch between 95 and 255 Hz
+        f0 = 95 + self._voice_seed(history_prompt) % 160
+        seed = _seed(hashlib.sha256(np.asarray(semantic_tokens).tobytes()).hexdigest(), temp)
+        return synthetic_vowel(f0, duration, self.sample_rate, seed=seed)
+
+    def generate_audio(self, text, history_prompt=None, text_temp=0.7, waveform_temp=0.7, silent=False):
+        semantic_tokens = self.text_to_semantic(text, history_prompt, text_temp, silent)
+        return self.semantic_to_waveform(semantic_tokens, history_prompt, waveform_temp, silent)
+
+
+class StandInVoiceEncoder:
+    """Replacement for ``resemblyzer.VoiceEncoder``.
+
+    Embeddings are a fixed random projection of the log spectrum, so equal
+    audio gives equal embeddings and different voices differ. Each call
+    takes ``latency`` plus ``seconds_per_second`` per second of audio.
+    """
+
+    def __init__(self, latency=0.02, seconds_per_second=0.01, sample_rate=16000):
+        self.latency = latency
+        self.seconds_per_second = seconds_per_second
+        self.sample_rate = sample_rate
+        self._projection = np.random.default_rng(0).standard_normal((40, EMBEDDING_SIZE)).astype(np.float32)
+
+    def _embed(self, features):
+        raw = np.maximum(features @ self._projection, 0)
+        return raw / (np.linalg.norm(raw) or 1.0)
+
+    def embed_utterance(self, wav, return_partials=False, rate=1.3, min_coverage=0.75):
+        time.sleep(self.latency + self.seconds_per_second * len(wav) / self.sample_rate)
+        spectrum = np.log1p(np.abs(np.fft.rfft(wav, n=2 * 1024)))
+        bands = np.array([band.mean() for band in np.array_split(spectrum, 40)], dtype=np.float32)
+        embed = self._embed(bands)
+        if return_partials:
+            return embed, embed[None], None
+        return embed
+
+    def embed_frames_batch(self, mels):
+        """Embeddings of partial utterances given as (batch, frames, 40) mels"""
+        mels = np.asarray(mels, dtype=np.float32)
+        time.sleep(self.latency + self.seconds_per_second * mels.shape[0] * mels.shape[1] / 100)
+        return np.stack([self._embed(np.log1p(mel.mean(axis=0))) for mel in mels])
+
+
+def install(app_module, bark, encoder_factory):
+    """Route the app's Bark calls and voice encoder to stand-ins.
+
+    Must run before the models are loaded, i.e. the app was imported with
+    ``MODEL_LOAD_MODE=lazy``, and with Bark micro-batching disabled.
+    """
+    app_module.BARK_IMPORT_ERROR = None
+    app_module.SAMPLE_RATE = bark.sample_rate
+    app_module.text_to_semantic = bark.text_to_semantic
+    app_module.semantic_to_waveform = bark.semantic_to_waveform
+    app_module.voice_prompts.loader = bark.load_prompt
+    app_module.model_registry.register('voice_encoder', encoder_factory, required=False)
+    app_module.model_registry.register('bark', lambda: True)
@@ -0,0 +1,241 @@
+"""Offline bulk synthesis of a manifest of prompts across worker processes.
+
+Each row of a JSONL or CSV manifest has ``text`` and optionally ``voice``
+(a preset name as in /voices, or ``auto`` for the preset nearest the user's
+voice), ``userId`` (apply that user's voice), ``use_user_voice`` and ``id``.
+Rows are rendered with the same Bark and voice adaptation pipeline as
+/synthesize, without going through HTTP, by a pool of worker processes that
+each load the models once.
+
+Output files are named after the row id and written atomically. Every
+finished row is appended to a completion manifest, so an interrupted run
+started again with the same arguments skips the rows that are done.
+
+    python bulk_synthesize.py prompts.jsonl --out-dir rendered --workers 4 --format opus
+"""
+import argparse
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+import uuid
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_VOICE = 'female_1'
+
+# Set in each worker process by _init_worker
+_app = None
+_settings = None
+
+
+def read_manifest(path):
+    """Rows of a JSONL or CSV manifest as dicts, each with an ``id``"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith('.csv'):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    seen = set()
+    for number, row in enumerate(rows, 1):
+        if not str(row.get('text') or '').strip():
+            raise ValueError(f"Row {number} of {path} has no text")
+        if not row.get('id'):
+            # Stable across runs so resuming works even if rows are reordered
+            key = '\x1f'.join(str(row.get(k) or '') for k in ('text', 'voice', 'userId'))
+            row['id'] = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+        row['id'] = re.sub(r'[^A-Za-z0-9._-]', '_', str(row['id']))
+        if row['id'] in seen:
+            raise ValueError(f"Duplicate id '{row['id']}' in {path}")
+        seen.add(row['id'])
+    return rows
+
+
+def read_completed(path):
+    """Ids of rows recorded as done in a completion manifest"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Partial last line from an interrupted run
+            if entry.get('status') == 'done':
+                done.add(entry['id'])
+    return done
+
+
+def _as_bool(value, default):
+    if value in (None, ''):
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def _init_worker(settings):
+    """Load the synthesis pipeline and models once per worker process"""
+    global _app, _settings
+    _settings = settings
+    threads = str(settings['threads'])
+    os.environ.setdefault('OMP_NUM_THREADS', threads)
+    os.environ.setdefault('MKL_NUM_THREADS', threads)
+    # Each worker already is a process per core; don't nest another pool in it
+    os.environ.setdefault('DSP_WORKERS', '0')
+    # Only the synthesis pipeline is used: no file indexes, reapers or job queue
+    os.environ['SERVICE_AUTOSTART'] = '0'
+    # The app resolves uploads/ and profiles relative to the project
+    os.chdir(PROJECT_DIR)
+    sys.path.insert(0, PROJECT_DIR)
+
+    import torch
+    torch.set_num_threads(settings['threads'])
+    import app
+    _app = app
+    # Loaded up front so row timings don't include them; the preset index
+    # and semantic tokenizer still load on first use if a row needs them
+    for name in ('bark', 'voice_encoder'):
+        app.model_registry.ensure(name)
+
+
+def render_row(row):
+    """Synthesize one manifest row; returns its completion entry"""
+    from transcode import transcode_file, OUTPUT_FORMATS
+    start = time.perf_counter()
+    entry = {'id': row['id'], 'worker': os.getpid()}
+    out_dir = _settings['out_dir']
+    output = _settings['output']
+    ext = OUTPUT_FORMATS[output[0]][1] if output else 'wav'
+    final_path = os.path.join(out_dir, f"{row['id']}.{ext}")
+    tmp_path = os.path.join(out_dir, f".tmp-{uuid.uuid4().hex}.wav")
+    try:
+        user_id = row.get('userId') or ''
+        use_user_voice = (_as_bool(row.get('use_user_voice'), bool(user_id))
+                          and bool(user_id) and _app.voice_profiles.has_voice(user_id))
+        voice_id = row.get('voice') or ('auto' if use_user_voice else DEFAULT_VOICE)
+        selected_voice = _app.select_preset(voice_id, user_id)
+
+        _app.generate_to_file(tmp_path, row['text'], selected_voice, user_id, use_user_voice)
+        import soundfile as sf
+        entry['audio_seconds'] = sf.info(tmp_path).duration
+        if output:
+            transcode_file(tmp_path, final_path, *output)
+        else:
+            os.replace(tmp_path, final_path)
+        entry.update(status='done', file=os.path.basename(final_path),
+                     user_voice_applied=use_user_voice)
+    except Exception as e:
+        entry.update(status='failed', error=str(e) or e.__class__.__name__)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    entry['seconds'] = time.perf_counter() - start
+    return entry
+
+
+def summarize(entries, wall_seconds, workers):
+    """Throughput overall and per worker process (one per core)"""
+    per_worker = {}
+    for entry in entries:
+        stats = per_worker.setdefault(entry['worker'], {'rows': 0, 'failed': 0, 'busy_seconds': 0.0,
+                                                        'audio_seconds': 0.0})
+        stats['rows'] += 1
+        stats['failed'] += entry['status'] != 'done'
+        stats['busy_seconds'] += entry['seconds']
+        stats['audio_seconds'] += entry.get('audio_seconds', 0.0)
+    for stats in per_worker.values():
+        busy = stats['busy_seconds'] or 1e-9
+        stats['rows_per_minute'] = 60 * stats['rows'] / busy
+        stats['realtime_factor'] = stats['audio_seconds'] / busy
+
+    done = sum(entry['status'] == 'done' for entry in entries)
+    audio = sum(entry.get('audio_seconds', 0.0) for entry in entries)
+    wall = wall_seconds or 1e-9
+    return {
+        'rows': len(entries),
+        'done': done,
+        'failed': len(entries) - done,
+        'workers': workers,
+        'wall_seconds': wall_seconds,
+        'rows_per_minute': 60 * done / wall,
+        'rows_per_minute_per_core': 60 * done / wall / workers,
+        'audio_seconds': audio,
+        'audio_seconds_per_second_per_core': audio / wall / workers,
+        'per_worker': {str(pid): stats for pid, stats in per_worker.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('manifest', help='JSONL or CSV file with text, voice, userId and id columns')
+    parser.add_argument('--out-dir', required=True, help='Directory for rendered files')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes (default: 1). Each loads its own copy of Bark and the voice '
+                             'encoder, several GB of RAM (budget 8 GB per worker, less with '
+                             'SUNO_USE_SMALL_MODELS=1), so size this to memory rather than cores')
+    parser.add_argument('--threads', type=int, default=0,
+                        help='Torch threads per worker (default: cores divided by workers)')
+    parser.add_argument('--format', default=None, help='wav (default), pcm16, flac, opus or mp3')
+    parser.add_argument('--sample-rate', default=None, help='Output sample rate (default: Bark\'s)')
+    parser.add_argument('--completed', default=None,
+                        help='Completion manifest (default: <out-dir>/completed.jsonl)')
+    parser.add_argument('--json', help='Write the throughput summary to this file')
+    args = parser.parse_args()
+
+    from transcode import parse_output
+    output = parse_output(args.format, args.sample_rate)
+    out_dir = os.path.abspath(args.out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    completed_path = os.path.abspath(args.completed or os.path.join(out_dir, 'completed.jsonl'))
+
+    rows = read_manifest(args.manifest)
+    done = read_completed(completed_path)
+    pending = [row for row in rows if row['id'] not in done]
+    print(f"{len(rows)} rows, {len(rows) - len(pending)} already done, {len(pending)} to render")
+    if not pending:
+        return
+
+    workers = max(1, min(args.workers, len(pending)))
+    threads = args.threads or max(1, (os.cpu_count() or 1) // workers)
+    settings = {'out_dir': out_dir, 'output': output, 'threads': threads}
+
+    entries = []
+    start = time.perf_counter()
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=_init_worker, initargs=(settings,)) as pool, \
+            open(completed_path, 'a', encoding='utf-8') as completed:
+        for entry in pool.imap_unordered(render_row, pending):
+            # Only this process writes the manifest, one flushed line per row
+            completed.write(json.dumps(entry) + '\n')
+            completed.flush()
+            os.fsync(completed.fileno())
+            entries.append(entry)
+            status = entry['status'] if entry['status'] == 'done' else f"failed: {entry['error']}"
+            print(f"[{len(entries)}/{len(pending)}] {entry['id']} {status} ({entry['seconds']:.1f}s)")
+    wall = time.perf_counter() - start
+
+    summary = summarize(entries, wall, workers)
+    print(f"\nRendered {summary['done']} rows ({summary['failed']} failed) in {wall:.1f}s "
+          f"with {workers} workers x {threads} threads")
+    print(f"Throughput: {summary['rows_per_minute']:.1f} rows/min, "
+          f"{summary['rows_per_minute_per_core']:.2f} rows/min per core, "
+          f"{summary['audio_seconds_per_second_per_core']:.2f}x realtime per core")
+    for pid, stats in summary['per_worker'].items():
+        print(f"  worker {pid}: {stats['rows']} rows, {stats['rows_per_minute']:.1f} rows/min, "
+              f"{stats['realtime_factor']:.2f}x realtime")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if summary['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
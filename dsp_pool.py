@@ -0,0 +1,203 @@
+"""Process pool for CPU-heavy DSP, exchanging audio through shared memory"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from metrics import record_stage
+
+# Per-process state set up once by the pool initializer
+_encoder = None
+
+
+def share_array(array):
+    """Copy an array into a new shared memory block.
+
+    Returns ``(shm, descriptor)``; the descriptor is what gets sent to a
+    worker, and the caller must ``close``/``unlink`` the block when done.
+    """
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def attach_array(descriptor):
+    """Open a shared block from its descriptor; returns ``(shm, array view)``"""
+    name, shape, dtype = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _init_worker(load_encoder, torch_threads):
+    """Load models once per worker process"""
+    global _encoder
+    if torch_threads:
+        try:
+            import torch
+            torch.set_num_threads(torch_threads)
+        except ImportError:
+            pass
+    if callable(load_encoder):
+        _encoder = load_encoder()
+    elif load_encoder:
+        from resemblyzer import VoiceEncoder
+        _encoder = VoiceEncoder()
+
+
+def _adapt_task(in_desc, out_desc, target_f0, sample_rate, block_size):
+    """Adapt shared input audio towards target_f0, writing into shared output.
+
+    Returns ``(factors, timings)``; factors is None if the pitch couldn't be
+    measured and timings holds the seconds spent in each stage.
+    """
+    from adaptation import get_engine, shift_factors, StreamingAdapter, RunningNormalizer
+    from speaker_profile import mean_pitch
+
+    in_shm, audio = attach_array(in_desc)
+    out_shm, out = attach_array(out_desc)
+    timings = {}
+    try:
+        start = time.perf_counter()
+        factors = shift_factors(mean_pitch(audio, sample_rate), target_f0)
+        timings['pitch_analysis'] = time.perf_counter() - start
+        if factors is None:
+            return None, timings
+        start = time.perf_counter()
+        adapter = StreamingAdapter(get_engine(sample_rate), *factors,
+                                   normalizer=RunningNormalizer(sample_rate))
+        position = 0
+        blocks = (audio[i:i + block_size] for i in range(0, len(audio), block_size))
+        for block in adapter.stream(blocks):
+            out[position:position + len(block)] = block
+            position += len(block)
+        timings['adaptation'] = time.perf_counter() - start
+        return factors, timings
+    finally:
+        del audio, out
+        in_shm.close()
+        out_shm.close()
+
+
+def _profile_task(filepath, profile_dir, version):
+    """Decode, trim, embed and analyse an upload in a worker process"""
+    from speaker_profile import build_speaker_profile
+    profile = build_speaker_profile(filepath, profile_dir, encoder=_encoder, version=version)
+    profile.pop('audio', None)
+    return profile
+
+
+def _analyze_task(in_desc, profile_dir, embedding, version):
+    """Pitch/formant analysis and persistence of already decoded audio"""
+    from speaker_profile import profile_from_audio
+    shm, wav = attach_array(in_desc)
+    try:
+        profile = profile_from_audio(np.array(wav), profile_dir, embedding, version)
+    finally:
+        del wav
+        shm.close()
+    profile.pop('audio', None)
+    return profile
+
+
+class DSPPool:
+    """Pool of worker processes for adaptation and upload analysis.
+
+    Parselmouth, the STFT adaptation and Resemblyzer hold the GIL for long
+    stretches, so running them in request threads serializes requests. Here
+    they run in separate processes; audio is passed through
+    ``multiprocessing.shared_memory`` instead of being pickled, and the
+    voice encoder is loaded once per worker. Calls block only the requesting
+    thread while a worker does the work.
+
+    ``load_encoder`` may also be a picklable callable returning the encoder
+    each worker should use instead of Resemblyzer's.
+    """
+
+    def __init__(self, workers, load_encoder=True, torch_threads=1):
+        self.workers = max(1, workers)
+        self.load_encoder = load_encoder
+        self.torch_threads = torch_threads
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.in_flight = 0
+
+    def _get_executor(self):
+        # Created on first use in each process, so pools are never shared across fork
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.load_encoder, self.torch_threads))
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        # Only the calling thread blocks; the GIL is free while the worker runs
+        future = self._get_executor().submit(fn, *args)
+        with self._lock:
+            self.submitted += 1
+            self.in_flight += 1
+        try:
+            return future.result()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def adapt(self, audio, target_f0, sample_rate, block_size):
+        """Adapted copy of ``audio``, or None if its pitch couldn't be measured"""
+        audio = np.asarray(audio, dtype=np.float32)
+        in_shm, in_desc = share_array(audio)
+        out_shm, out_desc = share_array(np.zeros_like(audio))
+        try:
+            start = time.perf_counter()
+            factors, timings = self._run(_adapt_task, in_desc, out_desc, target_f0, sample_rate, block_size)
+            for stage, seconds in timings.items():
+                record_stage(stage, seconds)
+            # Queueing and handing the audio to and from the worker
+            record_stage('dsp_overhead', max(0.0, time.perf_counter() - start - sum(timings.values())))
+            if factors is None:
+                return None
+            print(f"Pitch shift factor: {factors[0]}, formant shift factor: {factors[1]}")
+            return np.ndarray(audio.shape, dtype=np.float32, buffer=out_shm.buf).copy()
+        finally:
+            for shm in (in_shm, out_shm):
+                shm.close()
+                shm.unlink()
+
+    def build_profile(self, filepath, profile_dir, version):
+        """Speaker profile (without audio) computed in a worker process"""
+        return self._run(_profile_task, filepath, profile_dir, version)
+
+    def analyze_profile(self, wav, profile_dir, embedding, version):
+        """Speaker profile (without audio) for trimmed audio, analysed in a worker"""
+        shm, desc = share_array(np.asarray(wav, dtype=np.float32))
+        try:
+            return self._run(_analyze_task, desc, profile_dir, embedding, version)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'started': self._executor is not None and self._pid == os.getpid(),
+                'submitted': self.submitted,
+                'in_flight': self.in_flight,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
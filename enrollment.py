@@ -0,0 +1,307 @@
+"""Streaming voice enrollment: build a speaker profile while the user records"""
+import threading
+import time
+import uuid
+from collections import deque
+from math import gcd
+
+import librosa
+import numpy as np
+import webrtcvad
+from resemblyzer import VoiceEncoder
+from resemblyzer.hparams import (sampling_rate as ENCODER_SAMPLE_RATE, mel_window_length,
+                                 mel_window_step, mel_n_channels, partials_n_frames)
+from scipy.signal import firwin
+
+from speaker_profile import PROFILE_SAMPLE_RATE
+
+
+class StreamResampler:
+    """Polyphase resampler fed in chunks.
+
+    Uses the same Kaiser-windowed FIR as ``scipy.signal.resample_poly`` and
+    produces the same samples as resampling the whole signal at once. Each
+    output sample is emitted as soon as all of its input has arrived; only
+    the filter's history is kept between chunks.
+    """
+
+    def __init__(self, orig_sr, target_sr):
+        g = gcd(int(orig_sr), int(target_sr))
+        self.up = int(target_sr) // g
+        self.down = int(orig_sr) // g
+        max_rate = max(self.up, self.down)
+        half_len = 10 * max_rate
+        h = firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0)) * self.up
+        self.delay = half_len
+        self.taps = -(-len(h) // self.up)
+        self.h = np.zeros(self.taps * self.up)
+        self.h[:len(h)] = h
+        self._buffer = np.zeros(0)
+        self._start = 0  # Input index of _buffer[0]
+        self._n_in = 0
+        self._n_out = 0
+
+    def _compute(self, n_end):
+        n = np.arange(self._n_out, n_end)
+        t = n * self.down + self.delay
+        j = np.arange(self.taps)
+        coeffs = self.h[(t % self.up)[:, None] + j * self.up]
+        index = (t // self.up)[:, None] - j - self._start
+        valid = (index >= 0) & (index < len(self._buffer))
+        samples = np.append(self._buffer, 0.0)[np.where(valid, index, len(self._buffer))]
+        self._n_out = n_end
+        return (coeffs * samples).sum(axis=1).astype(np.float32)
+
+    def push(self, samples):
+        """Add input; returns the output samples that are now complete"""
+        self._buffer = np.concatenate([self._buffer, np.asarray(samples, dtype=np.float64)])
+        self._n_in += len(samples)
+        # Output n needs input up to (n * down + delay) // up
+        n_end = max(self._n_out, -(-(self._n_in * self.up - self.delay) // self.down))
+        out = self._compute(n_end)
+        keep_from = max(0, (self._n_out * self.down + self.delay) // self.up - self.taps + 1)
+        if keep_from > self._start:
+            self._buffer = self._buffer[keep_from - self._start:]
+            self._start = keep_from
+        return out
+
+    def flush(self):
+        """Remaining output, treating the signal as ended"""
+        n_total = -(-(self._n_in * self.up) // self.down)
+        return self._compute(max(self._n_out, n_total))
+
+
+class SpeechTrimmer:
+    """Trims leading and trailing silence from a stream with WebRTC VAD.
+
+    Silence inside the speech is kept, as ``librosa.effects.trim`` would.
+    Trailing non-speech frames are held back until more speech arrives, and
+    ``pad_frames`` frames are kept on either side so onsets aren't clipped.
+    """
+
+    def __init__(self, sample_rate=ENCODER_SAMPLE_RATE, frame_ms=30, aggressiveness=2, pad_frames=3):
+        self.vad = webrtcvad.Vad(aggressiveness)
+        self.sample_rate = sample_rate
+        self.frame = sample_rate * frame_ms // 1000
+        self.pad_frames = pad_frames
+        self._rest = np.zeros(0, dtype=np.float32)
+        self._preroll = deque(maxlen=pad_frames)
+        self._pending = []
+        self._position = 0  # Sample index of the next frame
+        self.start = None  # Sample index where kept audio begins
+        self.kept = 0
+
+    def _is_speech(self, frame):
+        pcm = (np.clip(frame, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+        return self.vad.is_speech(pcm, self.sample_rate)
+
+    def push(self, samples):
+        """Add samples; returns the samples now known to be kept"""
+        samples = np.concatenate([self._rest, np.asarray(samples, dtype=np.float32)])
+        n_frames = len(samples) // self.frame
+        self._rest = samples[n_frames * self.frame:]
+        out = []
+        for i in range(n_frames):
+            frame = samples[i * self.frame:(i + 1) * self.frame]
+            speech = self._is_speech(frame)
+            if self.start is None:
+                if speech:
+                    self.start = self._position - len(self._preroll) * self.frame
+                    out.extend(self._preroll)
+                    out.append(frame)
+                else:
+                    self._preroll.append(frame)
+            elif speech:
+                out.extend(self._pending)
+                out.append(frame)
+                self._pending = []
+            else:
+                self._pending.append(frame)
+            self._position += self.frame
+        return self._emit(out)
+
+    def finish(self):
+        """Trailing padding after the last speech frame"""
+        out = self._pending[:self.pad_frames] if self.start is not None else []
+        self._pending = []
+        return self._emit(out)
+
+    def _emit(self, frames):
+        out = np.concatenate(frames) if frames else np.zeros(0, dtype=np.float32)
+        self.kept += len(out)
+        return out
+
+
+class RunningEmbedding:
+    """Resemblyzer utterance embedding computed incrementally.
+
+    Mel frames are computed as soon as their analysis window is complete and
+    each 1.6 s partial utterance is embedded once all its frames exist, so at
+    the end only the last partial or two remain. The result matches
+    ``VoiceEncoder.embed_utterance`` on the same audio.
+    """
+
+    def __init__(self, encoder, rate=1.3, min_coverage=0.75):
+        self.encoder = encoder
+        self.rate = rate
+        self.min_coverage = min_coverage
+        self.hop = int(ENCODER_SAMPLE_RATE * mel_window_step / 1000)
+        self.n_fft = int(ENCODER_SAMPLE_RATE * mel_window_length / 1000)
+        self.frame_step = int(np.round((ENCODER_SAMPLE_RATE / rate) / self.hop))
+        # Zero padding in front matches librosa's centered frames
+        self._wav = np.zeros(self.n_fft // 2, dtype=np.float32)
+        self.n_samples = 0
+        self._mel = np.zeros((0, mel_n_channels), dtype=np.float32)
+        self._partials = []
+
+    def _extend_mel(self, n_frames):
+        done = len(self._mel)
+        if n_frames <= done:
+            return
+        segment = self._wav[done * self.hop:(n_frames - 1) * self.hop + self.n_fft]
+        mel = librosa.feature.melspectrogram(y=segment, sr=ENCODER_SAMPLE_RATE, n_fft=self.n_fft,
+                                             hop_length=self.hop, n_mels=mel_n_channels, center=False)
+        self._mel = np.concatenate([self._mel, mel.astype(np.float32).T])
+
+    def _embed_partials(self, count):
+        starts = [i * self.frame_step for i in range(len(self._partials), count)]
+        if starts:
+            mels = np.stack([self._mel[s:s + partials_n_frames] for s in starts])
+            self._partials.extend(self.encoder.embed_frames_batch(mels))
+
+    def push(self, samples):
+        if len(samples) == 0:
+            return
+        self._wav = np.concatenate([self._wav, samples])
+        self.n_samples += len(samples)
+        # Frame f is final once samples up to f * hop + n_fft / 2 have arrived
+        if self.n_samples >= self.n_fft // 2:
+            self._extend_mel((self.n_samples - self.n_fft // 2) // self.hop + 1)
+        ready = (len(self._mel) - partials_n_frames) // self.frame_step + 1
+        self._embed_partials(max(0, ready))
+
+    @property
+    def partial_count(self):
+        return len(self._partials)
+
+    def finish(self):
+        """The normalized utterance embedding"""
+        wav_slices, mel_slices = VoiceEncoder.compute_partial_slices(
+            self.n_samples, self.rate, self.min_coverage)
+        # embed_utterance pads the audio to cover the last partial
+        length = max(self.n_samples, wav_slices[-1].stop)
+        self._wav = np.concatenate([self._wav, np.zeros(length - self.n_samples + self.n_fft // 2,
+                                                        dtype=np.float32)])
+        self._extend_mel(1 + length // self.hop)
+        self._embed_partials(len(mel_slices))
+        raw_embed = np.mean(self._partials[:len(mel_slices)], axis=0)
+        return raw_embed / np.linalg.norm(raw_embed, 2)
+
+
+class EnrollmentSession:
+    """One recording being enrolled from 16-bit PCM chunks.
+
+    Each chunk is resampled to the encoder and profile rates, trimmed of
+    leading silence and fed into the running embedding, so ``finish`` only
+    has a little work left when recording stops.
+    """
+
+    def __init__(self, user_id, sample_rate, encoder=None, max_seconds=60):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.sample_rate = sample_rate
+        self.max_seconds = max_seconds
+        self.created_at = self.updated_at = time.time()
+        self.received = 0
+        self.lock = threading.Lock()
+        self._to_encoder = StreamResampler(sample_rate, ENCODER_SAMPLE_RATE)
+        self._to_profile = StreamResampler(sample_rate, PROFILE_SAMPLE_RATE)
+        self._trimmer = SpeechTrimmer(ENCODER_SAMPLE_RATE)
+        self._embedding = RunningEmbedding(encoder) if encoder is not None else None
+        self._profile_audio = []
+
+    def _feed(self, encoder_samples):
+        speech = self._trimmer.push(encoder_samples)
+        if self._embedding is not None:
+            self._embedding.push(speech)
+
+    def push_pcm16(self, data):
+        """Add a chunk of little-endian 16-bit mono PCM"""
+        if len(data) % 2:
+            raise ValueError("PCM chunks must contain whole 16-bit samples")
+        samples = np.frombuffer(data, dtype='<i2').astype(np.float32) / 32768.0
+        with self.lock:
+            if (self.received + len(samples)) / self.sample_rate > self.max_seconds:
+                raise ValueError(f"Recording longer than {self.max_seconds} seconds")
+            self.received += len(samples)
+            self.updated_at = time.time()
+            self._profile_audio.append(self._to_profile.push(samples))
+            self._feed(self._to_encoder.push(samples))
+
+    def progress(self):
+        with self.lock:
+            return {
+                'sessionId': self.id,
+                'received_seconds': self.received / self.sample_rate,
+                'speech_seconds': self._trimmer.kept / ENCODER_SAMPLE_RATE,
+                'partials': self._embedding.partial_count if self._embedding else 0,
+            }
+
+    def finish(self):
+        """Trimmed audio at ``PROFILE_SAMPLE_RATE`` and its embedding (or None)"""
+        with self.lock:
+            self._profile_audio.append(self._to_profile.flush())
+            self._feed(self._to_encoder.flush())
+            tail = self._trimmer.finish()
+            if self._trimmer.start is None:
+                raise ValueError("Voice sample contains no audible speech")
+            if self._embedding is not None:
+                self._embedding.push(tail)
+
+            # Apply the trim found at the encoder rate to the profile-rate audio
+            scale = PROFILE_SAMPLE_RATE / ENCODER_SAMPLE_RATE
+            start = int(round(self._trimmer.start * scale))
+            end = int(round((self._trimmer.start + self._trimmer.kept) * scale))
+            wav = np.concatenate(self._profile_audio)[start:end]
+            embedding = self._embedding.finish() if self._embedding is not None else None
+            return wav, embedding
+
+
+class EnrollmentSessions:
+    """In-process registry of active enrollment sessions.
+
+    Sessions live in the worker that started them, so with several gunicorn
+    workers the client must reach the same worker (sticky routing) or fall
+    back to a normal upload when a session is not found.
+    """
+
+    def __init__(self, ttl=120, max_sessions=64):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for session_id in [s.id for s in self._sessions.values() if s.updated_at < cutoff]:
+            del self._sessions[session_id]
+
+    def add(self, session):
+        with self._lock:
+            self._prune()
+            if len(self._sessions) >= self.max_sessions:
+                raise RuntimeError("Too many enrollment sessions in progress")
+            self._sessions[session.id] = session
+
+    def get(self, session_id):
+        with self._lock:
+            self._prune()
+            return self._sessions.get(session_id)
+
+    def pop(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'active': len(self._sessions), 'max_sessions': self.max_sessions, 'ttl': self.ttl}
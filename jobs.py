@@ -0,0 +1,227 @@
+"""Background synthesis jobs served by a bounded pool of worker threads"""
+import bisect
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room for another job"""
+
+
+class SynthesisJob:
+    """A single queued synthesis request and its current state"""
+
+    def __init__(self, params, key=None, cost=1.0):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.key = key
+        self.cost = cost
+        self.tag = None  # (virtual start time, sequence) that orders the queue
+        self.status = 'queued'  # queued -> running -> done | failed
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Bumped on every state change so subscribers can wait for updates
+        self.version = 0
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+        if self.result is not None:
+            data['result'] = self.result
+        if self.error is not None:
+            data['error'] = self.error
+        return data
+
+
+class SynthesisJobQueue:
+    """Bounded queue of synthesis jobs drained by a fixed number of workers.
+
+    The handler is called as ``handler(params)`` from a worker thread and its
+    return value becomes the job result. Workers share the models loaded by
+    the application, so the number of workers bounds how many generations
+    run at once regardless of how many HTTP threads the server has.
+
+    Jobs are ordered by start-time fair queuing across their ``key`` (the
+    user): each key's next job starts, in virtual time, where its previous
+    one's estimated ``cost`` ended, so a user with a long backlog takes
+    turns with everyone else instead of holding the queue. Jobs of one key,
+    or jobs without keys, run in submission order.
+    """
+
+    def __init__(self, handler, num_workers=1, max_queue_size=16, job_ttl=3600):
+        self.handler = handler
+        self.num_workers = max(1, num_workers)
+        self.max_queue_size = max(1, max_queue_size)
+        self.job_ttl = job_ttl
+
+        self._jobs = OrderedDict()
+        self._pending = []  # Sorted by tag
+        self._tags = []
+        self._running = set()
+        self._virtual_time = 0.0
+        self._finish_tags = {}  # key -> virtual finish time of its last queued job
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._workers = []
+        self._completed = 0
+        self._failed = 0
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self._cond:
+            if self._workers:
+                return
+            for i in range(self.num_workers):
+                worker = threading.Thread(target=self._worker_loop,
+                                          name=f"synth-worker-{i}",
+                                          daemon=True)
+                self._workers.append(worker)
+                worker.start()
+
+    def submit(self, params, key=None, cost=1.0):
+        """Queue a job, raising QueueFullError when the queue is at capacity.
+
+        ``cost`` is the job's estimated run time in seconds.
+        """
+        with self._cond:
+            self._prune_expired()
+            if len(self._pending) >= self.max_queue_size:
+                raise QueueFullError(
+                    f"Synthesis queue is full ({self.max_queue_size} jobs waiting)")
+            job = SynthesisJob(params, key, cost)
+            start = self._start_tag(key)
+            self._finish_tags[key] = start + cost
+            job.tag = (start, next(self._seq))
+            index = bisect.bisect(self._tags, job.tag)
+            self._tags.insert(index, job.tag)
+            self._pending.insert(index, job)
+            self._jobs[job.id] = job
+            # Jobs it jumped ahead of have moved back one place
+            for later in self._pending[index + 1:]:
+                later.version += 1
+            self._cond.notify_all()
+        self.start()
+        return job
+
+    def _start_tag(self, key):
+        return max(self._virtual_time, self._finish_tags.get(key, 0.0))
+
+    def projected_wait(self, key=None, cost=1.0):
+        """Estimated seconds before a job for ``key`` submitted now would start"""
+        with self._cond:
+            start = self._start_tag(key)
+            now = time.time()
+            ahead = sum(job.cost for job in self._pending if job.tag[0] <= start)
+            running = sum(max(0.0, job.cost - (now - job.started_at)) for job in self._running)
+            return (ahead + running) / self.num_workers
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def position(self, job):
+        """Zero-based position of a queued job, or None once it has started"""
+        with self._cond:
+            try:
+                return self._pending.index(job)
+            except ValueError:
+                return None
+
+    def depth(self):
+        with self._cond:
+            return len(self._pending)
+
+    def snapshot(self, job):
+        """Job state plus its queue position, taken under the queue lock"""
+        with self._cond:
+            data = job.to_dict()
+            if job.status == 'queued':
+                try:
+                    data['queue_position'] = self._pending.index(job)
+                except ValueError:
+                    data['queue_position'] = None
+            data['queue_depth'] = len(self._pending)
+            return data, job.version
+
+    def wait_for_update(self, job, version, timeout=15.0):
+        """Block until the job or the queue changes past ``version``"""
+        with self._cond:
+            self._cond.wait_for(lambda: job.version != version, timeout=timeout)
+            return job.version
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': self.num_workers,
+                'capacity': self.max_queue_size,
+                'depth': len(self._pending),
+                'running': len(self._running),
+                'queued_users': len({job.key for job in self._pending}),
+                'completed': self._completed,
+                'failed': self._failed,
+            }
+
+    def _touch_pending(self):
+        # Everyone still waiting has moved up one place
+        for job in self._pending:
+            job.version += 1
+
+    def _prune_expired(self):
+        # Keys whose last job is behind the virtual clock would start at it anyway
+        for key in [k for k, finish in self._finish_tags.items() if finish <= self._virtual_time]:
+            del self._finish_tags[key]
+        cutoff = time.time() - self.job_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._pending) > 0)
+                job = self._pending.pop(0)
+                self._tags.pop(0)
+                self._virtual_time = job.tag[0]
+                job.status = 'running'
+                job.started_at = time.time()
+                job.version += 1
+                self._running.add(job)
+                self._touch_pending()
+                self._cond.notify_all()
+
+            try:
+                result = self.handler(job.params)
+                error = None
+            except Exception as e:
+                print(f"Error in synthesis job {job.id}: {e}")
+                result = None
+                error = str(e) or "Unknown error during synthesis"
+
+            with self._cond:
+                job.result = result
+                job.error = error
+                job.status = 'failed' if error else 'done'
+                job.finished_at = time.time()
+                job.version += 1
+                self._running.discard(job)
+                if error:
+                    self._failed += 1
+                else:
+                    self._completed += 1
+                self._cond.notify_all()
@@ -25,6 +25,9 @@ document.addEventListener('DOMContentLoaded', () => {
   let canvasCtx = visualizer.getContext('2d');
   let animationFrame = null;
   let useVoiceAdaptation = true; // Default to enable voice adaptation
+  const STREAM_THRESHOLD_CHARS = 200; // Longer text is streamed chunk by chunk
+  const ENROLL_CHUNK_MS = 250; // PCM sent to the server this often while recording
+  let enrollment = null; // Streaming enrollment session for the current recording
   
   // Tab Navigation
   learnTab.addEventListener('click', () => {
@@ -80,6 +83,7 @@ document.addEventListener('DOMContentLoaded', () => {
       stream = await navigator.mediaDevices.getUserMedia({ audio: true });
       setupMediaRecorder(stream);
       setupAudioVisualization(stream);
+      enrollment = startStreamingEnrollment(stream);
       startRecording();
     } catch (err) {
       console.error('Error accessing microphone:', err);
@@ -175,7 +179,7 @@ document.addEventListener('DOMContentLoaded', () => {
   // Load available voices
   async function loadVoices() {
     try {
-      const response = await fetch('/voices');
+      const response = await fetch(userId ? `/voices?userId=${encodeURIComponent(userId)}` : '/voices');
       if (!response.ok) {
         throw new Error('Failed to fetch voices');
       }
@@ -315,7 +319,15 @@ document.addEventListener('DOMContentLoaded', () => {
       recordStatus.textContent = 'Processing...';
       
       const audioBlob = new Blob(audioChunks, { type: 'audio/wav' });
-      await uploadVoiceSample(audioBlob);
+      
+      // The profile is usually ready already; upload the recording only if streaming failed
+      const data = enrollment ? await finishStreamingEnrollment(enrollment) : null;
+      enrollment = null;
+      if (data) {
+        handleEnrollmentResponse(data);
+      } else {
+        await uploadVoiceSample(audioBlob);
+      }
       
       // Clean up
       audioChunks = [];
@@ -361,6 +373,118 @@ document.addEventListener('DOMContentLoaded', () => {
     clearVisualization();
   }
   
+  // Streaming enrollment: send raw PCM while recording so the voice
+  // profile is built on the fly. Any failure falls back to a normal upload.
+  function startStreamingEnrollment(stream) {
+    if (!audioContext || !audioContext.createScriptProcessor) {
+      return null;
+    }
+    
+    const source = audioContext.createMediaStreamSource(stream);
+    const processor = audioContext.createScriptProcessor(4096, 1, 1);
+    const session = {
+      id: null,
+      failed: false,
+      source,
+      processor,
+      sampleRate: audioContext.sampleRate,
+      buffered: [],
+      bufferedSamples: 0,
+      queue: Promise.resolve()
+    };
+    
+    session.ready = fetch('/enroll/start', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ userId, sampleRate: session.sampleRate })
+    })
+      .then(response => response.ok ? response.json() : Promise.reject(new Error(`HTTP ${response.status}`)))
+      .then(data => { session.id = data.sessionId; })
+      .catch(err => {
+        console.warn('Streaming enrollment unavailable, will upload the recording instead:', err);
+        session.failed = true;
+      });
+    
+    processor.onaudioprocess = event => {
+      if (session.failed || !isRecording) {
+        return;
+      }
+      
+      // Float samples to 16-bit PCM
+      const input = event.inputBuffer.getChannelData(0);
+      const pcm = new Int16Array(input.length);
+      for (let i = 0; i < input.length; i++) {
+        const s = Math.max(-1, Math.min(1, input[i]));
+        pcm[i] = s < 0 ? s * 0x8000 : s * 0x7fff;
+      }
+      session.buffered.push(pcm);
+      session.bufferedSamples += pcm.length;
+      
+      if (session.bufferedSamples >= session.sampleRate * ENROLL_CHUNK_MS / 1000) {
+        sendEnrollmentChunk(session);
+      }
+    };
+    
+    // A script processor only runs while connected to an output
+    source.connect(processor);
+    processor.connect(audioContext.destination);
+    return session;
+  }
+  
+  function sendEnrollmentChunk(session) {
+    const chunk = new Int16Array(session.bufferedSamples);
+    let offset = 0;
+    for (const part of session.buffered) {
+      chunk.set(part, offset);
+      offset += part.length;
+    }
+    session.buffered = [];
+    session.bufferedSamples = 0;
+    
+    // Chunks are sent one at a time, in order
+    session.queue = session.queue
+      .then(() => session.ready)
+      .then(async () => {
+        if (session.failed) {
+          return;
+        }
+        const response = await fetch(`/enroll/${session.id}/chunk`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/octet-stream' },
+          body: chunk.buffer
+        });
+        if (!response.ok) {
+          throw new Error(`HTTP ${response.status}`);
+        }
+      })
+      .catch(err => {
+        console.warn('Streaming enrollment failed, will upload the recording instead:', err);
+        session.failed = true;
+      });
+  }
+  
+  // Returns the server's enrollment response, or null to fall back to uploading
+  async function finishStreamingEnrollment(session) {
+    session.processor.disconnect();
+    session.source.disconnect();
+    if (session.bufferedSamples > 0 && !session.failed) {
+      sendEnrollmentChunk(session);
+    }
+    await session.ready;
+    await session.queue;
+    if (session.failed) {
+      return null;
+    }
+    
+    try {
+      const response = await fetch(`/enroll/${session.id}/finish`, { method: 'POST' });
+      return response.ok ? await response.json() : null;
+    } catch (err) {
+      console.warn('Could not finish streaming enrollment:', err);
+      return null;
+    }
+  }
+  
   // Upload Voice Sample
   async function uploadVoiceSample(audioBlob) {
     try {
@@ -379,32 +503,7 @@ document.addEventListener('DOMContentLoaded', () => {
       const data = await response.json();
       
       if (response.ok) {
-        // Store the user ID
-        userId = data.userId;
-        localStorage.setItem('userId', userId);
-        recordStatus.textContent = 'Voice sample uploaded successfully!';
-        
-        if (data.voice_processed) {
-          showMessage('Your voice has been processed and is ready for adaptation! You can now synthesize text.', 'success');
-        } else {
-          if (data.error) {
-            const errorMsg = data.error.message || 'Unknown error';
-            const solution = data.error.solution || '';
-            
-            recordStatus.textContent = 'Error: ' + errorMsg;
-            
-            if (data.error.error_type === 'missing_dependency') {
-              showMessage(`Voice processing failed: ${errorMsg}. ${solution}`, 'error');
-            } else {
-              showMessage('Voice sample uploaded, but could not be processed for adaptation: ' + errorMsg, 'warning');
-            }
-          } else {
-            showMessage('Voice sample uploaded, but could not be processed for adaptation. Using AI voices only.', 'warning');
-          }
-        }
-        
-        // Enable the synthesize tab
-        synthesizeTab.click();
+        handleEnrollmentResponse(data);
       } else {
         throw new Error(data.message || 'Error uploading voice sample');
       }
@@ -415,6 +514,36 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
   
+  // Handle the response of /upload or /enroll/<id>/finish
+  function handleEnrollmentResponse(data) {
+    // Store the user ID
+    userId = data.userId;
+    localStorage.setItem('userId', userId);
+    recordStatus.textContent = 'Voice sample uploaded successfully!';
+    
+    if (data.voice_processed) {
+      showMessage('Your voice has been processed and is ready for adaptation! You can now synthesize text.', 'success');
+    } else {
+      if (data.error) {
+        const errorMsg = data.error.message || 'Unknown error';
+        const solution = data.error.solution || '';
+        
+        recordStatus.textContent = 'Error: ' + errorMsg;
+        
+        if (data.error.error_type === 'missing_dependency') {
+          showMessage(`Voice processing failed: ${errorMsg}. ${solution}`, 'error');
+        } else {
+          showMessage('Voice sample uploaded, but could not be processed for adaptation: ' + errorMsg, 'warning');
+        }
+      } else {
+        showMessage('Voice sample uploaded, but could not be processed for adaptation. Using AI voices only.', 'warning');
+      }
+    }
+    
+    // Enable the synthesize tab
+    synthesizeTab.click();
+  }
+  
   // Synthesize Voice
   async function synthesizeVoice(text) {
     try {
@@ -435,6 +564,12 @@ document.addEventListener('DOMContentLoaded', () => {
       
       console.log(`Applying voice adaptation: ${applyAdaptation}`);
       
+      // Stream long text sentence by sentence so playback starts sooner
+      if (text.length > STREAM_THRESHOLD_CHARS) {
+        streamVoice(text, selectedVoice, applyAdaptation);
+        return;
+      }
+      
       const response = await fetch('/synthesize', {
         method: 'POST',
         headers: {
@@ -444,7 +579,8 @@ document.addEventListener('DOMContentLoaded', () => {
           text, 
           userId,
           voice: selectedVoice,
-          use_user_voice: applyAdaptation
+          use_user_voice: applyAdaptation,
+          async: true
         })
       });
       
@@ -455,8 +591,11 @@ document.addEventListener('DOMContentLoaded', () => {
       
       console.log('Received response from server');
       
-      // Get the JSON response with file URLs
-      const data = await response.json();
+      // Get the JSON response: either the result or a queued job
+      let data = await response.json();
+      if (response.status === 202 && data.job_id) {
+        data = await waitForJob(data);
+      }
       console.log('Response data:', data);
       
       if (!data.file_url) {
@@ -519,6 +658,99 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
   
+  // Play long text from the progressive streaming endpoint
+  function streamVoice(text, selectedVoice, applyAdaptation) {
+    const params = new URLSearchParams({
+      text,
+      userId: userId || '',
+      voice: selectedVoice || '',
+      use_user_voice: applyAdaptation ? 'true' : 'false'
+    });
+    
+    // Remove any existing download links; streamed audio isn't saved
+    document.querySelectorAll('.download-link').forEach(link => link.remove());
+    
+    synthAudio.src = `/synthesize/stream?${params.toString()}`;
+    synthAudio.onerror = (e) => {
+      console.error('Audio stream error:', e);
+      showMessage('Error streaming audio.', 'error');
+    };
+    synthAudio.load();
+    
+    const playPromise = synthAudio.play();
+    if (playPromise !== undefined) {
+      playPromise.catch(err => {
+        console.error('Audio playback failed:', err);
+        showMessage('Audio playback failed: ' + err.message, 'error');
+      });
+    }
+    
+    showMessage('Streaming speech as it is generated...', 'success');
+  }
+  
+  // Wait for a queued synthesis job to finish and return its result
+  function waitForJob(job) {
+    const showProgress = (update) => {
+      if (update.status === 'queued' && update.queue_position !== undefined && update.queue_position !== null) {
+        synthesizeButton.textContent = `Queued (position ${update.queue_position + 1})...`;
+      } else if (update.status === 'running') {
+        synthesizeButton.textContent = 'Generating...';
+      }
+    };
+    
+    const finish = (update, resolve, reject) => {
+      if (update.status === 'done') {
+        resolve(update.result);
+      } else {
+        reject(new Error(update.error || 'Synthesis job failed'));
+      }
+    };
+    
+    showProgress(job);
+    
+    return new Promise((resolve, reject) => {
+      // Poll the job status if server-sent events are unavailable
+      const poll = async () => {
+        try {
+          const response = await fetch(job.status_url);
+          const update = await response.json();
+          if (!response.ok) {
+            throw new Error(update.message || 'Error checking synthesis job');
+          }
+          showProgress(update);
+          if (update.status === 'done' || update.status === 'failed') {
+            finish(update, resolve, reject);
+          } else {
+            setTimeout(poll, 1000);
+          }
+        } catch (err) {
+          reject(err);
+        }
+      };
+      
+      if (!window.EventSource) {
+        poll();
+        return;
+      }
+      
+      const events = new EventSource(job.events_url);
+      const onUpdate = (event) => {
+        const update = JSON.parse(event.data);
+        showProgress(update);
+        if (update.status === 'done' || update.status === 'failed') {
+          events.close();
+          finish(update, resolve, reject);
+        }
+      };
+      ['queued', 'running', 'done', 'failed'].forEach(name => events.addEventListener(name, onUpdate));
+      events.onerror = () => {
+        // Fall back to polling if the stream drops, is refused or times out before the job finishes
+        events.close();
+        poll();
+      };
+    });
+  }
+  
   // Function to update the adaptation status UI
   function updateAdaptationStatus(data) {
     const adaptationStatus = document.getElementById('adaptationStatus');
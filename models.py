@@ -0,0 +1,150 @@
+"""Model loading lifecycle: eager, lazy or background loading plus warm-up"""
+import threading
+import time
+
+LOAD_MODES = ('eager', 'lazy', 'background')
+
+
+class ModelRegistry:
+    """Tracks how and when each model is loaded and warmed up.
+
+    Models are registered with a ``load_fn`` returning the loaded object and
+    an optional ``warmup_fn(model)`` that runs one tiny inference so the first
+    real request doesn't pay one-off JIT and allocation costs. ``ensure``
+    loads (and, with ``warmup``, warms up) a model on first use and blocks
+    concurrent callers until it is ready, so every load mode serves requests
+    correctly; the mode only decides when loading starts.
+    """
+
+    def __init__(self, mode='eager', warmup=False):
+        if mode not in LOAD_MODES:
+            raise ValueError(f"Unknown model load mode '{mode}', expected one of {LOAD_MODES}")
+        self.mode = mode
+        self.warmup = warmup
+        self.started_at = time.time()
+        self._models = {}
+        self._order = []
+        self._thread = None
+
+    def register(self, name, load_fn, warmup_fn=None, required=True):
+        """Add a model, or replace one not loaded yet; ``required`` models gate readiness"""
+        if name not in self._models:
+            self._order.append(name)
+        self._models[name] = {
+            'load_fn': load_fn,
+            'warmup_fn': warmup_fn,
+            'required': required,
+            'lock': threading.Lock(),
+            'state': 'not_loaded',  # not_loaded -> loading -> ready | failed
+            'model': None,
+            'error': None,
+            'load_seconds': None,
+            'warmup_seconds': None,
+            'warmed_up': False,
+            'warmup_error': None,
+        }
+
+    def start(self):
+        """Begin loading according to the configured mode"""
+        if self.mode == 'eager':
+            self.load_all()
+        elif self.mode == 'background':
+            self._thread = threading.Thread(target=self.load_all, name='model-loader', daemon=True)
+            self._thread.start()
+
+    def load_all(self):
+        for name in self._order:
+            self.ensure(name)
+
+    def ensure(self, name):
+        """Load the model if needed; True once it is usable"""
+        entry = self._models[name]
+        if entry['state'] == 'ready':
+            return True
+        with entry['lock']:
+            if entry['state'] in ('ready', 'failed'):
+                return entry['state'] == 'ready'
+            entry['state'] = 'loading'
+            print(f"Loading model '{name}'...")
+            start = time.perf_counter()
+            try:
+                entry['model'] = entry['load_fn']()
+            except Exception as e:
+                entry['error'] = str(e) or e.__class__.__name__
+                entry['state'] = 'failed'
+                print(f"Error loading model '{name}': {entry['error']}")
+            entry['load_seconds'] = time.perf_counter() - start
+            if entry['state'] == 'loading':
+                print(f"Model '{name}' loaded in {entry['load_seconds']:.1f}s")
+                # Whichever request loads a model warms it up, in every load mode
+                if self.warmup and entry['warmup_fn'] is not None:
+                    self._run_warmup(name, entry)
+                entry['state'] = 'ready'
+        return entry['state'] == 'ready'
+
+    def get(self, name):
+        """The loaded model object, loading it first if necessary"""
+        return self._models[name]['model'] if self.ensure(name) else None
+
+    def is_ready(self, name):
+        return self._models[name]['state'] == 'ready'
+
+    def warm_up(self, names=None):
+        """Run each loaded model's warm-up inference once"""
+        for name in names or self._order:
+            entry = self._models[name]
+            if entry['warmup_fn'] is None or not self.ensure(name):
+                continue
+            with entry['lock']:
+                if not entry['warmed_up']:
+                    self._run_warmup(name, entry)
+
+    def _run_warmup(self, name, entry):
+        """Run one model's warm-up inference; caller holds its lock"""
+        start = time.perf_counter()
+        try:
+            entry['warmup_fn'](entry['model'])
+            entry['warmed_up'] = True
+            entry['warmup_error'] = None
+            entry['warmup_seconds'] = time.perf_counter() - start
+            print(f"Model '{name}' warmed up in {entry['warmup_seconds']:.1f}s")
+        except Exception as e:
+            # The model still works; the first request just pays the warm-up cost
+            entry['warmup_error'] = str(e) or e.__class__.__name__
+            print(f"Error warming up model '{name}': {entry['warmup_error']}")
+
+    def ready(self):
+        """Whether required models can serve requests.
+
+        In eager and background mode that means loaded, and warmed up if
+        enabled (``ensure`` marks a model ready only after its warm-up has
+        run). In lazy mode models load on the first request that needs them,
+        so the service is ready as long as none has failed to load.
+        """
+        for entry in self._models.values():
+            if not entry['required']:
+                continue
+            if self.mode == 'lazy' and entry['state'] != 'failed':
+                continue
+            if entry['state'] != 'ready':
+                return False
+        return True
+
+    def status(self):
+        return {
+            'mode': self.mode,
+            'warmup': self.warmup,
+            'uptime_seconds': time.time() - self.started_at,
+            'models': {
+                name: {
+                    'state': entry['state'],
+                    'required': entry['required'],
+                    'load_seconds': entry['load_seconds'],
+                    'warmed_up': entry['warmed_up'],
+                    'warmup_seconds': entry['warmup_seconds'],
+                    'warmup_error': entry['warmup_error'],
+                    'error': entry['error'],
+                }
+                for name, entry in ((n, self._models[n]) for n in self._order)
+            },
+        }
@@ -0,0 +1,138 @@
+"""Index of voice preset embeddings for picking the preset closest to a user's voice"""
+import os
+import threading
+import uuid
+
+import librosa
+import numpy as np
+
+from speaker_profile import ENCODER_SAMPLE_RATE, mean_pitch
+
+PRESET_SAMPLE_RATE = 24000  # Rate of Bark's codec output
+EMBEDDING_SIZE = 256
+
+
+def load_custom_presets(folder):
+    """``{name: path}`` for the Bark ``.npz`` history prompts in ``folder``"""
+    if not folder or not os.path.isdir(folder):
+        return {}
+    return {os.path.splitext(name)[0]: os.path.join(folder, name)
+            for name in sorted(os.listdir(folder)) if name.endswith('.npz')}
+
+
+def preset_fingerprint(prompt):
+    """Identifies a preset's content: built-in names as they are, files by path, size and mtime"""
+    if isinstance(prompt, str) and prompt.endswith('.npz') and os.path.exists(prompt):
+        st = os.stat(prompt)
+        return f"{os.path.abspath(prompt)}:{st.st_size}:{int(st.st_mtime)}"
+    return str(prompt)
+
+
+def analyze_preset(prompt, encoder):
+    """Embedding and mean F0 of a Bark history prompt, decoded from its fine tokens"""
+    from bark.generation import _load_history_prompt, codec_decode
+    audio = codec_decode(_load_history_prompt(prompt)['fine_prompt']).astype(np.float32)
+    wav_16k = librosa.resample(audio, orig_sr=PRESET_SAMPLE_RATE, target_sr=ENCODER_SAMPLE_RATE)
+    return encoder.embed_utterance(wav_16k), mean_pitch(audio, PRESET_SAMPLE_RATE)
+
+
+class PresetIndex:
+    """Preset embeddings as rows of one normalized float32 matrix, with each preset's mean F0.
+
+    ``nearest`` scores every preset against a user's embedding with a single
+    matrix-vector product, less a penalty per octave of pitch shift that
+    adaptation would need, so lookups stay cheap with hundreds of presets.
+    Analysed presets are saved to ``path``; on the next start only new or
+    changed presets are decoded and embedded.
+    """
+
+    def __init__(self, path=None, pitch_weight=0.25):
+        self.path = path
+        self.pitch_weight = pitch_weight
+        self.names = []
+        self.matrix = np.zeros((0, EMBEDDING_SIZE), dtype=np.float32)
+        self.f0 = np.zeros(0, dtype=np.float32)
+        self._fingerprints = []
+        self._lock = threading.Lock()
+
+    def _load_saved(self):
+        """fingerprint -> (embedding, f0) from the saved index, if any"""
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with np.load(self.path) as data:
+                return {str(fp): (row, float(f0)) for fp, row, f0
+                        in zip(data['fingerprints'], data['matrix'], data['f0'])}
+        except Exception as e:
+            print(f"Error reading preset index {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        folder = os.path.dirname(self.path) or '.'
+        os.makedirs(folder, exist_ok=True)
+        tmp_path = os.path.join(folder, f".tmp-{uuid.uuid4().hex}.npz")
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, fingerprints=np.array(self._fingerprints), matrix=self.matrix, f0=self.f0)
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def build(self, presets, analyze):
+        """Index ``{name: prompt}``; returns how many presets had to be analysed.
+
+        ``analyze(prompt)`` returns ``(embedding, f0_mean)`` and is only
+        called for presets missing from the saved index.
+        """
+        saved = self._load_saved()
+        names, fingerprints, rows, f0s = [], [], [], []
+        analysed = 0
+        for name, prompt in presets.items():
+            fingerprint = preset_fingerprint(prompt)
+            if fingerprint in saved:
+                embedding, f0 = saved[fingerprint]
+            else:
+                try:
+                    embedding, f0 = analyze(prompt)
+                except Exception as e:
+                    print(f"Error analysing voice preset {name}: {e}")
+                    continue
+                analysed += 1
+            names.append(name)
+            fingerprints.append(fingerprint)
+            rows.append(np.asarray(embedding, dtype=np.float32))
+            f0s.append(f0)
+
+        matrix = np.stack(rows) if rows else np.zeros((0, EMBEDDING_SIZE), dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-9)
+        with self._lock:
+            self.names = names
+            self.matrix = matrix
+            self.f0 = np.asarray(f0s, dtype=np.float32)
+            self._fingerprints = fingerprints
+        if self.path and (analysed or len(saved) != len(names)):
+            self._save()
+        return analysed
+
+    def nearest(self, embedding, f0_mean=None, k=1):
+        """Up to ``k`` ``(name, score)`` pairs, best first"""
+        with self._lock:
+            names, matrix, f0 = self.names, self.matrix, self.f0
+        if not names:
+            return []
+        embedding = np.asarray(embedding, dtype=np.float32)
+        scores = matrix @ (embedding / max(float(np.linalg.norm(embedding)), 1e-9))
+        if f0_mean and self.pitch_weight:
+            # Octaves adaptation would have to shift; presets without a pitch aren't penalized
+            voiced = f0 > 0
+            octaves = np.abs(np.log2(f0_mean / np.where(voiced, f0, f0_mean)))
+            scores = scores - self.pitch_weight * octaves
+        k = min(k, len(names))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(names[i], float(scores[i])) for i in top]
+
+    def stats(self):
+        with self._lock:
+            return {'presets': len(self.names), 'path': self.path, 'pitch_weight': self.pitch_weight}
@@ -0,0 +1,396 @@
+"""Voice-profile storage shared between worker processes"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import numpy as np
+
+EMBEDDING_DIM = 256  # Resemblyzer d-vector size
+
+
+class ProfileStore(ABC):
+    """Interface for per-user voice profile storage.
+
+    A record is a dict with ``user_id``, ``sample_path``, ``version``,
+    ``profile`` (pitch/formant statistics), ``embedding`` (float32 array or
+    None), ``error`` (dict or None) and ``updated_at``. When records expire,
+    the directory ``profile_dir(user_id)`` holding the user's speaker profile
+    files is deleted with them.
+    """
+
+    profile_dir = None
+
+    @abstractmethod
+    def get(self, user_id):
+        pass
+
+    @abstractmethod
+    def save_sample(self, user_id, sample_path, version):
+        """Record a new upload, clearing the previous profile and error"""
+
+    @abstractmethod
+    def save_profile(self, user_id, profile, embedding):
+        pass
+
+    @abstractmethod
+    def set_error(self, user_id, error):
+        pass
+
+    @abstractmethod
+    def user_ids_with_voice(self):
+        pass
+
+    @abstractmethod
+    def purge_expired(self):
+        """Delete expired records and their profile directories; returns how many"""
+
+    def stats(self):
+        return {}
+
+    def _remove_profile_dirs(self, user_ids):
+        if self.profile_dir is None:
+            return
+        for user_id in user_ids:
+            folder = self.profile_dir(user_id)
+            if os.path.isdir(folder):
+                shutil.rmtree(folder, ignore_errors=True)
+
+    def has_voice(self, user_id):
+        record = self.get(user_id)
+        return record is not None and record['embedding'] is not None
+
+    def get_error(self, user_id):
+        record = self.get(user_id)
+        return record['error'] if record else None
+
+
+class MemoryProfileStore(ProfileStore):
+    """Single-process store with TTL expiry, for development and tests"""
+
+    def __init__(self, ttl=0, profile_dir=None):
+        self.ttl = ttl
+        self.profile_dir = profile_dir
+        self._records = {}
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def _expired(self, record):
+        return self.ttl and record['updated_at'] < time.time() - self.ttl
+
+    def get(self, user_id):
+        with self._lock:
+            record = self._records.get(user_id)
+            if record is None or self._expired(record):
+                # Left for purge_expired, which also removes the profile directory
+                return None
+            return dict(record)
+
+    def _update(self, user_id, **fields):
+        with self._lock:
+            record = self._records.setdefault(user_id, {
+                'user_id': user_id, 'sample_path': None, 'version': None,
+                'profile': None, 'embedding': None, 'error': None,
+            })
+            record.update(fields)
+            record['updated_at'] = time.time()
+
+    def save_sample(self, user_id, sample_path, version):
+        self._update(user_id, sample_path=sample_path, version=version,
+                     profile=None, embedding=None, error=None)
+        now = time.time()
+        if now - self._last_purge >= 60:
+            self._last_purge = now
+            self.purge_expired()
+
+    def save_profile(self, user_id, profile, embedding):
+        self._update(user_id, profile=profile, embedding=np.asarray(embedding, dtype=np.float32))
+
+    def set_error(self, user_id, error):
+        self._update(user_id, error=error)
+
+    def user_ids_with_voice(self):
+        with self._lock:
+            return [user_id for user_id, record in self._records.items()
+                    if record['embedding'] is not None and not self._expired(record)]
+
+    def purge_expired(self):
+        if not self.ttl:
+            return 0
+        with self._lock:
+            expired = [user_id for user_id, record in self._records.items() if self._expired(record)]
+            for user_id in expired:
+                del self._records[user_id]
+            # Under the lock, so a new upload can't write into a directory being removed
+            self._remove_profile_dirs(expired)
+        return len(expired)
+
+    def stats(self):
+        with self._lock:
+            return {'backend': 'memory', 'records': len(self._records)}
+
+
+class SQLiteProfileStore(ProfileStore):
+    """SQLite metadata plus a memory-mapped embedding matrix on local disk.
+
+    Safe for several worker processes on one host: SQLite (in WAL mode)
+    serializes writers, and embedding rows are allocated and the matrix file
+    grown inside a write transaction. Each process keeps a small LRU of
+    recently read records that is trusted for ``cache_ttl`` seconds, so a
+    profile uploaded through another worker becomes visible within that time.
+    """
+
+    def __init__(self, folder, ttl=0, cache_size=1024, cache_ttl=2.0,
+                 dim=EMBEDDING_DIM, initial_rows=1024, profile_dir=None):
+        self.folder = folder
+        self.ttl = ttl
+        self.profile_dir = profile_dir
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.dim = dim
+        self.initial_rows = initial_rows
+        os.makedirs(folder, exist_ok=True)
+        self.db_path = os.path.join(folder, 'profiles.db')
+        self.matrix_path = os.path.join(folder, 'embeddings.f32')
+
+        self._local = threading.local()
+        self._cache = OrderedDict()  # user_id -> (record, fetched_at)
+        self._cache_lock = threading.Lock()
+        self._matrix = None
+        self._matrix_lock = threading.Lock()
+        self._last_purge = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS profiles (
+                    user_id TEXT PRIMARY KEY,
+                    sample_path TEXT,
+                    version TEXT,
+                    profile TEXT,
+                    emb_row INTEGER,
+                    has_embedding INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS profiles_updated ON profiles(updated_at);
+                CREATE TABLE IF NOT EXISTS free_rows (emb_row INTEGER PRIMARY KEY);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+                INSERT OR IGNORE INTO meta VALUES ('next_row', 0);
+            """)
+
+    def _connect(self):
+        # One connection per thread, and never reuse one inherited across fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return _Transaction(conn)
+
+    # Embedding matrix
+
+    def _matrix_rows(self):
+        return os.path.getsize(self.matrix_path) // (4 * self.dim) if os.path.exists(self.matrix_path) else 0
+
+    def _ensure_capacity(self, row):
+        """Grow the matrix file to hold ``row``; caller holds the write lock"""
+        rows = self._matrix_rows()
+        if row < rows:
+            return
+        new_rows = max(self.initial_rows, rows * 2, row + 1)
+        with open(self.matrix_path, 'ab') as f:
+            f.truncate(new_rows * self.dim * 4)
+
+    def _map(self, row):
+        """Memory map covering ``row``, remapped if another process grew it"""
+        with self._matrix_lock:
+            if self._matrix is None or row >= self._matrix.shape[0]:
+                rows = self._matrix_rows()
+                self._matrix = np.memmap(self.matrix_path, dtype=np.float32,
+                                         mode='r+', shape=(rows, self.dim))
+            return self._matrix
+
+    # Records
+
+    def _row_to_record(self, row):
+        user_id, sample_path, version, profile, emb_row, has_embedding, error, updated_at = row
+        embedding = None
+        if has_embedding and emb_row is not None:
+            embedding = np.array(self._map(emb_row)[emb_row])
+        return {
+            'user_id': user_id,
+            'sample_path': sample_path,
+            'version': version,
+            'profile': json.loads(profile) if profile else None,
+            'embedding': embedding,
+            'error': json.loads(error) if error else None,
+            'updated_at': updated_at,
+        }
+
+    def get(self, user_id):
+        now = time.time()
+        with self._cache_lock:
+            cached = self._cache.get(user_id)
+            if cached is not None and now - cached[1] < self.cache_ttl:
+                self._cache.move_to_end(user_id)
+                self.cache_hits += 1
+                return cached[0]
+            self.cache_misses += 1
+
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT user_id, sample_path, version, profile, emb_row, has_embedding, error, updated_at "
+                "FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None or (self.ttl and row[7] < now - self.ttl):
+            self._invalidate(user_id)
+            return None
+
+        record = self._row_to_record(row)
+        with self._cache_lock:
+            self._cache[user_id] = (record, now)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return record
+
+    def _invalidate(self, user_id):
+        with self._cache_lock:
+            self._cache.pop(user_id, None)
+
+    def save_sample(self, user_id, sample_path, version):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("""
+                INSERT INTO profiles (user_id, sample_path, version, profile, has_embedding, error, updated_at)
+                VALUES (?, ?, ?, NULL, 0, NULL, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    sample_path = excluded.sample_path, version = excluded.version,
+                    profile = NULL, has_embedding = 0, error = NULL,
+                    updated_at = excluded.updated_at
+            """, (user_id, sample_path, version, time.time()))
+        self._invalidate(user_id)
+        self._maybe_purge()
+
+    def save_profile(self, user_id, profile, embedding):
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(self.dim)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT emb_row FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+            emb_row = row[0] if row else None
+            if emb_row is None:
+                emb_row = self._allocate_row(conn)
+            self._ensure_capacity(emb_row)
+            matrix = self._map(emb_row)
+            matrix[emb_row] = embedding
+            matrix.flush()
+            conn.execute("""
+                INSERT INTO profiles (user_id, profile, emb_row, has_embedding, updated_at)
+                VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    profile = excluded.profile, emb_row = excluded.emb_row,
+                    has_embedding = 1, updated_at = excluded.updated_at
+            """, (user_id, json.dumps(profile), emb_row, time.time()))
+        self._invalidate(user_id)
+
+    def _allocate_row(self, conn):
+        row = conn.execute("SELECT MIN(emb_row) FROM free_rows").fetchone()[0]
+        if row is not None:
+            conn.execute("DELETE FROM free_rows WHERE emb_row = ?", (row,))
+            return row
+        row = conn.execute("SELECT value FROM meta WHERE key = 'next_row'").fetchone()[0]
+        conn.execute("UPDATE meta SET value = ? WHERE key = 'next_row'", (row + 1,))
+        return row
+
+    def set_error(self, user_id, error):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("""
+                INSERT INTO profiles (user_id, error, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    error = excluded.error, updated_at = excluded.updated_at
+            """, (user_id, json.dumps(error), time.time()))
+        self._invalidate(user_id)
+
+    def user_ids_with_voice(self):
+        query = "SELECT user_id FROM profiles WHERE has_embedding = 1"
+        params = ()
+        if self.ttl:
+            query += " AND updated_at >= ?"
+            params = (time.time() - self.ttl,)
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute(query, params)]
+
+    def purge_expired(self):
+        """Delete expired records and profile directories, returning embedding rows to the pool"""
+        if not self.ttl:
+            return 0
+        cutoff = time.time() - self.ttl
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            expired = conn.execute(
+                "SELECT user_id, emb_row FROM profiles WHERE updated_at < ?", (cutoff,)).fetchall()
+            conn.executemany("INSERT OR IGNORE INTO free_rows VALUES (?)",
+                             [(row,) for _, row in expired if row is not None])
+            conn.execute("DELETE FROM profiles WHERE updated_at < ?", (cutoff,))
+            # Inside the write transaction, so a new upload for the same user
+            # (which starts with save_sample) waits until the old files are gone
+            self._remove_profile_dirs(user_id for user_id, _ in expired)
+        for user_id, _ in expired:
+            self._invalidate(user_id)
+        if expired:
+            print(f"Expired {len(expired)} voice profiles")
+        return len(expired)
+
+    def _maybe_purge(self, interval=60):
+        now = time.time()
+        if now - self._last_purge >= interval:
+            self._last_purge = now
+            self.purge_expired()
+
+    def stats(self):
+        with self._connect() as conn:
+            records, voices = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(has_embedding), 0) FROM profiles").fetchone()
+        with self._cache_lock:
+            cached = len(self._cache)
+        return {
+            'backend': 'sqlite',
+            'records': records,
+            'voices': voices,
+            'matrix_rows': self._matrix_rows(),
+            'cached': cached,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+
+class _Transaction:
+    """Context manager wrapping an autocommit connection in BEGIN/COMMIT"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.conn.in_transaction:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def create_profile_store(backend, folder, ttl=0, cache_size=1024, profile_dir=None):
+    """Build the profile store named by ``backend`` ('sqlite' or 'memory')"""
+    if backend == 'memory':
+        return MemoryProfileStore(ttl=ttl, profile_dir=profile_dir)
+    if backend == 'sqlite':
+        return SQLiteProfileStore(folder, ttl=ttl, cache_size=cache_size, profile_dir=profile_dir)
+    raise ValueError(f"Unknown profile store backend: {backend}")
@@ -0,0 +1,118 @@
+"""Cache of Bark semantic tokens so re-voicing the same text skips the text model"""
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from synth_cache import normalize_text
+
+
+class SemanticCache:
+    """Bounded in-memory LRU of semantic token arrays with optional disk spill.
+
+    Entries pushed out of memory are written to ``spill_dir`` (if set) as
+    ``.npy`` files and promoted back into memory on their next use. The spill
+    directory is itself bounded to ``spill_max_items`` files, dropping the
+    least recently spilled first.
+    """
+
+    def __init__(self, max_items=256, spill_dir=None, spill_max_items=10000):
+        self.max_items = max(1, max_items)
+        self.spill_dir = spill_dir
+        self.spill_max_items = spill_max_items
+        self._memory = OrderedDict()
+        self._disk = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            spilled = []
+            for name in os.listdir(spill_dir):
+                if name.endswith('.npy') and not name.startswith('.'):
+                    path = os.path.join(spill_dir, name)
+                    spilled.append((os.path.getmtime(path), name[:-4]))
+            for _, key in sorted(spilled):
+                self._disk[key] = True
+
+    @staticmethod
+    def make_key(text, **params):
+        """Hash of the normalized text and the generation parameters"""
+        parts = [normalize_text(text)] + [f"{k}={params[k]}" for k in sorted(params)]
+        return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, f"{key}.npy")
+
+    def get(self, key):
+        with self._lock:
+            tokens = self._memory.get(key)
+            if tokens is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return tokens
+            on_disk = key in self._disk
+
+        if on_disk:
+            try:
+                tokens = np.load(self._spill_path(key))
+            except (OSError, ValueError):
+                tokens = None
+            if tokens is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self.put(key, tokens)
+                return tokens
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, tokens):
+        tokens = np.asarray(tokens)
+        tokens.setflags(write=False)
+        with self._lock:
+            self._memory[key] = tokens
+            self._memory.move_to_end(key)
+            evicted = []
+            while len(self._memory) > self.max_items:
+                evicted.append(self._memory.popitem(last=False))
+        if self.spill_dir:
+            for evicted_key, evicted_tokens in evicted:
+                self._spill(evicted_key, evicted_tokens)
+
+    def _spill(self, key, tokens):
+        if key not in self._disk:
+            tmp_path = os.path.join(self.spill_dir, f".tmp-{uuid.uuid4().hex}.npy")
+            try:
+                np.save(tmp_path, tokens)
+                os.replace(tmp_path, self._spill_path(key))
+            except OSError as e:
+                print(f"Error spilling semantic tokens to disk: {e}")
+                return
+        with self._lock:
+            self._disk[key] = True
+            self._disk.move_to_end(key)
+            dropped = []
+            while len(self._disk) > self.spill_max_items:
+                dropped.append(self._disk.popitem(last=False)[0])
+        for dropped_key in dropped:
+            try:
+                os.remove(self._spill_path(dropped_key))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'memory_items': len(self._memory),
+                'disk_items': len(self._disk),
+                'max_items': self.max_items,
+            }
@@ -0,0 +1,132 @@
+"""Speaker profiles computed once per uploaded voice sample"""
+import json
+import os
+
+import librosa
+import numpy as np
+import parselmouth
+from parselmouth.praat import call
+
+ENCODER_SAMPLE_RATE = 16000  # Resemblyzer expects 16 kHz input
+PROFILE_SAMPLE_RATE = 24000  # Bark's output rate, so stats compare directly
+PROFILE_AUDIO_FILE = 'audio.npy'
+PROFILE_META_FILE = 'profile.json'
+F0_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def mean_pitch(audio, sample_rate):
+    """Praat's mean F0 (Hz) of a signal, or 0 if it has no voiced frames"""
+    pitch = parselmouth.Sound(audio, sample_rate).to_pitch()
+    mean = call(pitch, "Get mean", 0, 0, "Hertz")
+    return float(mean) if np.isfinite(mean) else 0.0
+
+
+def analyze_pitch(audio, sample_rate):
+    """Mean and percentile F0 (Hz) over the voiced frames of a signal"""
+    sound = parselmouth.Sound(audio, sample_rate)
+    pitch = sound.to_pitch()
+    mean = call(pitch, "Get mean", 0, 0, "Hertz")
+    f0 = pitch.selected_array['frequency']
+    voiced = f0[f0 > 0]
+    if voiced.size:
+        percentiles = np.percentile(voiced, F0_PERCENTILES)
+    else:
+        percentiles = np.zeros(len(F0_PERCENTILES))
+    return {
+        'f0_mean': float(mean) if np.isfinite(mean) else 0.0,
+        'f0_percentiles': {str(p): float(v) for p, v in zip(F0_PERCENTILES, percentiles)},
+        'voiced_fraction': float(voiced.size / max(1, f0.size)),
+    }
+
+
+def analyze_formants(audio, sample_rate, max_formant=5500.0):
+    """Mean F1-F3 (Hz) estimated with Praat's Burg method"""
+    sound = parselmouth.Sound(audio, sample_rate)
+    formant = sound.to_formant_burg(maximum_formant=max_formant)
+    means = {}
+    for n in (1, 2, 3):
+        value = call(formant, "Get mean", n, 0, 0, "hertz")
+        means[f"f{n}_mean"] = float(value) if np.isfinite(value) else 0.0
+    return means
+
+
+def build_speaker_profile(filepath, profile_dir, encoder=None, version=None):
+    """Decode a voice sample once and persist everything adaptation needs.
+
+    The trimmed audio is stored as float32 ``.npy`` so it can be memory-mapped
+    later; the embedding and pitch/formant statistics go to ``profile.json``.
+    Returns the profile dict with the audio attached under ``'audio'``.
+    """
+    # Decode once at Bark's rate; the encoder input is derived from it
+    wav, _ = librosa.load(filepath, sr=PROFILE_SAMPLE_RATE)
+    wav, _ = librosa.effects.trim(wav, top_db=20)
+    wav = wav.astype(np.float32)
+    if wav.size == 0:
+        raise ValueError("Voice sample contains no audible speech")
+
+    embedding = None
+    if encoder is not None:
+        wav_16k = librosa.resample(wav, orig_sr=PROFILE_SAMPLE_RATE,
+                                   target_sr=ENCODER_SAMPLE_RATE)
+        embedding = encoder.embed_utterance(wav_16k)
+    return profile_from_audio(wav, profile_dir, embedding, version)
+
+
+def profile_from_audio(wav, profile_dir, embedding=None, version=None):
+    """Analyse trimmed audio at ``PROFILE_SAMPLE_RATE`` and persist the profile.
+
+    Used directly by streaming enrollment, which already has decoded audio
+    and its embedding. Returns the profile with the audio under ``'audio'``.
+    """
+    profile = {
+        'version': version,
+        'sample_rate': PROFILE_SAMPLE_RATE,
+        'duration': float(wav.size / PROFILE_SAMPLE_RATE),
+    }
+    if embedding is not None:
+        profile['embedding'] = np.asarray(embedding, dtype=np.float32)
+
+    profile.update(analyze_pitch(wav, PROFILE_SAMPLE_RATE))
+    try:
+        profile.update(analyze_formants(wav, PROFILE_SAMPLE_RATE))
+    except Exception as e:
+        # Formants are informative only; don't fail the upload over them
+        print(f"Could not estimate formants: {e}")
+
+    save_speaker_profile(profile_dir, profile, wav)
+    profile['audio'] = wav
+    return profile
+
+
+def save_speaker_profile(profile_dir, profile, audio):
+    """Write a profile's metadata and audio, replacing any previous files"""
+    os.makedirs(profile_dir, exist_ok=True)
+    meta = {k: v for k, v in profile.items() if k != 'audio'}
+    if 'embedding' in meta:
+        meta['embedding'] = [float(x) for x in meta['embedding']]
+
+    # Write to temp files first so readers never see a half-written profile
+    audio_path = os.path.join(profile_dir, PROFILE_AUDIO_FILE)
+    tmp_audio = audio_path + '.tmp.npy'
+    np.save(tmp_audio, np.asarray(audio, dtype=np.float32))
+    os.replace(tmp_audio, audio_path)
+
+    meta_path = os.path.join(profile_dir, PROFILE_META_FILE)
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + '.tmp', meta_path)
+
+
+def load_speaker_profile(profile_dir):
+    """Load a saved profile, memory-mapping its audio; None if missing"""
+    meta_path = os.path.join(profile_dir, PROFILE_META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        profile = json.load(f)
+    if 'embedding' in profile:
+        profile['embedding'] = np.asarray(profile['embedding'], dtype=np.float32)
+    audio_path = os.path.join(profile_dir, PROFILE_AUDIO_FILE)
+    if os.path.exists(audio_path):
+        profile['audio'] = np.load(audio_path, mmap_mode='r')
+    return profile
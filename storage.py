@@ -0,0 +1,333 @@
+"""Hash-sharded file storage with atomic writes, an in-memory index and a retention reaper"""
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+SHARD_RE = re.compile(r'^[0-9a-f]{2}$')
+TMP_PREFIX = '.tmp-'
+STALE_TMP_SECONDS = 3600  # Temp files older than this were left by a crashed write
+PERSIST_USE_SECONDS = 60  # A lookup refreshes a file's atime once this much older than its last use
+
+
+def unique_name(extension):
+    """Collision-free filename for a new file, e.g. ``unique_name('.wav')``"""
+    return f"{uuid.uuid4().hex}{extension}"
+
+
+class FileStore:
+    """Files kept in ``root`` under hash-sharded subdirectories.
+
+    A file named ``name`` lives at ``root/ab/cd/name``, where ``abcd`` starts
+    the hash of the name up to its first dot, so a file and its transcoded
+    variants (``<stem>.<format>.<ext>``) share a directory and no directory
+    grows past a few thousand entries. Names are flat; callers never see
+    the shards.
+
+    Every live file is indexed in memory with its size and last use, ordered
+    oldest first, so lookups need no directory scans and the reaper only
+    touches files it deletes: those unused for ``max_age`` seconds, then the
+    least recently used while the total exceeds ``max_bytes`` (0 disables
+    either policy). Files written by other processes are adopted on first
+    lookup.
+
+    Several processes may share ``root``, each with its own index. Lookups
+    record use in the file's atime (at most every ``PERSIST_USE_SECONDS``),
+    and the reaper re-reads it before deleting, so a file another process
+    served recently is kept. ``max_bytes`` only counts the files this
+    process has indexed, so with several processes it is approximate. Flat files left by the old layout are indexed where they are and
+    age out like the rest; other subdirectories are never touched. Files
+    already on disk are indexed by ``load``, not on construction.
+    """
+
+    def __init__(self, root, levels=2, max_age=0, max_bytes=0, on_reap=None):
+        self.root = root
+        self.levels = levels
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        # Called with [(name, size)] after the reaper deletes files
+        self.on_reap = on_reap
+        # name -> [path, size, last used, last use recorded on disk], least recently used first
+        self._index = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._reaper_pid = None
+        self._stop = threading.Event()
+        self._loaded = False
+        self.reaped = 0
+        self.reaped_bytes = 0
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def valid_name(name):
+        return bool(name) and os.path.basename(name) == name and not name.startswith('.')
+
+    def folder_for(self, name):
+        """Shard directory for ``name`` (not created)"""
+        digest = hashlib.sha1(name.split('.', 1)[0].encode('utf-8')).hexdigest()
+        return os.path.join(self.root, *(digest[2 * i:2 * i + 2] for i in range(self.levels)))
+
+    def path(self, name):
+        """Where ``name`` is stored, or would be written"""
+        with self._lock:
+            entry = self._index.get(name)
+        return entry[0] if entry else os.path.join(self.folder_for(name), name)
+
+    def load(self):
+        """Index the files already on disk (idempotent)"""
+        if self._loaded:
+            return
+        self._loaded = True
+        found = []
+
+        def scan(folder, depth):
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                return
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if depth < self.levels and SHARD_RE.match(entry.name):
+                        scan(entry.path, depth + 1)
+                    continue
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if entry.name.startswith(TMP_PREFIX):
+                    if depth and st.st_mtime < time.time() - STALE_TMP_SECONDS:
+                        self._unlink(entry.path)
+                    continue
+                if not self.valid_name(entry.name) or not entry.is_file(follow_symlinks=False):
+                    continue
+                # Reads refresh atime at most daily, and touch() sets it explicitly
+                found.append((max(st.st_atime, st.st_mtime), entry.name, entry.path, st.st_size))
+
+        scan(self.root, 0)
+        with self._lock:
+            # Files indexed since construction were used more recently than anything found
+            newer = self._index
+            self._index = OrderedDict()
+            for last_used, name, path, size in sorted(found):
+                if name not in newer and name not in self._index:
+                    self._index[name] = [path, size, last_used, last_used]
+                    self._total_bytes += size
+            self._index.update(newer)
+
+    def _add(self, name, path, size):
+        # Called with the lock held
+        old = self._index.pop(name, None)
+        if old is not None:
+            self._total_bytes -= old[1]
+        now = time.time()
+        self._index[name] = [path, size, now, now]
+        self._total_bytes += size
+
+    def lookup(self, name, persist=False):
+        """Path of a live file, marking it used, or None.
+
+        Falls back to one stat of its shard path so files written by other
+        processes are found and indexed. The use is written to the file's
+        atime if ``persist`` or if that was last done ``PERSIST_USE_SECONDS``
+        ago, so other processes' reapers and later restarts see it.
+        """
+        if not self.valid_name(name):
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._index.get(name)
+            if entry is not None:
+                entry[2] = now
+                self._index.move_to_end(name)
+                path = entry[0]
+                persist = persist or now - entry[3] >= PERSIST_USE_SECONDS
+                if persist:
+                    entry[3] = now
+        if entry is None:
+            path = os.path.join(self.folder_for(name), name)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                return None
+            with self._lock:
+                self._add(name, path, size)
+            persist = True
+        if persist:
+            self._record_use(path, now)
+        return path
+
+    def _record_use(self, path, when):
+        try:
+            # mtime is left alone; it marks when the content was written
+            os.utime(path, ns=(int(when * 1e9), os.stat(path).st_mtime_ns))
+        except OSError:
+            pass
+
+    def exists(self, name):
+        return self.lookup(name) is not None
+
+    def touch(self, name):
+        """Mark a file used and persist that across restarts in its atime"""
+        self.lookup(name, persist=True)
+
+    def write(self, name, produce):
+        """Write ``name`` atomically and index it; returns its path.
+
+        ``produce(tmp_path)`` writes the content to a temporary file with the
+        same extension, which is renamed into place once complete.
+        """
+        if not self.valid_name(name):
+            raise ValueError(f"Invalid file name '{name}'")
+        folder = self.folder_for(name)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, name)
+        tmp_path = os.path.join(folder, f"{TMP_PREFIX}{uuid.uuid4().hex}{os.path.splitext(name)[1]}")
+        try:
+            produce(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.add(name, path)
+        return path
+
+    def add(self, name, path=None):
+        """Index a file written into place some other way, e.g. by transcoding"""
+        path = path or os.path.join(self.folder_for(name), name)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            self._add(name, path, size)
+
+    def entries(self):
+        """``[(name, size)]`` of every indexed file, least recently used first"""
+        with self._lock:
+            return [(name, entry[1]) for name, entry in self._index.items()]
+
+    def size(self, name):
+        with self._lock:
+            entry = self._index.get(name)
+            return entry[1] if entry else None
+
+    def remove(self, name):
+        """Delete a file; returns its size, or None if it wasn't indexed"""
+        with self._lock:
+            entry = self._index.pop(name, None)
+            if entry is None:
+                return None
+            self._total_bytes -= entry[1]
+        self._unlink(entry[0])
+        return entry[1]
+
+    def _unlink(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error removing {path}: {e}")
+
+    def _expired(self):
+        """Pop the entries the retention policies select"""
+        selected = []
+        with self._lock:
+            if self.max_age:
+                cutoff = time.time() - self.max_age
+                while self._index:
+                    name, entry = next(iter(self._index.items()))
+                    if entry[2] >= cutoff:
+                        break
+                    selected.append((name, self._index.pop(name)))
+            if self.max_bytes:
+                remaining = self._total_bytes - sum(entry[1] for _, entry in selected)
+                # Never the most recently used file, which may still be on its way to a client
+                while remaining > self.max_bytes and len(self._index) > 1:
+                    name, entry = self._index.popitem(last=False)
+                    selected.append((name, entry))
+                    remaining -= entry[1]
+            for _, entry in selected:
+                self._total_bytes -= entry[1]
+        return selected
+
+    def reap(self):
+        """Apply the retention policies once; returns ``[(name, size)]`` deleted.
+
+        Each selected file's last use is first refreshed from its atime and
+        mtime on disk; one that another process used or rewrote since this
+        process last did is kept, and selection runs again. Files already
+        gone are dropped from the index and reported with the deleted ones.
+        """
+        removed = []
+        for _ in range(3):
+            kept = []
+            for name, entry in self._expired():
+                try:
+                    st = os.stat(entry[0])
+                except FileNotFoundError:
+                    removed.append((name, entry[1]))
+                    continue
+                except OSError:
+                    st = None
+                if st is not None and max(st.st_atime, st.st_mtime) > entry[3] + 1:
+                    kept.append((name, entry, max(st.st_atime, st.st_mtime), st.st_size))
+                    continue
+                self._unlink(entry[0])
+                removed.append((name, entry[1]))
+            if not kept:
+                break
+            with self._lock:
+                for name, entry, last_used, size in kept:
+                    if name not in self._index:
+                        self._index[name] = [entry[0], size, last_used, last_used]
+                        self._total_bytes += size
+        if removed:
+            self.reaped += len(removed)
+            self.reaped_bytes += sum(size for _, size in removed)
+            print(f"Reaped {len(removed)} files from {self.root}")
+            if self.on_reap is not None:
+                self.on_reap(removed)
+        return removed
+
+    def start_reaper(self, interval=300):
+        """Run ``reap`` every ``interval`` seconds in a daemon thread.
+
+        Idempotent and cheap enough to call per request. Threads don't survive
+        a fork, so a forked child (e.g. under ``gunicorn --preload``) that
+        calls this starts its own reaper.
+        """
+        if not (self.max_age or self.max_bytes):
+            return
+        with self._lock:
+            if self._reaper is not None and self._reaper_pid == os.getpid():
+                return
+            self._reaper_pid = os.getpid()
+            self._reaper = threading.Thread(target=self._reap_loop, args=(interval, ),
+                                            name=f"reaper-{os.path.basename(self.root)}", daemon=True)
+            self._reaper.start()
+
+    def stop_reaper(self):
+        self._stop.set()
+
+    def _reap_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"Error reaping {self.root}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self._index),
+                'bytes': self._total_bytes,
+                'max_age': self.max_age,
+                'max_bytes': self.max_bytes,
+                'reaped': self.reaped,
+                'reaped_bytes': self.reaped_bytes,
+            }
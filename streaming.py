@@ -0,0 +1,111 @@
+"""Helpers for sentence-chunked, progressively streamed synthesis"""
+import re
+import struct
+
+import numpy as np
+
+# Sentence ends, then clause breaks, used to split long text for Bark
+SENTENCE_RE = re.compile(r'(?<=[.!?…])\s+|\n+')
+CLAUSE_RE = re.compile(r'(?<=[,;:—])\s+')
+
+
+def split_text_into_chunks(text, max_chars=180):
+    """Split text into sentence- or clause-sized chunks of at most max_chars.
+
+    Bark degrades on prompts longer than ~13 seconds of speech, so sentences
+    that are still too long are broken at clause boundaries and finally at
+    word boundaries. Short neighbouring sentences are merged back together so
+    each chunk carries enough context for natural prosody.
+    """
+    pieces = []
+    for sentence in SENTENCE_RE.split(text.strip()):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for clause in CLAUSE_RE.split(sentence):
+            clause = clause.strip()
+            if len(clause) <= max_chars:
+                if clause:
+                    pieces.append(clause)
+                continue
+            # Fall back to packing words when a clause is still too long
+            current = ''
+            for word in clause.split():
+                if current and len(current) + 1 + len(word) > max_chars:
+                    pieces.append(current)
+                    current = word
+                else:
+                    current = f"{current} {word}" if current else word
+            if current:
+                pieces.append(current)
+
+    # Merge short pieces so chunks aren't needlessly tiny
+    chunks = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + 1 + len(piece) <= max_chars:
+            chunks[-1] = f"{chunks[-1]} {piece}"
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def crossfade_chunks(chunks, sample_rate, fade_ms=40):
+    """Join audio chunks with short raised-cosine crossfades.
+
+    Takes an iterable of 1-D float arrays and yields output blocks as soon as
+    they are final. Only the last ``fade_ms`` of the previous chunk is held
+    back, so memory stays constant however many chunks are joined.
+    """
+    fade_len = max(1, int(sample_rate * fade_ms / 1000))
+    fade_in, fade_out = _fade_curves(fade_len)
+
+    tail = None
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=np.float32)
+        if chunk.size == 0:
+            continue
+        if tail is not None:
+            n = min(len(tail), len(chunk))
+            if n == fade_len:
+                head = chunk[:n] * fade_in + tail * fade_out
+            else:
+                short_in, short_out = _fade_curves(n)
+                head = chunk[:n] * short_in + tail[-n:] * short_out
+            if n < len(tail):
+                yield tail[:-n]
+            chunk = np.concatenate([head, chunk[n:]])
+        if len(chunk) > fade_len:
+            yield chunk[:-fade_len]
+            tail = chunk[-fade_len:]
+        else:
+            tail = chunk
+    if tail is not None:
+        yield tail
+
+
+def _fade_curves(length):
+    t = np.linspace(0.0, np.pi / 2, length, dtype=np.float32)
+    return np.sin(t) ** 2, np.cos(t) ** 2
+
+
+def wav_stream_header(sample_rate, channels=1, bits_per_sample=16):
+    """RIFF/WAVE header for a PCM stream whose length is not known yet.
+
+    The RIFF and data sizes are set to the maximum value, which browsers and
+    most players treat as "read until the connection closes".
+    """
+    byte_rate = sample_rate * channels * bits_per_sample // 8
+    block_align = channels * bits_per_sample // 8
+    return (b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE'
+            + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, sample_rate,
+                                    byte_rate, block_align, bits_per_sample)
+            + b'data' + struct.pack('<I', 0xFFFFFFFF))
+
+
+def float_to_pcm16(samples):
+    """Convert float audio in [-1, 1] to little-endian 16-bit PCM bytes"""
+    samples = np.clip(np.asarray(samples, dtype=np.float32), -1.0, 1.0)
+    return (samples * 32767.0).astype('<i2').tobytes()
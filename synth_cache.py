@@ -0,0 +1,238 @@
+"""Content-addressed cache of synthesized audio files"""
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+CACHE_FILE_RE = re.compile(r'^[0-9a-f]{64}\.wav$')
+VARIANT_FILE_RE = re.compile(r'^(?P<key>[0-9a-f]{64})\.[a-z0-9-]+\.(?:wav|flac|ogg|mp3)$')
+
+
+def normalize_text(text):
+    """Canonical form of synthesis text used for cache keys.
+
+    Unicode is NFC-normalized and runs of whitespace collapse to one space.
+    Case and punctuation are kept because Bark's intonation depends on them.
+    """
+    text = unicodedata.normalize('NFC', text)
+    return ' '.join(text.split())
+
+
+class _InFlight:
+    """A generation that other identical requests can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.filename = None
+        self.error = None
+
+
+class SynthesisCache:
+    """LRU cache of synthesized WAV files kept in a FileStore under a byte budget.
+
+    Files are named after the hash of everything that determines the output,
+    so identical requests reuse an existing file. Concurrent identical
+    requests are collapsed into one generation (single flight). When the total
+    size of cached files exceeds ``max_bytes`` the least recently used ones
+    are deleted. Only files that look like cache entries are ever touched.
+    Transcoded variants of an entry count towards its size and are deleted
+    with it. Files the store's reaper deletes must be passed to ``forget``.
+    Entries already in the store are adopted by ``load``, after the store's
+    own ``load``.
+    """
+
+    def __init__(self, store, max_bytes):
+        self.store = store
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> size in bytes incl. variants, oldest first
+        self._variants = {}  # key -> variant filenames
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self._loaded = False
+
+    @staticmethod
+    def make_key(text, preset, use_user_voice, voice_version, engine):
+        """Hash of the normalized request fields that determine the audio"""
+        parts = [
+            normalize_text(text),
+            preset,
+            '1' if use_user_voice else '0',
+            str(voice_version) if use_user_voice else '',
+            engine,
+        ]
+        return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def filename_for(key):
+        return f"{key}.wav"
+
+    @staticmethod
+    def is_cache_file(filename):
+        """Whether a filename is a cache entry or one of its variants"""
+        return bool(CACHE_FILE_RE.match(filename) or VARIANT_FILE_RE.match(filename))
+
+    def load(self):
+        """Index cache files left by a previous run, least recently used first (idempotent)"""
+        if self._loaded:
+            return
+        self._loaded = True
+        files = self.store.entries()
+        with self._lock:
+            # Entries made since construction were used more recently than anything found
+            newer = self._entries
+            self._entries = OrderedDict()
+            for name, size in files:
+                if CACHE_FILE_RE.match(name) and name[:-4] not in newer:
+                    self._entries[name[:-4]] = size
+                    self._total_bytes += size
+
+            for name, size in files:
+                match = VARIANT_FILE_RE.match(name)
+                if not match or match.group('key') in newer:
+                    continue
+                key = match.group('key')
+                if key not in self._entries:
+                    # Variant of an evicted entry
+                    self.store.remove(name)
+                    continue
+                self._variants.setdefault(key, set()).add(name)
+                self._entries[key] += size
+                self._total_bytes += size
+            self._entries.update(newer)
+
+    def get_or_create(self, key, produce):
+        """Return ``(filename, cached)`` for key, generating it if needed.
+
+        ``produce(path)`` must write the audio to ``path``; it is called at
+        most once per key at a time, and the file is moved into place only
+        once it is complete.
+        """
+        filename = self.filename_for(key)
+
+        with self._lock:
+            # Another process's reaper may have deleted it
+            if key in self._entries and os.path.exists(self.store.path(filename)):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                hit = True
+            else:
+                hit = False
+                if key in self._entries:
+                    # File was removed behind our back
+                    self._total_bytes -= self._entries.pop(key)
+                    self._remove_variants(key)
+                flight = self._in_flight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._in_flight[key] = _InFlight()
+                    self.misses += 1
+                else:
+                    self.coalesced += 1
+
+        if hit:
+            # Persist recency across restarts
+            self.store.touch(filename)
+            return filename, True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.filename, True
+
+        try:
+            self.store.write(filename, produce)
+            size = self.store.size(filename) or 0
+        except Exception as e:
+            with self._lock:
+                del self._in_flight[key]
+            flight.error = e
+            flight.done.set()
+            raise
+
+        with self._lock:
+            self._entries[key] = size
+            self._total_bytes += size
+            del self._in_flight[key]
+            self._evict()
+        flight.filename = filename
+        flight.done.set()
+        return filename, False
+
+    def add_variant(self, filename):
+        """Account for a transcoded variant added to the store next to a cached file"""
+        match = VARIANT_FILE_RE.match(filename)
+        if not match:
+            return
+        key = match.group('key')
+        size = self.store.size(filename)
+        if size is None:
+            return
+        with self._lock:
+            if key not in self._entries:
+                return
+            variants = self._variants.setdefault(key, set())
+            if filename in variants:
+                return
+            variants.add(filename)
+            self._entries[key] += size
+            self._total_bytes += size
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def forget(self, removed):
+        """Drop ``[(filename, size)]`` the store deleted; an entry's variants go with it"""
+        with self._lock:
+            for filename, size in removed:
+                if CACHE_FILE_RE.match(filename):
+                    key = filename[:-4]
+                    if key in self._entries:
+                        self._total_bytes -= self._entries.pop(key)
+                        self._remove_variants(key)
+                    continue
+                match = VARIANT_FILE_RE.match(filename)
+                key = match.group('key') if match else None
+                if filename in self._variants.get(key, ()):
+                    self._variants[key].discard(filename)
+                    self._entries[key] -= size
+                    self._total_bytes -= size
+
+    def _remove(self, filename):
+        self.store.remove(filename)
+
+    def _remove_variants(self, key):
+        for filename in self._variants.pop(key, ()):
+            self._remove(filename)
+
+    def _evict(self):
+        # Called with the lock held; never evict the entry just added
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self._remove(self.filename_for(key))
+            self._remove_variants(key)
+            self.evictions += 1
+            self.evicted_bytes += size
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'evicted_bytes': self.evicted_bytes,
+                'files': len(self._entries),
+                'variants': sum(len(v) for v in self._variants.values()),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'in_flight': len(self._in_flight),
+            }
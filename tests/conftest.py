@@ -0,0 +1,40 @@
+"""Shared fixtures: the service imported in a scratch directory with stand-in models"""
+import os
+import sys
+
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [PROJECT_DIR, os.path.join(PROJECT_DIR, 'benchmarks')]
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """The ``app`` module, with Bark and the voice encoder replaced by stand-ins.
+
+    Skipped when the service's own dependencies are not installed. The
+    working directory stays in a scratch directory for the session, since
+    the app keeps its files relative to it.
+    """
+    for name in ('torch', 'resemblyzer', 'pydub', 'parselmouth', 'webrtcvad'):
+        pytest.importorskip(name)
+    os.environ.update({
+        'MODEL_LOAD_MODE': 'lazy',
+        'MODEL_WARMUP': '0',
+        'BARK_BATCH_WINDOW_MS': '0',
+        'DSP_WORKERS': '0',
+        'PROFILE_STORE': 'memory',
+        'ADMISSION_ENABLED': '0',
+    })
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('service'))
+    import app
+    from stand_ins import StandInBark, StandInVoiceEncoder, install
+    install(app, StandInBark(latency=0, realtime_factor=0), lambda: StandInVoiceEncoder(latency=0))
+    yield app
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
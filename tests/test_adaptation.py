@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from adaptation import (AdaptationEngine, RunningNormalizer, StreamingAdapter, formant_ratio_for,
+                        shift_factors)
+
+SAMPLE_RATE = 24000
+
+
+def voiced(seconds=1.0, f0=180.0):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    wave = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 8))
+    return (0.2 * wave * (1 + 0.3 * np.sin(2 * np.pi * 3 * t))).astype(np.float32)
+
+
+@pytest.mark.parametrize('block_size', [1, 100, 256, 4096, 100000])
+def test_streaming_matches_whole_signal(block_size):
+    engine = AdaptationEngine(SAMPLE_RATE)
+    audio = voiced()
+    expected = engine.process(audio, 1.3, 1.1)
+
+    adapter = StreamingAdapter(engine, 1.3, 1.1)
+    blocks = [audio[i:i + block_size] for i in range(0, len(audio), block_size)]
+    streamed = np.concatenate(list(adapter.stream(blocks)))
+
+    assert len(streamed) == len(audio)
+    np.testing.assert_allclose(streamed, expected, atol=1e-5)
+
+
+def test_process_keeps_length_and_identity():
+    engine = AdaptationEngine(SAMPLE_RATE)
+    audio = voiced(0.5)
+    out = engine.process(audio, 1.0, 1.0)
+    assert out.dtype == np.float32 and len(out) == len(audio)
+    np.testing.assert_allclose(out, audio, atol=1e-3)
+    assert len(engine.process(np.zeros(0), 1.5)) == 0
+
+
+def test_pitch_shift_moves_the_fundamental():
+    engine = AdaptationEngine(SAMPLE_RATE)
+    middle = engine.process(voiced(1.0, f0=150.0), 1.5)[SAMPLE_RATE // 4:-SAMPLE_RATE // 4]
+    spectrum = np.abs(np.fft.rfft(middle * np.hanning(len(middle))))
+    freqs = np.fft.rfftfreq(len(middle), 1 / SAMPLE_RATE)
+    band = freqs < 400
+    assert freqs[band][np.argmax(spectrum[band])] == pytest.approx(225.0, rel=0.05)
+
+
+def test_formant_ratio_follows_pitch_within_limits():
+    assert formant_ratio_for(1.21) == pytest.approx(1.1)
+    assert formant_ratio_for(4.0) == pytest.approx(1.15)
+    assert formant_ratio_for(0.25) == pytest.approx(0.85)
+
+
+def test_running_normalizer_reaches_target_loudness():
+    normalizer = RunningNormalizer(SAMPLE_RATE, target_rms=0.1)
+    quiet = voiced(3.0) * 0.1
+    out = np.concatenate([normalizer.process(block) for block in np.array_split(quiet, 30)])
+    settled = out[-SAMPLE_RATE:]
+    assert np.sqrt(np.mean(settled ** 2)) == pytest.approx(0.1, rel=0.2)
+    # Pauses aren't boosted
+    assert not normalizer.process(np.zeros(2400)).any()
+
+
+def test_shift_factors():
+    assert shift_factors(0.0, 200.0) is None
+    pitch, formant = shift_factors(100.0, 150.0)
+    assert pitch == pytest.approx(1.5)
+    assert formant == pytest.approx(formant_ratio_for(1.5))
@@ -0,0 +1,121 @@
+import pytest
+
+from admission import AdmissionController, CostModel, Rejected
+
+
+def test_concurrency_limit_is_429_with_retry_after():
+    admission = AdmissionController(max_concurrent=1, rate=0, slo=0)
+    ticket = admission.admit('user:a', 30)
+    with pytest.raises(Rejected) as e:
+        admission.admit('user:a', 30)
+    assert e.value.status == 429
+    assert e.value.reason == 'concurrency'
+    assert 1 <= e.value.retry_after <= 30
+    # Other users are unaffected
+    admission.admit('user:b', 30)
+
+    admission.release(ticket, 1.0)
+    admission.admit('user:a', 30)
+    assert admission.stats()['rejected']['concurrency'] == 1
+
+
+def test_rate_limit_is_429_until_refunded():
+    admission = AdmissionController(max_concurrent=0, rate=0.001, burst=100, slo=0)
+    ticket = admission.admit('user:a', 80)
+    with pytest.raises(Rejected) as e:
+        admission.admit('user:a', 80)
+    assert e.value.status == 429
+    assert e.value.reason == 'rate'
+    assert e.value.retry_after > 1
+
+    # A cache hit costs nothing, so the estimate is paid back
+    admission.release(ticket, 0.0)
+    admission.admit('user:a', 80)
+
+
+def test_overload_sheds_queued_work_with_503():
+    admission = AdmissionController(max_concurrent=0, rate=0, slo=60)
+    with pytest.raises(Rejected) as e:
+        admission.admit('user:a', 10, projected_wait=100)
+    assert e.value.status == 503
+    assert e.value.reason == 'overload'
+    assert e.value.retry_after == 40
+    admission.admit('user:a', 10, projected_wait=30)
+
+
+def test_inline_work_is_not_shed_for_overload():
+    admission = AdmissionController(max_concurrent=0, rate=0, slo=60)
+    for user in 'abcd':
+        admission.admit(f'user:{user}', 120)
+    assert admission.stats()['in_flight'] == 4
+
+
+def test_inline_work_is_capped_across_users():
+    admission = AdmissionController(max_concurrent=0, rate=0, slo=0, max_inline=2)
+    first = admission.admit('user:a', 30)
+    admission.admit('user:b', 60)
+    with pytest.raises(Rejected) as rejected:
+        admission.admit('user:c', 10)
+    assert rejected.value.status == 503 and rejected.value.reason == 'overload'
+    assert 1 <= rejected.value.retry_after <= 30
+    # Queued work has its own limits
+    admission.admit('user:c', 10, projected_wait=0)
+    admission.release(first, 0.0)
+    admission.admit('user:c', 10)
+    assert admission.stats()['inline_in_flight'] == 2
+
+
+def test_release_forgets_idle_users():
+    admission = AdmissionController(max_concurrent=2, rate=1, burst=100, slo=0)
+    ticket = admission.admit('user:a', 10)
+    assert admission.stats()['active_users'] == 1
+    admission.release(ticket, 0.0)
+    assert admission.stats()['active_users'] == 0
+    assert admission.stats()['in_flight'] == 0
+
+
+def test_cost_model_follows_measured_times():
+    model = CostModel(seconds_per_char=0.5, adapt_factor=0.2, alpha=0.5)
+    assert model.estimate('x' * 10) == pytest.approx(5.0)
+    assert model.estimate('x' * 10, adapt=True) == pytest.approx(6.0)
+    model.observe('x' * 10, False, 1.0)
+    assert model.estimate('x' * 10) == pytest.approx(3.0)
+
+
+def test_rejections_carry_retry_after_and_tickets_are_released(app_module, client, monkeypatch):
+    admission = AdmissionController(max_concurrent=1, rate=0, slo=0)
+    monkeypatch.setattr(app_module, 'admission', admission)
+    held = admission.admit('user:alice', 30)
+
+    response = client.post('/synthesize', json={'text': 'Hello there', 'userId': 'alice'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.get_json()['reason'] == 'concurrency'
+
+    admission.release(held, 0.0)
+    for path in ('/synthesize', '/synthesize/stream'):
+        response = client.post(path, json={'text': 'Hello there', 'userId': 'alice'})
+        assert response.status_code == 200
+        response.close()
+        assert admission.stats()['in_flight'] == 0
+
+    # Refused before admission, so nothing is held either
+    response = client.post('/synthesize/stream', json={'text': 'Hi', 'userId': 'alice', 'voice': 'user_bob'})
+    assert response.status_code == 403
+    assert admission.stats()['in_flight'] == 0
+
+
+def test_inline_cap_sheds_sync_and_stream_requests(app_module, client, monkeypatch):
+    admission = AdmissionController(max_concurrent=0, rate=0, slo=0, max_inline=1)
+    monkeypatch.setattr(app_module, 'admission', admission)
+    held = admission.admit('user:bob', 30)
+
+    for path in ('/synthesize', '/synthesize/stream'):
+        response = client.post(path, json={'text': 'Hello there', 'userId': 'alice'})
+        assert response.status_code == 503
+        assert int(response.headers['Retry-After']) >= 1
+        assert response.get_json()['reason'] == 'overload'
+
+    admission.release(held, 0.0)
+    response = client.post('/synthesize', json={'text': 'Hello there', 'userId': 'alice'})
+    assert response.status_code == 200
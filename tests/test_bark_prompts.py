@@ -0,0 +1,45 @@
+import pytest
+
+pytest.importorskip('parselmouth')
+
+from bark_prompts import PromptCache, is_user_prompt  # noqa: E402
+
+
+def make_cache(max_user_prompts=2):
+    loaded = []
+
+    def loader(prompt):
+        if prompt == 'broken':
+            raise OSError('missing file')
+        loaded.append(prompt)
+        return {'semantic_prompt': prompt}
+
+    return PromptCache(max_user_prompts=max_user_prompts, loader=loader), loaded
+
+
+def test_presets_are_loaded_once():
+    cache, loaded = make_cache()
+    assert cache.preload({'Narrator': 'v2/en_speaker_6', 'Broken': 'broken'}) == ['Broken']
+    for _ in range(3):
+        assert cache.get('v2/en_speaker_6') == {'semantic_prompt': 'v2/en_speaker_6'}
+    assert loaded == ['v2/en_speaker_6']
+    # Arrays and "no prompt" are handed to Bark unchanged
+    assert cache.get(None) is None
+    assert cache.get({'semantic_prompt': 1}) == {'semantic_prompt': 1}
+
+
+def test_user_prompts_are_kept_in_an_lru():
+    cache, loaded = make_cache(max_user_prompts=2)
+    paths = [f'uploads/profiles/{user}/bark_prompt-{version}.npz' for user, version in
+             (('a', '01'), ('b', '02'), ('c', '03'))]
+    assert all(is_user_prompt(path) for path in paths)
+    assert not is_user_prompt('v2/en_speaker_6')
+
+    cache.get(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[0])
+    cache.get(paths[2])  # pushes out b, the least recently used
+    cache.get(paths[0])
+    cache.get(paths[1])
+    assert loaded == [paths[0], paths[1], paths[2], paths[1]]
+    assert cache.stats()['user_prompts'] == 2
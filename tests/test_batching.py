@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+from batching import MicroBatcher
+
+
+def submit_all(batcher, items):
+    results = {}
+
+    def worker(item):
+        try:
+            results[item] = batcher.submit(item)
+        except Exception as e:
+            results[item] = e
+
+    threads = [threading.Thread(target=worker, args=(item,)) for item in items]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    return results
+
+
+def test_concurrent_items_share_a_batch():
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, window_ms=200, max_batch=8)
+    results = submit_all(batcher, range(4))
+    assert results == {0: 0, 1: 2, 2: 4, 3: 6}
+    assert len(calls) == 1
+    assert batcher.stats()['mean_batch_size'] == 4
+
+
+def test_batches_are_capped():
+    batcher = MicroBatcher(lambda items: list(items), window_ms=200, max_batch=3)
+    submit_all(batcher, range(7))
+    assert max(batcher.batch_sizes) <= 3
+    assert batcher.items == 7
+
+
+def test_errors_reach_their_callers():
+    def handler(items):
+        if 'boom' in items and len(items) == 1:
+            raise RuntimeError('batch failed')
+        return [ValueError(item) if item == 'bad' else item for item in items]
+
+    batcher = MicroBatcher(handler, window_ms=200, max_batch=8)
+    results = submit_all(batcher, ['ok', 'bad'])
+    assert results['ok'] == 'ok'
+    assert isinstance(results['bad'], ValueError)
+
+    with pytest.raises(RuntimeError):
+        batcher.submit('boom')
+    assert batcher.submit('ok') == 'ok'
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from bulk_synthesize import read_completed, read_manifest
+
+
+def test_manifest_rows_get_stable_safe_ids(tmp_path):
+    path = tmp_path / 'prompts.jsonl'
+    path.write_text('\n'.join(json.dumps(row) for row in (
+        {'text': 'Hello there', 'voice': 'male_1'},
+        {'text': 'Second line', 'id': 'intro/part 2'},
+    )) + '\n\n')
+    rows = read_manifest(str(path))
+    assert rows[1]['id'] == 'intro_part_2'
+    assert rows[0]['id'] == read_manifest(str(path))[0]['id']
+    assert len(rows[0]['id']) == 16
+
+    csv_path = tmp_path / 'prompts.csv'
+    csv_path.write_text('id,text,voice\na,Hello,female_1\n')
+    assert read_manifest(str(csv_path)) == [{'id': 'a', 'text': 'Hello', 'voice': 'female_1'}]
+
+
+@pytest.mark.parametrize('rows', [[{'text': ' '}], [{'text': 'a', 'id': 'x'}, {'text': 'b', 'id': 'x'}]])
+def test_bad_manifests_are_rejected(tmp_path, rows):
+    path = tmp_path / 'prompts.jsonl'
+    path.write_text('\n'.join(json.dumps(row) for row in rows))
+    with pytest.raises(ValueError):
+        read_manifest(str(path))
+
+
+def test_completed_rows_survive_an_interrupted_write(tmp_path):
+    path = tmp_path / 'done.jsonl'
+    assert read_completed(str(path)) == set()
+    path.write_text('{"id": "a", "status": "done"}\n{"id": "b", "status": "failed"}\n{"id": "c", "sta')
+    assert read_completed(str(path)) == {'a'}
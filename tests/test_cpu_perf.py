@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+nn = pytest.importorskip('torch.nn')
+
+import torch  # noqa: E402
+
+from cpu_perf import default_threads, quantize  # noqa: E402
+
+
+def test_threads_are_split_between_concurrent_generations(monkeypatch):
+    monkeypatch.setattr(os, 'cpu_count', lambda: 8)
+    assert default_threads(1) == 8
+    assert default_threads(2) == 4
+    assert default_threads(16) == 1
+    assert default_threads(0) == 8
+
+
+def test_quantized_model_stays_close_to_float():
+    torch.manual_seed(0)
+    model = nn.Sequential(nn.Linear(64, 64), nn.ReLU(), nn.Linear(64, 8)).eval()
+    x = torch.randn(4, 64)
+    with torch.inference_mode():
+        expected = model(x)
+        quantize(model, [nn.Linear])
+        actual = model(x)
+    assert 'quantized' in type(model[0]).__module__
+    assert float((actual - expected).abs().max()) < 0.05 * float(expected.abs().max()) + 1e-3
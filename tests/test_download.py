@@ -0,0 +1,79 @@
+import io
+
+import numpy as np
+import soundfile as sf
+
+from storage import unique_name
+from transcode import variant_filename
+
+
+def write_master(app_module, seconds=0.5, sample_rate=24000):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    tone = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    name = unique_name('.wav')
+    app_module.synth_store.write(name, lambda path: sf.write(path, tone, sample_rate, format='WAV'))
+    return name
+
+
+def test_variant_is_served_whatever_the_accept_header(app_module, client):
+    master = write_master(app_module)
+    assert client.get(f'/synthesized/{master}?format=flac').status_code == 200
+    variant = variant_filename(master, 'flac')
+
+    for accept in ('audio/flac', 'audio/mpeg', '*/*'):
+        response = client.get(f'/synthesized/{variant}', headers={'Accept': accept})
+        assert response.status_code == 200
+        assert response.mimetype == 'audio/flac'
+        assert 'Accept' not in response.vary
+
+
+def test_variant_with_its_own_format_is_served(app_module, client):
+    master = write_master(app_module)
+    assert client.get(f'/synthesized/{master}?format=mp3&rate=16000').status_code == 200
+    variant = variant_filename(master, 'mp3', 16000)
+
+    assert client.get(f'/synthesized/{variant}?format=mp3&rate=16000').status_code == 200
+    assert client.get(f'/synthesized/{variant}?format=flac').status_code == 400
+    assert client.get(f'/synthesized/{variant}?format=wav').status_code == 400
+
+
+def test_master_format_follows_accept_header(app_module, client):
+    master = write_master(app_module)
+    response = client.get(f'/synthesized/{master}', headers={'Accept': 'audio/flac, audio/wav;q=0.5'})
+    assert response.status_code == 200
+    assert response.mimetype == 'audio/flac'
+    assert 'Accept' in response.vary
+
+    response = client.get(f'/synthesized/{master}', headers={'Accept': '*/*'})
+    assert response.mimetype == 'audio/wav'
+    assert client.get(f'/synthesized/{master}?format=aiff').status_code == 400
+    assert client.get('/synthesized/missing.wav').status_code == 404
+
+
+def test_requested_format_and_rate_are_transcoded(app_module, client):
+    master = write_master(app_module)
+    response = client.get(f'/synthesized/{master}?format=flac&rate=16000')
+    assert response.status_code == 200
+    assert response.mimetype == 'audio/flac'
+    info = sf.info(io.BytesIO(response.data))
+    assert (info.format, info.samplerate) == ('FLAC', 16000)
+    assert client.get(f'/synthesized/{master}?format=flac&rate=11025').status_code == 400
+
+
+def test_range_requests(app_module, client):
+    master = write_master(app_module)
+    size = len(client.get(f'/synthesized/{master}').data)
+
+    response = client.get(f'/synthesized/{master}', headers={'Range': 'bytes=0-99'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 0-99/{size}'
+    assert len(response.data) == 100
+    assert response.headers['Accept-Ranges'] == 'bytes'
+
+
+def test_etag_revalidation(app_module, client):
+    master = write_master(app_module)
+    etag = client.get(f'/synthesized/{master}').headers['ETag']
+    response = client.get(f'/synthesized/{master}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert client.get(f'/synthesized/{master}', headers={'If-None-Match': '"other"'}).status_code == 200
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from dsp_pool import DSPPool, attach_array, share_array
+
+
+def test_shared_arrays_round_trip():
+    array = np.arange(12, dtype=np.float32).reshape(3, 4)
+    shm, descriptor = share_array(array)
+    try:
+        other, view = attach_array(descriptor)
+        np.testing.assert_array_equal(view, array)
+        view[0, 0] = -1
+        del view
+        other.close()
+        assert np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[0, 0] == -1
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_pool_adapts_like_the_request_thread():
+    pytest.importorskip('parselmouth')
+    from adaptation import RunningNormalizer, StreamingAdapter, get_engine, shift_factors
+    from speaker_profile import mean_pitch
+
+    sample_rate, block_size = 24000, 4096
+    t = np.arange(sample_rate) / sample_rate
+    audio = (0.3 * np.sin(2 * np.pi * 200 * t)).astype(np.float32)
+
+    pool = DSPPool(workers=1, load_encoder=False)
+    try:
+        adapted = pool.adapt(audio, 150.0, sample_rate, block_size)
+    finally:
+        pool.shutdown()
+
+    factors = shift_factors(mean_pitch(audio, sample_rate), 150.0)
+    adapter = StreamingAdapter(get_engine(sample_rate), *factors, normalizer=RunningNormalizer(sample_rate))
+    blocks = (audio[i:i + block_size] for i in range(0, len(audio), block_size))
+    expected = np.concatenate(list(adapter.stream(blocks)))
+    np.testing.assert_allclose(adapted, expected, atol=1e-5)
+    assert pool.stats()['submitted'] == 1
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from scipy.signal import resample_poly
+
+pytest.importorskip('webrtcvad')
+pytest.importorskip('resemblyzer')
+from enrollment import StreamResampler  # noqa: E402
+
+
+@pytest.mark.parametrize('orig_sr, target_sr', [(48000, 16000), (44100, 16000), (16000, 24000)])
+@pytest.mark.parametrize('chunk', [1, 160, 4096])
+def test_chunks_match_whole_signal(orig_sr, target_sr, chunk):
+    rng = np.random.default_rng(0)
+    audio = rng.standard_normal(orig_sr // 2)
+    resampler = StreamResampler(orig_sr, target_sr)
+    parts = [resampler.push(audio[i:i + chunk]) for i in range(0, len(audio), chunk)]
+    streamed = np.concatenate(parts + [resampler.flush()])
+
+    expected = resample_poly(audio, resampler.up, resampler.down)
+    assert len(streamed) == len(expected)
+    np.testing.assert_allclose(streamed, expected, atol=1e-4)
+
+
+def test_output_is_emitted_as_input_arrives():
+    resampler = StreamResampler(48000, 16000)
+    first = resampler.push(np.ones(4800))
+    # All but the filter's look-ahead is ready before the end of the signal
+    assert 1500 - resampler.delay // resampler.down <= len(first) <= 1600
+    assert len(first) + len(resampler.flush()) == 1600
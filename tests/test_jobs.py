@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+from jobs import QueueFullError, SynthesisJobQueue
+
+
+def wait_finished(jobs, timeout=5):
+    deadline = time.time() + timeout
+    while not all(job.finished for job in jobs) and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_jobs_run_in_submission_order():
+    order = []
+    queue = SynthesisJobQueue(lambda params: order.append(params['name']), num_workers=1)
+    jobs = [queue.submit({'name': name}) for name in ('a', 'b', 'c')]
+    wait_finished(jobs)
+    assert order == ['a', 'b', 'c']
+    assert [job.status for job in jobs] == ['done'] * 3
+
+
+def test_full_queue_is_refused():
+    gate = threading.Event()
+    queue = SynthesisJobQueue(lambda params: gate.wait(5), num_workers=1, max_queue_size=2)
+    try:
+        running = queue.submit({})
+        wait_for = time.time() + 5
+        while running.status != 'running' and time.time() < wait_for:
+            time.sleep(0.01)
+        queued = [queue.submit({}), queue.submit({})]
+        with pytest.raises(QueueFullError):
+            queue.submit({})
+        assert queue.position(queued[1]) == 1
+        data, _ = queue.snapshot(queued[1])
+        assert data['queue_position'] == 1 and data['queue_depth'] == 2
+    finally:
+        gate.set()
+
+
+def test_handler_errors_fail_the_job():
+    def handler(params):
+        raise RuntimeError('Bark crashed')
+
+    queue = SynthesisJobQueue(handler)
+    job = queue.submit({})
+    wait_finished([job])
+    assert job.status == 'failed'
+    assert job.error == 'Bark crashed'
+    assert queue.stats()['failed'] == 1
+
+
+def run_queue(submissions):
+    """Order in which a one-worker queue runs ``[(key, name)]`` submitted while it is busy"""
+    order = []
+    gate = threading.Event()
+
+    def handler(params):
+        if params['name'] == 'first':
+            gate.wait(5)
+        order.append(params['name'])
+
+    queue = SynthesisJobQueue(handler, num_workers=1, max_queue_size=16)
+    jobs = [queue.submit({'name': 'first'}, key='a', cost=1.0)]
+    jobs += [queue.submit({'name': name}, key=key, cost=1.0) for key, name in submissions]
+    gate.set()
+    wait_finished(jobs)
+    return order
+
+
+def test_users_take_turns():
+    order = run_queue([('a', 'a2'), ('a', 'a3'), ('a', 'a4'), ('b', 'b1'), ('b', 'b2')])
+    assert order == ['first', 'b1', 'a2', 'b2', 'a3', 'a4']
+
+
+def test_jobs_of_one_user_keep_submission_order():
+    order = run_queue([('a', 'a2'), ('a', 'a3'), ('a', 'a4')])
+    assert order == ['first', 'a2', 'a3', 'a4']
+
+
+def test_projected_wait_counts_only_work_ahead():
+    gate = threading.Event()
+    queue = SynthesisJobQueue(lambda params: gate.wait(5), num_workers=1)
+    try:
+        for _ in range(3):
+            queue.submit({}, key='heavy', cost=10.0)
+        # A new user starts level with the heavy user's next job, not behind all of them
+        assert queue.projected_wait('light', 1.0) < queue.projected_wait('heavy', 1.0)
+        assert queue.stats()['queued_users'] == 1
+    finally:
+        gate.set()
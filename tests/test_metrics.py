@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+from metrics import MetricsRegistry, SamplingProfiler, collect_timings, span
+
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter('requests_total', 'Requests served', ['route'])
+    registry.gauge('queue_depth', 'Jobs waiting', fn=lambda: 3)
+    latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1))
+    requests.inc(route='/synthesize')
+    requests.inc(2, route='/synthesize')
+    latency.observe(0.05)
+    latency.observe(0.5)
+
+    lines = registry.render().splitlines()
+    assert '# TYPE requests_total counter' in lines
+    assert 'requests_total{route="/synthesize"} 3' in lines
+    assert 'queue_depth 3' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in lines
+    assert 'latency_seconds_count 2' in lines
+    # Registering a name again returns the existing metric
+    assert registry.counter('requests_total', 'Requests served', ['route']) is requests
+    with pytest.raises(ValueError):
+        requests.inc(status='200')
+
+
+def test_timings_are_collected_per_context():
+    with collect_timings() as timings:
+        with span('test_stage'):
+            time.sleep(0.01)
+        with span('test_stage'):
+            pass
+    assert timings['test_stage'] >= 0.01
+    assert timings['total'] >= timings['test_stage']
+
+    with span('outside'):
+        pass  # Not collected anywhere, only recorded in the histogram
+
+
+def test_sampling_profiler_sees_busy_threads():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    deadline = time.time() + 0.2
+    while time.time() < deadline:
+        sum(range(1000))
+    profiler.stop()
+    assert profiler.samples > 0
+    assert 'test_sampling_profiler_sees_busy_threads' in profiler.collapsed()
@@ -0,0 +1,111 @@
+import pytest
+
+from models import ModelRegistry
+
+
+def make_registry(mode, warmup=False, fail=()):
+    loads = []
+
+    def loader(name):
+        def load():
+            loads.append(name)
+            if name in fail:
+                raise RuntimeError(f'{name} is missing')
+            return f'{name}-model'
+        return load
+
+    registry = ModelRegistry(mode=mode, warmup=warmup)
+    registry.register('bark', loader('bark'), warmup_fn=lambda model: None)
+    registry.register('encoder', loader('encoder'), required=False)
+    return registry, loads
+
+
+def test_eager_mode_loads_and_warms_up_at_start():
+    registry, loads = make_registry('eager', warmup=True)
+    assert not registry.ready()
+    registry.start()
+    assert loads == ['bark', 'encoder']
+    assert registry.ready()
+    assert registry.status()['models']['bark']['warmed_up']
+
+
+def test_lazy_mode_loads_on_first_use():
+    registry, loads = make_registry('lazy')
+    registry.start()
+    assert loads == []
+    assert registry.get('bark') == 'bark-model'
+    assert registry.get('bark') == 'bark-model'
+    assert loads == ['bark']
+
+
+def test_background_mode_becomes_ready():
+    registry, _ = make_registry('background')
+    registry.start()
+    registry._thread.join(timeout=5)
+    assert registry.ready()
+
+
+def test_failed_load_is_reported():
+    registry, loads = make_registry('eager', fail=('bark',))
+    registry.start()
+    assert registry.get('bark') is None
+    assert loads.count('bark') == 1
+    assert not registry.ready()
+    assert registry.status()['models']['bark']['error'] == 'bark is missing'
+
+    # Optional models don't gate readiness
+    registry, _ = make_registry('eager', fail=('encoder',))
+    registry.start()
+    assert registry.ready()
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        ModelRegistry(mode='sometimes')
+
+
+def test_register_replaces_a_model_not_loaded_yet():
+    registry, loads = make_registry('lazy')
+    registry.register('bark', lambda: 'stand-in')
+    assert registry.get('bark') == 'stand-in'
+    assert loads == []
+    assert list(registry.status()['models']) == ['bark', 'encoder']
+
+
+def test_failed_warm_up_does_not_hold_back_readiness():
+    registry = ModelRegistry(mode='eager', warmup=True)
+
+    def broken_warmup(model):
+        raise RuntimeError('warm-up failed')
+
+    registry.register('bark', lambda: 'bark-model', warmup_fn=broken_warmup)
+    registry.start()
+    assert registry.ready()
+    status = registry.status()['models']['bark']
+    assert not status['warmed_up']
+    assert status['warmup_error'] == 'warm-up failed'
+
+
+def test_lazy_mode_warms_up_on_first_use():
+    warmed = []
+    registry = ModelRegistry(mode='lazy', warmup=True)
+    registry.register('bark', lambda: 'bark-model', warmup_fn=warmed.append)
+    registry.start()
+    # Ready before any request, or a readiness-gated balancer would never send one
+    assert registry.ready()
+    assert registry.status()['models']['bark']['state'] == 'not_loaded'
+
+    assert registry.get('bark') == 'bark-model'
+    assert warmed == ['bark-model']
+    assert registry.status()['models']['bark']['warmed_up']
+    registry.get('bark')
+    assert warmed == ['bark-model']
+    assert registry.ready()
+
+
+def test_lazy_mode_is_not_ready_after_a_failed_load():
+    registry, _ = make_registry('lazy', fail=('bark',))
+    registry.start()
+    assert registry.ready()
+    assert registry.get('bark') is None
+    assert not registry.ready()
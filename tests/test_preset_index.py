@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('parselmouth')
+
+from preset_index import EMBEDDING_SIZE, PresetIndex  # noqa: E402
+
+
+def unit(i):
+    vector = np.zeros(EMBEDDING_SIZE, dtype=np.float32)
+    vector[i] = 1.0
+    return vector
+
+
+PRESETS = {'low': ('low', unit(0), 110.0), 'high': ('high', unit(1), 220.0), 'mixed': ('mixed', unit(0) + unit(1), 0.0)}
+
+
+def analyze(prompt):
+    _, embedding, f0 = PRESETS[prompt]
+    return embedding, f0
+
+
+def test_nearest_preset_by_embedding_and_pitch():
+    index = PresetIndex(pitch_weight=0.25)
+    index.build({name: name for name in PRESETS}, analyze)
+    assert index.nearest(unit(0))[0][0] == 'low'
+    assert [name for name, _ in index.nearest(unit(1), k=3)][0] == 'high'
+    # Close in timbre but two octaves away in pitch loses to an unpitched preset
+    assert index.nearest(unit(0), f0_mean=440.0)[0][0] == 'mixed'
+    assert PresetIndex().nearest(unit(0)) == []
+
+
+def test_saved_index_skips_known_presets(tmp_path):
+    path = str(tmp_path / 'index.npz')
+    presets = {name: name for name in PRESETS}
+    assert PresetIndex(path).build(presets, analyze) == 3
+
+    def fail(prompt):
+        raise AssertionError('should not be analysed again')
+
+    index = PresetIndex(path)
+    assert index.build(presets, fail) == 0
+    assert index.nearest(unit(1))[0][0] == 'high'
+    assert PresetIndex(path).build(dict(presets, extra='low'), analyze) == 0
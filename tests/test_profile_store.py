@@ -0,0 +1,79 @@
+import time
+
+import numpy as np
+import pytest
+
+from profile_store import EMBEDDING_DIM, create_profile_store
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    return create_profile_store(request.param, str(tmp_path))
+
+
+def embedding(seed):
+    return np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype(np.float32)
+
+
+def test_profile_lifecycle(store):
+    assert store.get('alice') is None
+    store.save_sample('alice', 'uploads/alice.wav', 'v1')
+    assert store.get('alice')['sample_path'] == 'uploads/alice.wav'
+    assert not store.has_voice('alice')
+
+    store.save_profile('alice', {'pitch': 180.0}, embedding(1))
+    record = store.get('alice')
+    assert record['profile'] == {'pitch': 180.0}
+    np.testing.assert_array_equal(record['embedding'], embedding(1))
+    assert store.user_ids_with_voice() == ['alice']
+
+    # A new upload replaces the old profile until it has been analysed
+    store.save_sample('alice', 'uploads/alice2.wav', 'v2')
+    assert not store.has_voice('alice')
+    store.set_error('alice', {'message': 'too short'})
+    assert store.get_error('alice') == {'message': 'too short'}
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    writer = create_profile_store('sqlite', str(tmp_path))
+    reader = create_profile_store('sqlite', str(tmp_path))
+    reader.cache_ttl = 0
+    for i, user_id in enumerate(['a', 'b', 'c']):
+        writer.save_profile(user_id, {}, embedding(i))
+    np.testing.assert_array_equal(reader.get('b')['embedding'], embedding(1))
+    assert sorted(reader.user_ids_with_voice()) == ['a', 'b', 'c']
+
+
+def test_sqlite_store_reuses_expired_rows(tmp_path):
+    store = create_profile_store('sqlite', str(tmp_path), ttl=60)
+    store.cache_ttl = 0
+    store.save_profile('old', {}, embedding(1))
+    with store._connect() as conn:
+        conn.execute("UPDATE profiles SET updated_at = ?", (time.time() - 120,))
+    assert store.get('old') is None
+    assert store.purge_expired() == 1
+
+    store.save_profile('new', {}, embedding(2))
+    assert store.stats()['matrix_rows'] == store.initial_rows
+    with store._connect() as conn:
+        assert conn.execute("SELECT emb_row FROM profiles WHERE user_id = 'new'").fetchone()[0] == 0
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_purge_removes_expired_profile_directories(backend, tmp_path):
+    profiles = tmp_path / 'profiles'
+    store = create_profile_store(backend, str(tmp_path / 'db'), ttl=60,
+                                 profile_dir=lambda user_id: str(profiles / user_id))
+    for user_id in ('old', 'new'):
+        (profiles / user_id).mkdir(parents=True)
+        store.save_profile(user_id, {}, embedding(0))
+
+    expired = time.time() - 120
+    if backend == 'memory':
+        store._records['old']['updated_at'] = expired
+    else:
+        with store._connect() as conn:
+            conn.execute("UPDATE profiles SET updated_at = ? WHERE user_id = 'old'", (expired,))
+    assert store.purge_expired() == 1
+    assert not (profiles / 'old').exists()
+    assert (profiles / 'new').is_dir()
@@ -0,0 +1,35 @@
+import numpy as np
+
+from semantic_cache import SemanticCache
+
+
+def test_keys_follow_text_and_parameters():
+    key = SemanticCache.make_key("Hello  there", temp=0.7)
+    assert key == SemanticCache.make_key(" Hello there ", temp=0.7)
+    assert key != SemanticCache.make_key("Hello there", temp=0.6)
+    assert key != SemanticCache.make_key("Hello where", temp=0.7)
+
+
+def test_evicted_entries_spill_to_disk_and_come_back(tmp_path):
+    cache = SemanticCache(max_items=2, spill_dir=str(tmp_path))
+    for i in range(3):
+        cache.put(f'k{i}', np.arange(i + 1))
+
+    assert cache.stats()['memory_items'] == 2
+    assert (tmp_path / 'k0.npy').exists()
+    np.testing.assert_array_equal(cache.get('k0'), [0])
+    assert cache.stats()['disk_hits'] == 1
+    assert cache.get('missing') is None
+
+    # A new process finds what earlier ones spilled
+    reopened = SemanticCache(max_items=2, spill_dir=str(tmp_path))
+    assert reopened.stats()['disk_items'] >= 1
+    np.testing.assert_array_equal(reopened.get('k0'), [0])
+
+
+def test_spill_directory_is_bounded(tmp_path):
+    cache = SemanticCache(max_items=1, spill_dir=str(tmp_path), spill_max_items=2)
+    for i in range(5):
+        cache.put(f'k{i}', np.arange(3))
+    assert sorted(p.name for p in tmp_path.glob('*.npy')) == ['k2.npy', 'k3.npy']
+    assert cache.get('k0') is None
@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+pytest.importorskip('parselmouth')
+
+from speaker_profile import build_speaker_profile, load_speaker_profile, save_speaker_profile  # noqa: E402
+
+
+def test_saved_profile_round_trips(tmp_path):
+    profile = {'version': 'v1', 'f0_mean': 180.0, 'embedding': np.linspace(-1, 1, 256, dtype=np.float32)}
+    audio = np.sin(np.arange(2400, dtype=np.float32))
+    save_speaker_profile(str(tmp_path), profile, audio)
+
+    loaded = load_speaker_profile(str(tmp_path))
+    assert loaded['f0_mean'] == 180.0
+    np.testing.assert_allclose(loaded['embedding'], profile['embedding'])
+    assert isinstance(loaded['audio'], np.memmap)
+    np.testing.assert_array_equal(loaded['audio'], audio)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['audio.npy', 'profile.json']
+
+
+def test_missing_profile_loads_as_none(tmp_path):
+    assert load_speaker_profile(str(tmp_path / 'nobody')) is None
+
+
+class RecordingEncoder:
+    def embed_utterance(self, wav):
+        self.length = len(wav)
+        return np.ones(256, dtype=np.float32)
+
+
+def test_profile_is_built_once_from_the_sample(tmp_path):
+    path = str(tmp_path / 'voice.wav')
+    t = np.arange(48000) / 48000
+    sf.write(path, (0.5 * np.sin(2 * np.pi * 150 * t)).astype(np.float32), 48000)
+    encoder = RecordingEncoder()
+
+    profile = build_speaker_profile(path, str(tmp_path / 'profile'), encoder=encoder, version='v1')
+    assert profile['sample_rate'] == 24000
+    assert encoder.length == pytest.approx(16000, abs=200)
+    assert profile['f0_mean'] == pytest.approx(150, rel=0.1)
+
+    saved = load_speaker_profile(str(tmp_path / 'profile'))
+    assert saved['version'] == 'v1'
+    np.testing.assert_array_equal(saved['embedding'], np.ones(256))
+    assert len(saved['audio']) == len(profile['audio'])
+
+
+def test_profile_directories_are_distinct_per_user(app_module):
+    ids = ['a/b', 'a_b', 'a b', '../a_b', '']
+    folders = [app_module.speaker_profile_dir(user_id) for user_id in ids]
+    assert len(set(folders)) == len(ids)
+    assert all(os.path.dirname(folder) == app_module.PROFILE_FOLDER for folder in folders)
+    assert app_module.speaker_profile_dir('a/b') == folders[0]
@@ -0,0 +1,140 @@
+import os
+import time
+
+from storage import FileStore, unique_name
+
+
+def write(store, name, size):
+    return store.write(name, lambda path: open(path, 'wb').write(b'x' * size))
+
+
+def age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_files_are_sharded_and_found(tmp_path):
+    store = FileStore(str(tmp_path))
+    name = unique_name('.wav')
+    path = write(store, name, 10)
+    assert os.path.dirname(path) == store.folder_for(name) != str(tmp_path)
+    assert store.lookup(name) == path
+    assert store.lookup('missing.wav') is None
+    assert store.lookup('../escape.wav') is None
+
+
+def test_reap_by_age(tmp_path):
+    store = FileStore(str(tmp_path))
+    old, new = unique_name('.wav'), unique_name('.wav')
+    age(write(store, old, 10), 3600)
+    write(store, new, 10)
+
+    # Ages come from the files on disk when a new process indexes them
+    reloaded = FileStore(str(tmp_path), max_age=60)
+    reloaded.load()
+    assert reloaded.reap() == [(old, 10)]
+    assert not os.path.exists(store.path(old))
+    assert reloaded.exists(new)
+
+
+def test_reap_by_bytes_keeps_most_recent(tmp_path):
+    removed = []
+    store = FileStore(str(tmp_path), max_bytes=25, on_reap=removed.extend)
+    names = [unique_name('.wav') for _ in range(4)]
+    for name in names:
+        write(store, name, 10)
+    store.lookup(names[0])  # Used again, so now the most recent
+
+    assert store.reap() == [(names[1], 10), (names[2], 10)]
+    assert removed == [(names[1], 10), (names[2], 10)]
+    assert store.stats()['bytes'] == 20
+
+    # Never the last file, even over the limit
+    store.max_bytes = 1
+    store.reap()
+    assert [name for name, _ in store.entries()] == [names[0]]
+
+
+def test_files_from_other_processes_are_adopted(tmp_path):
+    store = FileStore(str(tmp_path))
+    other = FileStore(str(tmp_path))
+    name = unique_name('.wav')
+    write(other, name, 10)
+    assert store.size(name) is None
+    assert store.lookup(name) == other.path(name)
+    assert store.size(name) == 10
+
+
+def test_load_keeps_newer_entries(tmp_path):
+    first = FileStore(str(tmp_path))
+    old = unique_name('.wav')
+    write(first, old, 10)
+
+    store = FileStore(str(tmp_path))
+    new = unique_name('.wav')
+    write(store, new, 5)
+    store.load()
+    store.load()
+    assert [name for name, _ in store.entries()] == [old, new]
+    assert store.stats()['bytes'] == 15
+
+
+def test_stale_temp_files_are_removed(tmp_path):
+    store = FileStore(str(tmp_path))
+    name = unique_name('.wav')
+    folder = os.path.dirname(write(store, name, 10))
+    stale = os.path.join(folder, '.tmp-crashed.wav')
+    open(stale, 'wb').close()
+    age(stale, 2 * 3600)
+
+    FileStore(str(tmp_path)).load()
+    assert not os.path.exists(stale)
+
+
+def test_reaper_runs_once_per_process(tmp_path, monkeypatch):
+    store = FileStore(str(tmp_path), max_age=60)
+    store.start_reaper(interval=3600)
+    first = store._reaper
+    store.start_reaper(interval=3600)
+    assert store._reaper is first
+
+    # As seen from a forked child, where the parent's thread doesn't exist
+    monkeypatch.setattr(store, '_reaper_pid', -1)
+    store.start_reaper(interval=3600)
+    assert store._reaper is not first and store._reaper.is_alive()
+    store.stop_reaper()
+
+    unlimited = FileStore(str(tmp_path))
+    unlimited.start_reaper(interval=3600)
+    assert unlimited._reaper is None
+
+
+def test_reap_keeps_files_used_by_another_process(tmp_path):
+    name = unique_name('.wav')
+    age(write(FileStore(str(tmp_path)), name, 10), 3600)
+    ours, theirs = FileStore(str(tmp_path), max_age=600), FileStore(str(tmp_path))
+    ours.load()
+    assert theirs.lookup(name)
+    assert ours.reap() == []
+    assert ours.lookup(name) and ours.stats()['bytes'] == 10
+
+
+def test_reap_forgets_files_deleted_elsewhere(tmp_path):
+    name = unique_name('.wav')
+    path = write(FileStore(str(tmp_path)), name, 10)
+    age(path, 3600)
+    store = FileStore(str(tmp_path), max_age=600)
+    store.load()
+    os.remove(path)
+    assert store.reap() == [(name, 10)]
+    assert store.entries() == [] and store.stats()['bytes'] == 0
+
+
+def test_lookup_records_use_without_changing_mtime(tmp_path):
+    name = unique_name('.wav')
+    path = write(FileStore(str(tmp_path)), name, 10)
+    age(path, 3600)
+    mtime_ns = os.stat(path).st_mtime_ns
+    assert FileStore(str(tmp_path)).lookup(name) == path
+    assert os.stat(path).st_mtime_ns == mtime_ns
+    assert os.stat(path).st_atime > time.time() - 60
@@ -0,0 +1,39 @@
+import struct
+
+import numpy as np
+import pytest
+
+from streaming import crossfade_chunks, float_to_pcm16, split_text_into_chunks, wav_stream_header
+
+
+def test_chunks_respect_the_length_limit():
+    text = ("Short one. Another short one. " + "This sentence goes on, and on, and on without a full stop " * 6).strip()
+    chunks = split_text_into_chunks(text, max_chars=60)
+    assert all(len(chunk) <= 60 for chunk in chunks)
+    assert ' '.join(chunks).split() == text.split()
+
+
+def test_short_sentences_are_merged():
+    assert split_text_into_chunks("Hi. How are you? Fine.", max_chars=180) == ["Hi. How are you? Fine."]
+    assert split_text_into_chunks("Hi. How are you?", max_chars=10) == ["Hi.", "How are", "you?"]
+
+
+@pytest.mark.parametrize('lengths', [[1000, 1000, 1000], [1000, 10, 1000], [5], [10, 10]])
+def test_crossfade_overlaps_each_join(lengths):
+    sample_rate, fade_ms = 1000, 40
+    chunks = [np.ones(n, dtype=np.float32) for n in lengths]
+    joined = np.concatenate(list(crossfade_chunks(iter(chunks), sample_rate, fade_ms=fade_ms)))
+
+    overlap = sum(min(fade_ms, a, b) for a, b in zip(lengths, lengths[1:]))
+    assert len(joined) == sum(lengths) - overlap
+    # Equal-power curves sum to one, so joining constant signals stays constant
+    np.testing.assert_allclose(joined, 1.0, atol=1e-5)
+
+
+def test_pcm_helpers():
+    header = wav_stream_header(24000)
+    assert header[:4] == b'RIFF' and header[8:12] == b'WAVE' and len(header) == 44
+    assert struct.unpack('<I', header[24:28])[0] == 24000
+
+    pcm = np.frombuffer(float_to_pcm16([0.0, 0.5, 2.0, -2.0]), dtype='<i2')
+    assert list(pcm) == [0, 16383, 32767, -32767]
@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+from storage import FileStore
+from synth_cache import SynthesisCache
+
+
+def make_cache(tmp_path, max_bytes=10 ** 6):
+    return SynthesisCache(FileStore(str(tmp_path)), max_bytes)
+
+
+def key_for(text, preset='v2/en_speaker_1'):
+    return SynthesisCache.make_key(text, preset, False, None, 'bark')
+
+
+def write(data):
+    return lambda path: open(path, 'wb').write(data)
+
+
+def test_concurrent_identical_requests_generate_once(tmp_path):
+    cache = make_cache(tmp_path)
+    key = key_for('Hello there')
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def produce(path):
+        calls.append(path)
+        started.set()
+        release.wait(5)
+        open(path, 'wb').write(b'RIFF')
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_create(key, produce)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(cache.get_or_create(key, produce)))
+                 for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(cached for _, cached in results) == [False, True, True, True]
+    assert {filename for filename, _ in results} == {SynthesisCache.filename_for(key)}
+    assert cache.coalesced == 3
+
+    # Later requests are plain hits
+    assert cache.get_or_create(key, produce) == (SynthesisCache.filename_for(key), True)
+    assert len(calls) == 1
+
+
+def test_failed_generation_is_not_cached(tmp_path):
+    cache = make_cache(tmp_path)
+    key = key_for('Hello')
+
+    def fail(path):
+        raise RuntimeError('out of memory')
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_create(key, fail)
+    assert cache.get_or_create(key, write(b'RIFF'))[1] is False
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=10)
+    first, second, third = key_for('one'), key_for('two'), key_for('three')
+    cache.get_or_create(first, write(b'x' * 4))
+    cache.get_or_create(second, write(b'x' * 4))
+    cache.get_or_create(first, write(b'x' * 4))  # Used again
+    cache.get_or_create(third, write(b'x' * 4))
+
+    assert cache.stats()['evictions'] == 1
+    assert cache.get_or_create(first, write(b'x' * 4))[1] is True
+    assert not cache.store.exists(SynthesisCache.filename_for(second))
+
+
+def test_keys_ignore_whitespace_but_not_case():
+    key = key_for('Hello  there')
+    assert key == key_for(' Hello there\n')
+    assert key != key_for('hello there')
+    assert key != key_for('Hello there', 'v2/en_speaker_2')
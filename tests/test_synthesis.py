@@ -0,0 +1,79 @@
+import io
+import threading
+import time
+
+import soundfile as sf
+
+
+def test_synthesized_audio_is_downloadable_and_cached(client):
+    body = {'text': 'Testing the synthesis pipeline.', 'voice': 'female_1'}
+    first = client.post('/synthesize', json=body)
+    assert first.status_code == 200
+    data = first.get_json()
+    assert not data['cached']
+
+    path = data['file_url'].split('localhost', 1)[1]
+    audio, sample_rate = sf.read(io.BytesIO(client.get(path).data))
+    assert sample_rate == 24000 and len(audio) > 0
+
+    assert client.post('/synthesize', json=body).get_json()['cached']
+    assert client.post('/synthesize', json={'text': ''}).status_code == 400
+
+
+def test_async_job_finishes(client):
+    response = client.post('/synthesize', json={'text': 'Queued for later.', 'async': True})
+    assert response.status_code == 202
+    status_url = response.get_json()['status_url']
+
+    deadline = time.time() + 10
+    while client.get(status_url).get_json()['status'] not in ('done', 'failed') and time.time() < deadline:
+        time.sleep(0.05)
+    job = client.get(status_url).get_json()
+    assert job['status'] == 'done'
+    assert job['result']['file_url'].endswith('.wav')
+
+    with client.get(response.get_json()['events_url']) as stream:
+        assert 'event: done' in stream.get_data(as_text=True)
+    assert client.get('/jobs/missing').status_code == 404
+
+
+
+def test_event_streams_are_capped_and_time_limited(app_module, client, monkeypatch):
+    gate = threading.Event()
+    queue = app_module.SynthesisJobQueue(lambda params: gate.wait(5), num_workers=1)
+    monkeypatch.setattr(app_module, 'synthesis_jobs', queue)
+    monkeypatch.setattr(app_module, 'SSE_MAX_STREAMS', 1)
+    monkeypatch.setattr(app_module, 'SSE_MAX_SECONDS', 0.2)
+    job = queue.submit({})
+    try:
+        first = client.get(f'/jobs/{job.id}/events')
+        refused = client.get(f'/jobs/{job.id}/events')
+        assert refused.status_code == 503 and 'Retry-After' in refused.headers
+        # The open stream ends with a retry hint although the job is still running
+        events = first.get_data(as_text=True)
+        first.close()
+        assert 'retry: ' in events and 'event: done' not in events
+        assert client.get('/jobs').get_json()['event_streams']['open'] == 0
+    finally:
+        gate.set()
+
+
+def test_semantic_tokens_are_shared_across_voices(app_module, monkeypatch):
+    calls = []
+    text_to_semantic = app_module.text_to_semantic
+
+    def counting(text, history_prompt=None, **kwargs):
+        calls.append(history_prompt)
+        return text_to_semantic(text, history_prompt=history_prompt, **kwargs)
+
+    monkeypatch.setattr(app_module, 'text_to_semantic', counting)
+    for voice in ('v2/en_speaker_6', 'v2/en_speaker_9'):
+        app_module.bark_generate('Try this in another voice.', voice)
+    assert calls == [None]
+
+def test_stream_is_a_growing_wav(client):
+    response = client.post('/synthesize/stream', json={'text': 'One sentence. ' * 30})
+    assert response.status_code == 200
+    assert response.mimetype == 'audio/wav'
+    data = response.get_data()
+    assert data[:4] == b'RIFF' and len(data) > 44
@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from transcode import ensure_variant, mimetype_for, parse_output, variant_filename
+
+
+def test_parse_output():
+    assert parse_output() is None
+    assert parse_output('WAV') is None
+    assert parse_output('ogg') == ('opus', None)
+    assert parse_output('mp3', '16000') == ('mp3', 16000)
+    assert parse_output('wav', 8000) == ('wav', 8000)
+    for fmt, rate in (('aiff', None), ('mp3', 'fast'), ('flac', 11025), ('opus', 44100)):
+        with pytest.raises(ValueError):
+            parse_output(fmt, rate)
+
+
+def test_variant_names():
+    assert variant_filename('abc.wav', 'flac') == 'abc.flac.flac'
+    assert variant_filename('abc.wav', 'pcm16', 16000) == 'abc.pcm16-16000.wav'
+    assert mimetype_for('abc.opus.ogg') == 'audio/ogg'
+    assert mimetype_for('abc.txt') == 'application/octet-stream'
+
+
+def test_variant_is_created_once_and_refreshed_with_its_master(tmp_path):
+    master = tmp_path / 'abc.wav'
+    sf.write(str(master), np.zeros(24000, dtype=np.float32), 24000)
+
+    filename, created = ensure_variant(str(tmp_path), 'abc.wav', 'flac', 16000)
+    assert created and filename == 'abc.flac-16000.flac'
+    info = sf.info(str(tmp_path / filename))
+    assert (info.format, info.samplerate, info.frames) == ('FLAC', 16000, 16000)
+    assert ensure_variant(str(tmp_path), 'abc.wav', 'flac', 16000) == (filename, False)
+
+    later = os.path.getmtime(tmp_path / filename) + 10
+    os.utime(master, (later, later))
+    assert ensure_variant(str(tmp_path), 'abc.wav', 'flac', 16000) == (filename, True)
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('.tmp-')]
@@ -0,0 +1,24 @@
+import numpy as np
+
+
+def test_only_your_own_voice_can_be_used(app_module, client):
+    for path in ('/synthesize', '/synthesize/stream'):
+        response = client.post(path, json={'text': 'Hello', 'userId': 'alice', 'voice': 'user_bob'})
+        assert response.status_code == 403
+        response = client.post(path, json={'text': 'Hello', 'voice': 'user_bob'})
+        assert response.status_code == 403
+        response = client.post(path, json={'text': 'Hello', 'userId': 'alice', 'voice': 7})
+        assert response.status_code == 400
+
+
+def test_voice_list_shows_only_the_requesters_voice(app_module, client):
+    for user_id in ('alice', 'bob'):
+        app_module.voice_profiles.save_profile(user_id, {'f0_mean': 150.0}, np.ones(256, dtype=np.float32))
+
+    def user_voices(query):
+        voices = client.get('/voices' + query).get_json()['voices']
+        return [voice['id'] for voice in voices if voice.get('is_user_voice')]
+
+    assert user_voices('?userId=alice') == ['user_alice']
+    assert user_voices('') == []
+    assert user_voices('?userId=carol') == []
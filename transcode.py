@@ -0,0 +1,145 @@
+"""Output formats for synthesized audio and transcoded variants of master files"""
+import os
+import re
+import uuid
+from math import gcd
+
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+
+SAMPLE_RATES = (8000, 16000, 22050, 24000, 44100, 48000)
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)  # Rates Opus encodes natively
+
+# name -> (mimetype, extension, soundfile format, soundfile subtype)
+OUTPUT_FORMATS = {
+    'wav': ('audio/wav', 'wav', 'WAV', None),
+    'pcm16': ('audio/wav', 'wav', 'WAV', 'PCM_16'),
+    'flac': ('audio/flac', 'flac', 'FLAC', 'PCM_16'),
+    'opus': ('audio/ogg', 'ogg', 'OGG', 'OPUS'),
+    'mp3': ('audio/mpeg', 'mp3', 'MP3', 'MPEG_LAYER_III'),
+}
+
+# Accept header types, master format first so '*/*' keeps the original file
+ACCEPT_TYPES = {
+    'audio/wav': 'wav',
+    'audio/ogg': 'opus',
+    'audio/opus': 'opus',
+    'audio/mpeg': 'mp3',
+    'audio/flac': 'flac',
+}
+
+MIMETYPES = {ext: mimetype for mimetype, ext, _, _ in OUTPUT_FORMATS.values()}
+
+# "<stem>.<format>[-<rate>].<ext>" next to the master "<stem>.wav"
+VARIANT_RE = re.compile(r'^(?P<stem>[^.]+)\.(?P<format>[a-z0-9]+)(?:-(?P<rate>\d+))?\.(?:wav|flac|ogg|mp3)$')
+
+
+def parse_output(fmt=None, sample_rate=None):
+    """Validate a requested format and sample rate.
+
+    Returns ``(format, rate)`` with ``rate`` None to keep the master's rate,
+    or None when the master file itself should be served. Raises ValueError
+    for anything unsupported.
+    """
+    fmt = (fmt or 'wav').lower()
+    if fmt == 'ogg':
+        fmt = 'opus'
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}', expected one of {', '.join(OUTPUT_FORMATS)}")
+
+    rate = None
+    if sample_rate not in (None, ''):
+        try:
+            rate = int(sample_rate)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid sample rate '{sample_rate}'")
+        allowed = OPUS_SAMPLE_RATES if fmt == 'opus' else SAMPLE_RATES
+        if rate not in allowed:
+            raise ValueError(f"Unsupported sample rate {rate} for {fmt}, expected one of "
+                             f"{', '.join(str(r) for r in allowed)}")
+
+    if fmt == 'wav' and rate is None:
+        return None
+    return fmt, rate
+
+
+def variant_filename(master_filename, fmt, rate=None):
+    stem = os.path.splitext(master_filename)[0]
+    suffix = f"{fmt}-{rate}" if rate else fmt
+    return f"{stem}.{suffix}.{OUTPUT_FORMATS[fmt][1]}"
+
+
+def mimetype_for(filename):
+    return MIMETYPES.get(os.path.splitext(filename)[1].lstrip('.'), 'application/octet-stream')
+
+
+def _resample(audio, orig_sr, target_sr):
+    if orig_sr == target_sr:
+        return audio
+    g = gcd(orig_sr, target_sr)
+    return resample_poly(audio, target_sr // g, orig_sr // g, axis=0).astype(np.float32)
+
+
+def _write_ffmpeg(path, audio, sample_rate, fmt):
+    """Encode through pydub/FFmpeg when libsndfile lacks the codec"""
+    from pydub import AudioSegment
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype('<i2')
+    channels = 1 if pcm.ndim == 1 else pcm.shape[1]
+    segment = AudioSegment(pcm.tobytes(), frame_rate=sample_rate, sample_width=2, channels=channels)
+    if fmt == 'opus':
+        segment.export(path, format='ogg', codec='libopus')
+    else:
+        segment.export(path, format=fmt)
+
+
+def encode(path, audio, sample_rate, fmt):
+    """Write audio to ``path`` in one of ``OUTPUT_FORMATS``"""
+    _, _, sf_format, subtype = OUTPUT_FORMATS[fmt]
+    if sf_format in sf.available_formats() and (
+            subtype is None or subtype in sf.available_subtypes(sf_format)):
+        sf.write(path, audio, sample_rate, format=sf_format, subtype=subtype)
+    else:
+        # Older libsndfile builds have neither MP3 nor Opus
+        _write_ffmpeg(path, audio, sample_rate, fmt)
+
+
+def ensure_variant(folder, master_filename, fmt, rate=None):
+    """Filename of the transcoded variant, creating it if missing or stale.
+
+    Variants are written atomically next to the master and reused until the
+    master changes. Returns ``(filename, created)``.
+    """
+    master_path = os.path.join(folder, master_filename)
+    filename = variant_filename(master_filename, fmt, rate)
+    path = os.path.join(folder, filename)
+    try:
+        if os.path.getmtime(path) >= os.path.getmtime(master_path):
+            return filename, False
+    except FileNotFoundError:
+        pass
+
+    transcode_file(master_path, path, fmt, rate)
+    return filename, True
+
+
+def transcode_file(src_path, dst_path, fmt, rate=None):
+    """Transcode an audio file, replacing ``dst_path`` atomically"""
+    audio, sample_rate = sf.read(src_path, dtype='float32')
+    if rate is not None:
+        audio = _resample(audio, sample_rate, rate)
+        sample_rate = rate
+    elif fmt == 'opus' and sample_rate not in OPUS_SAMPLE_RATES:
+        # Opus needs one of its native rates; pick the closest one above
+        target = min((r for r in OPUS_SAMPLE_RATES if r >= sample_rate), default=48000)
+        audio = _resample(audio, sample_rate, target)
+        sample_rate = target
+
+    folder = os.path.dirname(dst_path)
+    tmp_path = os.path.join(folder, f".tmp-{uuid.uuid4().hex}.{OUTPUT_FORMATS[fmt][1]}")
+    try:
+        encode(tmp_path, audio, sample_rate, fmt)
+        os.replace(tmp_path, dst_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)